@@ -0,0 +1,89 @@
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from keboola.component.exceptions import UserException
+
+from client import QueueApiClient, TimingRecorder
+from client.http_pool import ConnectionPoolRegistry
+
+KEY_SAPI_TOKEN = "#kbcToken"
+KEY_STACK = "kbcUrl"
+KEY_CUSTOM_STACK = "custom_stack"
+KEY_ORCHESTRATION_ID = "orchestrationId"
+KEY_VARIABLES = "variables"
+CUSTOM_STACK = "Custom Stack"
+
+
+def parse_targets(targets: List[Dict], defaults: Dict, valid_stacks: List[str]) -> List[Dict]:
+    """
+    Validates the broker targets, filling the stack and token missing in a target from the defaults.
+
+    Targets are dicts:
+
+        {"kbcUrl": "eu-central-1.", "#kbcToken": "...", "orchestrationId": "123", "variables": [...]}
+    """
+    parsed = []
+    for index, target in enumerate(targets, start=1):
+        stack = target.get(KEY_STACK, defaults.get(KEY_STACK))
+        custom_stack = target.get(KEY_CUSTOM_STACK, defaults.get(KEY_CUSTOM_STACK)) or ""
+        token = target.get(KEY_SAPI_TOKEN) or defaults.get(KEY_SAPI_TOKEN)
+        if not target.get(KEY_ORCHESTRATION_ID) or not token:
+            raise UserException(f"Target {index} must have the {KEY_ORCHESTRATION_ID} and the {KEY_SAPI_TOKEN} set.")
+        if stack == CUSTOM_STACK and not custom_stack:
+            raise UserException(f"Target {index} uses a custom stack, the {KEY_CUSTOM_STACK} must be set.")
+        if stack != CUSTOM_STACK and stack != "-" and stack not in valid_stacks:
+            raise UserException(f"Target {index} has an unknown stack '{stack}'.")
+        parsed.append({"stack": stack, "customStack": custom_stack, "token": token,
+                       "orchestrationId": str(target[KEY_ORCHESTRATION_ID]),
+                       "variables": target.get(KEY_VARIABLES, [])})
+    return parsed
+
+
+def project_label(token: str) -> str:
+    """
+    The project ID a Storage API token starts with, safe to log unlike the token itself.
+    """
+    return token.split("-")[0]
+
+
+class StackRegistry:
+    """
+    Caches what the projects of a multi-project run share: the URLs resolved once per stack, one keep-alive session
+    per API host used by all projects on the stack and one Queue API client per project.
+
+    Args:
+        resolve_storage_url: returns the Storage API URL of a stack and custom stack
+        pool_maxsize: connections kept per API host
+    """
+
+    def __init__(self, resolve_storage_url: Callable[[str, Optional[str]], str], pool_maxsize: int,
+                 recorder: Optional[TimingRecorder] = None) -> None:
+        self._resolve_storage_url = resolve_storage_url
+        self.pool_maxsize = pool_maxsize
+        self.recorder = recorder or TimingRecorder()
+        self.pools = ConnectionPoolRegistry(share_across_tokens=True)
+        self._storage_urls: Dict[Tuple[str, str], str] = {}
+        self._queue_clients: Dict[Tuple[str, str, str], QueueApiClient] = {}
+        self._lock = threading.Lock()
+
+    def storage_url(self, stack: str, custom_stack: Optional[str]) -> str:
+        key = (stack, custom_stack or "")
+        with self._lock:
+            if key not in self._storage_urls:
+                self._storage_urls[key] = self._resolve_storage_url(stack, custom_stack)
+            return self._storage_urls[key]
+
+    def queue_client(self, stack: str, custom_stack: Optional[str], token: str) -> QueueApiClient:
+        key = (stack, custom_stack or "", token)
+        with self._lock:
+            if key not in self._queue_clients:
+                self._queue_clients[key] = QueueApiClient(token, stack, custom_stack, pool_maxsize=self.pool_maxsize,
+                                                          recorder=self.recorder, pool_registry=self.pools)
+            return self._queue_clients[key]
+
+    @property
+    def stacks(self) -> int:
+        return len(self._storage_urls)
+
+    def close(self) -> None:
+        self.pools.close_all()
@@ -1 +1,16 @@
+from .timing import TimingRecorder  # noqa
+from .polling import PollStrategy, FixedPollStrategy, ExponentialBackoffPollStrategy, EtaPollStrategy  # noqa
+from .deadline import JOB_STATUS_TIMEOUT, WaitDeadline  # noqa
+from .notifications import (NotificationTransport, LocalNotificationTransport, WebhookListener,  # noqa
+                            NotificationSubscriber)
+from .http_pool import ConnectionPoolRegistry, TokenBucketRateLimiter  # noqa
 from .queue_api import QueueApiClient, QueueApiClientException  # noqa
+from .job_status import JobStatusMultiplexer  # noqa
+
+
+def __getattr__(name):
+    # the asyncio client pulls in httpx and asyncio, imported only by the code paths that use it
+    if name == "AsyncQueueApiClient":
+        from .async_queue_api import AsyncQueueApiClient
+        return AsyncQueueApiClient
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
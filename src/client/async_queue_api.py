@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from .deadline import JOB_STATUS_TIMEOUT, WaitDeadline
+from .http_pool import (THROTTLED_STATUS, TokenBucketRateLimiter, report_response, retry_after_seconds,
+                        shared_rate_limiter)
+from .notifications import NotificationTransport
+from .polling import FixedPollStrategy, PollStrategy
+from .timing import TimingRecorder
+from .queue_api import (QueueApiClient, QueueApiClientException, api_exception_from_response,
+                        active_jobs_params, list_jobs_params, matching_active_job,
+                        run_orchestration_payload,
+                        DEFAULT_BACKOFF_FACTOR, DEFAULT_MAX_RETRIES, DEFAULT_POOL_MAXSIZE, DEFAULT_STATUS_FORCELIST)
+
+# methods retried on status and read errors, mirrors the urllib3 Retry default used by QueueApiClient
+IDEMPOTENT_METHODS = frozenset({"HEAD", "GET", "PUT", "DELETE", "OPTIONS", "TRACE"})
+# statuses retried when the response carries a Retry-After header, as urllib3 Retry does
+RETRY_AFTER_STATUSES = frozenset({413, 429, 503})
+BACKOFF_MAX = 120
+
+
+class AsyncQueueApiClient:
+    """
+    Asyncio counterpart of QueueApiClient. All requests share one keep-alive connection pool,
+    so a single event loop can trigger and await many jobs concurrently. Requests are retried like those of
+    QueueApiClient: Retry-After is honoured, a throttled request is retried whatever its method is and every
+    request goes through the rate limiter shared with the synchronous clients.
+
+    Usage:
+
+        async with AsyncQueueApiClient(token, stack, custom_stack) as client:
+            job = await client.run_orchestration(orch_id, variables)
+            status = await client.wait_until_job_finished(job["id"])
+    """
+
+    def __init__(self, sapi_token: str, keboola_stack: str, custom_stack: Optional[str],
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+                 status_forcelist: tuple = DEFAULT_STATUS_FORCELIST,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+                 transport: Optional[httpx.AsyncBaseTransport] = None,
+                 recorder: Optional[TimingRecorder] = None,
+                 rate_limiter: TokenBucketRateLimiter = shared_rate_limiter) -> None:
+        self.base_url = QueueApiClient.get_stack_url(keboola_stack, custom_stack)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.status_forcelist = status_forcelist
+        self._clock = clock
+        self._sleep = sleep
+        self.recorder = recorder or TimingRecorder()
+        self.rate_limiter = rate_limiter
+        self._client = httpx.AsyncClient(base_url=self.base_url,
+                                         headers={"X-StorageApi-Token": sapi_token},
+                                         limits=httpx.Limits(max_connections=pool_maxsize,
+                                                             max_keepalive_connections=pool_maxsize),
+                                         timeout=10,
+                                         transport=transport)
+
+    async def __aenter__(self) -> "AsyncQueueApiClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def run_orchestration(self, orch_id: str, variables: Optional[List[Dict]]) -> Dict:
+        with self.recorder.span("trigger", configId=str(orch_id)):
+            response = await self._request("POST", "jobs", json=run_orchestration_payload(orch_id, variables))
+        self._handle_http_error(response)
+        return response.json()
+
+    async def wait_until_job_finished(self, job_id: str, poll_strategy: Optional[PollStrategy] = None,
+                                      deadline: Optional[WaitDeadline] = None,
+                                      notifications: Optional[NotificationTransport] = None,
+                                      on_finished: Optional[Callable[[Dict], None]] = None) -> str:
+        poll_strategy = poll_strategy or FixedPollStrategy()
+        poll_strategy.reset()
+        started = self._clock()
+        attempt = 0
+        with self.recorder.span("wait", jobId=str(job_id)) as span:
+            while True:
+                attempt += 1
+                with self.recorder.span("poll", jobId=str(job_id)):
+                    job_detail = await self.get_job_detail(job_id)
+                if job_detail.get("isFinished"):
+                    span["polls"] = attempt
+                    if on_finished is not None:
+                        on_finished(job_detail)
+                    return job_detail.get("status")
+
+                if deadline is not None and deadline.check(job_id):
+                    await self.kill_job(job_id)
+                    span["polls"] = attempt
+                    span["killed"] = True
+                    return JOB_STATUS_TIMEOUT
+
+                interval = poll_strategy.next_interval(attempt, self._clock() - started)
+                if deadline is not None:
+                    interval = deadline.cap(interval)
+                logging.debug(f"Job {job_id} is not finished yet, next check in {interval:.1f} s")
+                with self.recorder.span("sleep"):
+                    if notifications is None:
+                        await self._sleep(interval)
+                    elif await asyncio.to_thread(notifications.wait, job_id, interval) is not None:
+                        logging.debug(f"Notified that job {job_id} finished, confirming its status")
+
+    async def kill_job(self, job_id: str) -> None:
+        logging.warning(f"Killing job {job_id}, it did not finish within the hard deadline")
+        with self.recorder.span("kill", jobId=str(job_id)):
+            response = await self._request("POST", f"jobs/{job_id}/kill")
+        self._handle_http_error(response)
+
+    async def get_job_detail(self, job_id: str) -> Dict:
+        job_detail = await self._get_json(f"jobs/{job_id}")
+        logging.debug(f"Job detail: {job_detail}")
+        return job_detail
+
+    async def find_active_job(self, orch_id: str, variables: Optional[List[Dict]] = None) -> Optional[Dict]:
+        return matching_active_job(await self._get_json("jobs", params=active_jobs_params(orch_id)), variables)
+
+    async def list_jobs(self, job_ids: List[str]) -> List[Dict]:
+        return await self._get_json("jobs", params=list_jobs_params(job_ids))
+
+    async def _get_json(self, path: str, **kwargs):
+        response = await self._request("GET", path, **kwargs)
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as http_err:
+            raise QueueApiClientException(http_err) from http_err
+        return response.json()
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        retries = 0
+        while True:
+            retry_after = None
+            # the limiter blocks with time.sleep, so it waits in a worker thread instead of the event loop
+            waited = await asyncio.to_thread(self.rate_limiter.acquire)
+            if waited:
+                self.recorder.record("throttle", waited)
+            try:
+                with self.recorder.span("http", method=method, endpoint=path) as span:
+                    response = await self._client.request(method, path, **kwargs)
+                    span["status"] = response.status_code
+                self.recorder.increment("requests")
+            except httpx.ConnectError:
+                if retries >= self.max_retries:
+                    raise
+            except httpx.TransportError:
+                if retries >= self.max_retries or method not in IDEMPOTENT_METHODS:
+                    raise
+            else:
+                report_response(self.rate_limiter, response)
+                if not self._is_retry(method, response) or retries >= self.max_retries:
+                    return response
+                retry_after = retry_after_seconds(response)
+            retries += 1
+            self.recorder.increment("retries")
+            await self._sleep(retry_after or self._backoff(retries))
+
+    def _is_retry(self, method: str, response: httpx.Response) -> bool:
+        # same decision as RateLimitedRetry.is_retry on top of urllib3 Retry.is_retry
+        if response.status_code == THROTTLED_STATUS:
+            return True
+        if method not in IDEMPOTENT_METHODS:
+            return False
+        if response.status_code in self.status_forcelist:
+            return True
+        return bool(response.headers.get("Retry-After")) and response.status_code in RETRY_AFTER_STATUSES
+
+    def _backoff(self, retries: int) -> float:
+        # same schedule as urllib3 Retry: no wait before the first retry, then exponential
+        if retries <= 1:
+            return 0
+        return min(BACKOFF_MAX, self.backoff_factor * 2 ** (retries - 1))
+
+    @staticmethod
+    def _handle_http_error(response: httpx.Response) -> None:
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            raise api_exception_from_response(e.response.text) from e
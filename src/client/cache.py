@@ -0,0 +1,119 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_ENTRIES = 32
+
+
+def cache_key(stack_url: str, token: str, component_id: str) -> str:
+    """
+    Builds a cache key that never contains the token itself.
+    """
+    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    return f"{stack_url.rstrip('/')}|{token_hash}|{component_id}"
+
+
+class DiskCacheBackend:
+    """
+    Stores cache entries as JSON files in a directory, one file per key. Keeps at most max_entries files,
+    the least recently used are removed first.
+    """
+
+    def __init__(self, directory: str, max_entries: int = DEFAULT_MAX_ENTRIES) -> None:
+        self.directory = directory
+        self.max_entries = max_entries
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        path = self._path(key)
+        try:
+            with open(path) as cache_file:
+                entry = json.load(cache_file)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get("key") == key else None
+
+    def set(self, key: str, entry: Dict) -> None:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = self._path(key) + ".tmp"
+            with open(tmp_path, "w") as cache_file:
+                json.dump({**entry, "key": key}, cache_file)
+            os.replace(tmp_path, self._path(key))
+            self._evict()
+        except OSError as e:
+            logging.debug(f"Could not write cache entry: {e}")
+
+    def _evict(self) -> None:
+        files = [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith(".json")]
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_entries]:
+            os.remove(path)
+
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries expire after ttl seconds, optionally backed by a DiskCacheBackend
+    so the entries survive between component runs.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 backend: Optional[DiskCacheBackend] = None, clock: Callable[[], float] = time.time) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend
+        self._clock = clock
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None and self.backend is not None:
+            entry = self.backend.get(key)
+            if entry is not None:
+                self._store(key, entry)
+        if entry is None or self._clock() - entry["storedAt"] > self.ttl:
+            return None
+        return entry["value"]
+
+    def set(self, key: str, value: Any) -> None:
+        entry = {"storedAt": self._clock(), "value": value}
+        self._store(key, entry)
+        if self.backend is not None:
+            self.backend.set(key, entry)
+
+    def get_or_load(self, key: str, loader: Callable[[], Any]) -> Any:
+        """
+        Returns the cached value or loads and stores it. Concurrent callers of the same key share one load.
+        """
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            value = self.get(key)
+            if value is None:
+                logging.debug("Cache miss, loading value")
+                value = loader()
+                self.set(key, value)
+            return value
+
+    def _store(self, key: str, entry: Dict) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -0,0 +1,62 @@
+import logging
+import time
+from typing import Callable, Optional
+
+# final status reported for a job killed on passing the hard deadline
+JOB_STATUS_TIMEOUT = "timeout"
+
+
+class WaitDeadline:
+    """
+    Soft and hard limits of a wait in seconds. Passing the soft deadline logs a warning and calls on_soft once,
+    passing the hard deadline means the job is to be killed.
+
+    Args:
+        soft: seconds after which the wait is reported as late
+        hard: seconds after which the job is killed
+        elapsed: seconds the job already ran before the wait started, e.g. when a wait is resumed
+        on_soft: called with the job ID when the soft deadline passes
+    """
+
+    def __init__(self, soft: Optional[float] = None, hard: Optional[float] = None, elapsed: float = 0.0,
+                 on_soft: Optional[Callable[[str], None]] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        if (soft is not None and soft <= 0) or (hard is not None and hard <= 0):
+            raise ValueError("deadlines must be positive")
+        if soft is not None and hard is not None and soft >= hard:
+            raise ValueError("the soft deadline must be shorter than the hard one")
+        self.soft = soft
+        self.hard = hard
+        self.on_soft = on_soft
+        self._clock = clock
+        self._started = clock() - elapsed
+        self.soft_passed = False
+
+    def elapsed(self) -> float:
+        return self._clock() - self._started
+
+    def check(self, job_id: str) -> bool:
+        """
+        Handles the passed deadlines of the still running job.
+
+        Returns:
+            True if the hard deadline passed.
+        """
+        elapsed = self.elapsed()
+        if self.soft is not None and not self.soft_passed and elapsed >= self.soft:
+            self.soft_passed = True
+            logging.warning(f"Job {job_id} is still running after {elapsed:.0f} s, "
+                            f"longer than the soft deadline of {self.soft:.0f} s")
+            if self.on_soft is not None:
+                self.on_soft(job_id)
+        return self.hard is not None and elapsed >= self.hard
+
+    def cap(self, interval: float) -> float:
+        """
+        Shortens the sleep before the next status check so that no deadline is overslept.
+        """
+        elapsed = self.elapsed()
+        upcoming = [d for d in (None if self.soft_passed else self.soft, self.hard) if d is not None and d > elapsed]
+        if not upcoming:
+            return interval
+        return max(0.0, min(interval, min(upcoming) - elapsed))
@@ -0,0 +1,84 @@
+import statistics
+from datetime import datetime
+from typing import Dict, List, Optional
+
+DEFAULT_HISTORY_SIZE = 20
+# outliers are reported only with enough history to tell what is usual
+MIN_OUTLIER_SAMPLES = 5
+OUTLIER_MAD_FACTOR = 3
+OUTLIER_MIN_DEVIATION = 0.25
+# scales the median absolute deviation to the standard deviation of normally distributed durations
+MAD_SCALE = 1.4826
+
+
+def job_run_seconds(job: Dict) -> Optional[float]:
+    """
+    Seconds from the creation to the end of a finished job, including the time it waited in the queue,
+    or its durationSeconds if the times are missing.
+    """
+    created, ended = job.get("createdTime"), job.get("endTime")
+    if created and ended:
+        try:
+            return (datetime.fromisoformat(ended) - datetime.fromisoformat(created)).total_seconds()
+        except ValueError:
+            pass
+    if job.get("durationSeconds") is not None:
+        return float(job["durationSeconds"])
+    return None
+
+
+class DurationHistory:
+    """
+    Recent run durations and final statuses of each flow, kept in the component state as a fixed-size ring buffer
+    of compact [seconds, status, job ID] entries per flow configuration ID, oldest first.
+    """
+
+    def __init__(self, state: Optional[Dict] = None, size: int = DEFAULT_HISTORY_SIZE) -> None:
+        self.size = size
+        self._flows: Dict[str, List[List]] = {str(k): [list(e) for e in v][-size:] for k, v in (state or {}).items()}
+
+    def to_state(self) -> Dict:
+        return self._flows
+
+    def has(self, flow_id: str) -> bool:
+        return str(flow_id) in self._flows
+
+    def seed(self, flow_id: str, jobs: List[Dict]) -> None:
+        """
+        Fills the history of the flow from the job list of the Queue API, newest jobs first.
+        """
+        entries = self._flows.setdefault(str(flow_id), [])
+        for job in reversed(jobs):
+            seconds = job_run_seconds(job)
+            if job.get("isFinished") and seconds is not None:
+                self._append(entries, [round(seconds, 1), job.get("status"), str(job.get("id"))])
+
+    def record(self, flow_id: str, job_id: str, seconds: float, status: str) -> None:
+        self._append(self._flows.setdefault(str(flow_id), []), [round(seconds, 1), status, str(job_id)])
+
+    def _append(self, entries: List[List], entry: List) -> None:
+        if any(e[2] == entry[2] for e in entries):
+            return
+        entries.append(entry)
+        del entries[:-self.size]
+
+    def successful_durations(self, flow_id: str) -> List[float]:
+        return [e[0] for e in self._flows.get(str(flow_id), []) if str(e[1]).lower() == "success"]
+
+    def expected_duration(self, flow_id: str) -> Optional[float]:
+        durations = self.successful_durations(flow_id)
+        return statistics.median(durations) if durations else None
+
+    def outlier(self, flow_id: str, seconds: float) -> Optional[float]:
+        """
+        Returns the usual (median) duration if the given duration is far from it, otherwise None.
+        """
+        durations = self.successful_durations(flow_id)
+        if len(durations) < MIN_OUTLIER_SAMPLES:
+            return None
+        median = statistics.median(durations)
+        spread = MAD_SCALE * statistics.median(abs(d - median) for d in durations)
+        deviation = abs(seconds - median)
+        if deviation > OUTLIER_MAD_FACTOR * spread and deviation > OUTLIER_MIN_DEVIATION * median:
+            return median
+        return None
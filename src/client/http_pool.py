@@ -0,0 +1,216 @@
+import hashlib
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+DEFAULT_RATE = 10
+DEFAULT_BURST = 20
+DEFAULT_MIN_RATE = 0.5
+DEFAULT_COOLDOWN = 1.0
+# a throttled request was not processed, so it is safe to repeat it whatever its method is
+THROTTLED_STATUS = 429
+
+
+def is_throttling_status(status_code: int) -> bool:
+    return status_code == THROTTLED_STATUS or status_code >= 500
+
+
+class TokenBucketRateLimiter:
+    """
+    Token bucket shared by all clients of the process. Every request takes a token, the bucket refills at rate
+    tokens per second up to burst tokens. Throttling responses halve the rate and pause all requests for the
+    Retry-After period (or the cooldown), successful responses restore the rate gradually.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: float = DEFAULT_BURST, min_rate: float = DEFAULT_MIN_RATE,
+                 cooldown: float = DEFAULT_COOLDOWN, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        if rate <= 0 or burst < 1 or min_rate <= 0:
+            raise ValueError("rate and min_rate must be positive and burst at least 1")
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min(min_rate, rate)
+        self.cooldown = cooldown
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Blocks until a request may be sent.
+
+        Returns:
+            Seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._refill()
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+            waited += wait
+
+    def backoff(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            now = self._refill()
+            self.rate = max(self.min_rate, self.rate / 2)
+            pause = retry_after if retry_after is not None else self.cooldown
+            self._blocked_until = max(self._blocked_until, now + pause)
+            self._tokens = min(self._tokens, 0.0)
+
+    def on_success(self) -> None:
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+    def _refill(self) -> float:
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+
+class RateLimitedRetry(Retry):
+    """
+    urllib3 Retry that honours Retry-After, retries throttled requests of any method and reports every retried
+    response to the rate limiter, so the retries of all clients back off together.
+    """
+    rate_limiter: Optional[TokenBucketRateLimiter] = None
+
+    def new(self, **kw) -> "RateLimitedRetry":
+        retry = super().new(**kw)
+        retry.rate_limiter = self.rate_limiter
+        return retry
+
+    def is_retry(self, method, status_code, has_retry_after=False) -> bool:
+        if status_code == THROTTLED_STATUS and self.total is not None and self.total > 0:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def sleep(self, response=None) -> None:
+        if self.rate_limiter is not None and response is not None and is_throttling_status(response.status):
+            self.rate_limiter.backoff(self.get_retry_after(response))
+        super().sleep(response)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+
+def build_retry_session(max_retries: int, backoff_factor: float, status_forcelist: tuple, pool_maxsize: int,
+                        rate_limiter: Optional[TokenBucketRateLimiter] = None) -> requests.Session:
+    session = requests.Session()
+    retry = RateLimitedRetry(
+        total=max_retries,
+        read=max_retries,
+        connect=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist
+    )
+    retry.rate_limiter = rate_limiter
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class ConnectionPoolRegistry:
+    """
+    Process-wide registry of keep-alive sessions, one per host and token, so all clients talking to the same
+    stack with the same token share one connection pool.
+
+    Args:
+        share_across_tokens: keep one session per host for all tokens. The token travels in the header of each
+            request and the sessions store no cookies, so the projects on one stack reuse the same connections.
+    """
+
+    def __init__(self, share_across_tokens: bool = False) -> None:
+        self.share_across_tokens = share_across_tokens
+        self._sessions: Dict[Tuple[str, str], requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def key(self, url: str, token: str) -> Tuple[str, str]:
+        parsed = urlparse(url)
+        if self.share_across_tokens:
+            return f"{parsed.scheme}://{parsed.netloc}", ""
+        return f"{parsed.scheme}://{parsed.netloc}", hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get_session(self, url: str, token: str, factory: Callable[[], requests.Session]) -> requests.Session:
+        key = self.key(url, token)
+        with self._lock:
+            if key not in self._sessions:
+                session = factory()
+                if self.share_across_tokens:
+                    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                self._sessions[key] = session
+            return self._sessions[key]
+
+    def close_all(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+class RateLimitedRequests:
+    """
+    Drop-in replacement of the kbcstorage RetryRequests, sends the Storage API requests through a shared pooled
+    session and the rate limiter instead of a new connection per request.
+    """
+
+    def __init__(self, session: requests.Session, rate_limiter: TokenBucketRateLimiter) -> None:
+        self.session = session
+        self.rate_limiter = rate_limiter
+
+    def _request(self, method: str, url: str, *args, **kwargs) -> requests.Response:
+        self.rate_limiter.acquire()
+        response = self.session.request(method, url, *args, **kwargs)
+        report_response(self.rate_limiter, response)
+        return response
+
+    def get(self, url, *args, **kwargs):
+        return self._request("GET", url, *args, **kwargs)
+
+    def post(self, url, *args, **kwargs):
+        return self._request("POST", url, *args, **kwargs)
+
+    def put(self, url, *args, **kwargs):
+        return self._request("PUT", url, *args, **kwargs)
+
+    def delete(self, url, *args, **kwargs):
+        return self._request("DELETE", url, *args, **kwargs)
+
+
+def retry_after_seconds(response: requests.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def report_response(rate_limiter: TokenBucketRateLimiter, response: requests.Response) -> None:
+    if is_throttling_status(response.status_code):
+        rate_limiter.backoff(retry_after_seconds(response))
+    else:
+        rate_limiter.on_success()
+
+
+connection_pools = ConnectionPoolRegistry()
+shared_rate_limiter = TokenBucketRateLimiter()
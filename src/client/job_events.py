@@ -0,0 +1,140 @@
+import json
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import requests
+
+from .http_pool import (ConnectionPoolRegistry, RateLimitedRequests, TokenBucketRateLimiter, build_retry_session,
+                        connection_pools, shared_rate_limiter)
+from .queue_api import (QueueApiClient, QueueApiClientException, DEFAULT_BACKOFF_FACTOR, DEFAULT_MAX_RETRIES,
+                        DEFAULT_POOL_MAXSIZE, DEFAULT_STATUS_FORCELIST)
+
+DEFAULT_INTERVAL = 5
+DEFAULT_PAGE_LIMIT = 100
+DEFAULT_MAX_PAGES = 5
+DEFAULT_STOP_TIMEOUT = 10
+
+EVENT_LOG_LEVELS = {"warn": logging.WARNING, "warning": logging.WARNING, "error": logging.ERROR}
+
+
+class JobEventTail:
+    """
+    Streams the events of a running job and the progress of its child jobs to the log and to a JSON lines file.
+
+    A background thread fetches only the events newer than the since-id cursor and the child jobs whose status
+    changed, independently of the status polling, so it never delays the detection of the finished job.
+    Every fetched page is written out right away; memory is bounded by max_pages of page_limit events.
+
+    Usage:
+
+        tail = JobEventTail(queue_client, storage_url, token, "out/files/job_events.jsonl").start(job_id)
+        status = queue_client.wait_until_job_finished(job_id)
+        tail.stop()
+    """
+
+    def __init__(self, queue_client: QueueApiClient, storage_url: str, token: str, output_path: str,
+                 interval: float = DEFAULT_INTERVAL, page_limit: int = DEFAULT_PAGE_LIMIT,
+                 max_pages: int = DEFAULT_MAX_PAGES,
+                 rate_limiter: TokenBucketRateLimiter = shared_rate_limiter,
+                 pool_registry: ConnectionPoolRegistry = connection_pools) -> None:
+        self._queue_client = queue_client
+        self._events_url = f"{storage_url.rstrip('/')}/v2/storage/events"
+        self._headers = {"X-StorageApi-Token": token}
+        self.output_path = output_path
+        self.interval = interval
+        self.page_limit = page_limit
+        self.max_pages = max_pages
+        session = pool_registry.get_session(self._events_url, token, lambda: build_retry_session(
+            DEFAULT_MAX_RETRIES, DEFAULT_BACKOFF_FACTOR, DEFAULT_STATUS_FORCELIST, DEFAULT_POOL_MAXSIZE, rate_limiter))
+        self._requests = RateLimitedRequests(session, rate_limiter)
+        self._job_id: Optional[str] = None
+        self._cursor: Optional[int] = None
+        self._child_statuses: Dict[str, str] = {}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.events_written = 0
+
+    def start(self, job_id: str) -> "JobEventTail":
+        self._job_id = str(job_id)
+        self._thread = threading.Thread(target=self._run, name=f"job-events-{job_id}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = DEFAULT_STOP_TIMEOUT) -> None:
+        """
+        Fetches the remaining events of the finished job and stops the tail.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def poll_once(self) -> None:
+        lines = [self._event_line(event) for event in self._fetch_new_events()]
+        lines.extend(self._child_job_lines())
+        if not lines:
+            return
+        with open(self.output_path, "a") as output:
+            for line in lines:
+                output.write(json.dumps(line, separators=(",", ":")) + "\n")
+        self.events_written += len(lines)
+
+    def _run(self) -> None:
+        while True:
+            stopping = self._stopped.is_set()
+            try:
+                self.poll_once()
+            except (requests.RequestException, QueueApiClientException, OSError, ValueError) as e:
+                logging.debug(f"Could not fetch events of job {self._job_id}: {e}")
+            if stopping:
+                return
+            self._stopped.wait(self.interval)
+
+    def _fetch_new_events(self) -> List[Dict]:
+        """
+        Returns the events newer than the cursor, oldest first. The API returns the newest events first, so pages
+        are read backwards from the newest event until the cursor, or on the first fetch the oldest event,
+        is reached.
+        """
+        events = []
+        max_id = None
+        for _ in range(self.max_pages):
+            params = {"runId": self._job_id, "limit": self.page_limit}
+            if self._cursor is not None:
+                params["sinceId"] = self._cursor
+            if max_id is not None:
+                params["maxId"] = max_id
+            response = self._requests.get(self._events_url, params=params, headers=self._headers, timeout=10)
+            response.raise_for_status()
+            page = [e for e in response.json() if self._cursor is None or int(e["id"]) > self._cursor]
+            events.extend(page)
+            if len(page) < self.page_limit:
+                break
+            max_id = min(int(e["id"]) for e in page) - 1
+        else:
+            logging.warning(f"More than {self.page_limit * self.max_pages} new events of job {self._job_id}, "
+                            f"older ones are not streamed")
+
+        events.sort(key=lambda e: int(e["id"]))
+        if events:
+            self._cursor = int(events[-1]["id"])
+        return events
+
+    def _event_line(self, event: Dict) -> Dict:
+        level = EVENT_LOG_LEVELS.get(str(event.get("type")).lower(), logging.INFO)
+        logging.log(level, f"[job {self._job_id}] {event.get('component', '')}: {event.get('message')}")
+        return {"jobId": self._job_id, "eventId": event["id"], "created": event.get("created"),
+                "type": event.get("type"), "component": event.get("component"), "message": event.get("message")}
+
+    def _child_job_lines(self) -> List[Dict]:
+        lines = []
+        for child in self._queue_client.list_child_jobs(self._job_id):
+            child_id, status = str(child.get("id")), child.get("status")
+            if self._child_statuses.get(child_id) == status:
+                continue
+            self._child_statuses[child_id] = status
+            logging.info(f"[job {self._job_id}] child job {child_id} of {child.get('component')} "
+                         f"configuration {child.get('config')} is {status}")
+            lines.append({"jobId": self._job_id, "childJobId": child_id, "component": child.get("component"),
+                          "config": child.get("config"), "status": status})
+        return lines
@@ -0,0 +1,211 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set
+
+from .deadline import JOB_STATUS_TIMEOUT, WaitDeadline
+from .notifications import NotificationTransport
+from .polling import FixedPollStrategy, PollStrategy
+from .queue_api import QueueApiClient, QueueApiClientException, http_status
+
+
+class JobStatusMultiplexer:
+    """
+    Waits for many jobs of one project at once. Every tick checks all tracked jobs with a single request
+    to the job list endpoint filtered by ids; if the endpoint does not honour the filter, the jobs are checked
+    with parallel job detail requests over the pooled session of the client. A job-finished notification
+    from the notifications transport wakes the multiplexer up, and while every pending job is subscribed
+    to the notifications, the safety_net_strategy replaces the poll_strategy.
+
+    Usage:
+
+        multiplexer = JobStatusMultiplexer(client)
+        futures = [multiplexer.track(job_id) for job_id in job_ids]
+        statuses = [f.result() for f in futures]
+        multiplexer.close()
+    """
+
+    def __init__(self, client: QueueApiClient, poll_strategy: Optional[PollStrategy] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Optional[Callable[[float], None]] = None,
+                 notifications: Optional[NotificationTransport] = None,
+                 safety_net_strategy: Optional[PollStrategy] = None) -> None:
+        self._client = client
+        self._poll_strategy = poll_strategy or FixedPollStrategy()
+        self._safety_net_strategy = safety_net_strategy
+        self._clock = clock
+        self._wakeup = threading.Event()
+        self._sleep = sleep or self._wakeup.wait
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+        self._deadlines: Dict[str, WaitDeadline] = {}
+        self._notified: Set[str] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._restart_schedule = False
+        self.batch_supported = True
+        self._notifications = notifications
+        if notifications is not None:
+            # a finished tracked job ends the sleep, the status is then confirmed by the next poll
+            notifications.add_listener(self._on_notification)
+
+    def track(self, job_id: str, deadline: Optional[WaitDeadline] = None, notified: bool = False) -> Future:
+        """
+        Starts tracking the job, the returned future resolves to the final job status. A job still running
+        after the hard deadline is killed and resolves to JOB_STATUS_TIMEOUT. Pass notified=True for a job
+        subscribed to job-finished notifications.
+        """
+        job_id = str(job_id)
+        with self._lock:
+            future = self._pending.get(job_id)
+            if future is None:
+                future = self._pending[job_id] = Future()
+                if deadline is not None:
+                    self._deadlines[job_id] = deadline
+                if notified:
+                    self._notified.add(job_id)
+                self._restart_schedule = True
+                self._wakeup.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="job-status-multiplexer", daemon=True)
+                self._thread.start()
+        return future
+
+    def _on_notification(self, job_id: str, status: str) -> None:
+        with self._lock:
+            if job_id in self._pending:
+                self._wakeup.set()
+
+    def close(self) -> None:
+        if self._notifications is not None:
+            self._notifications.remove_listener(self._on_notification)
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._deadlines = {}
+            self._notified = set()
+            thread = self._thread
+        for future in pending.values():
+            future.cancel()
+        self._wakeup.set()
+        if thread is not None:
+            thread.join()
+
+    def poll_once(self) -> None:
+        """
+        Checks all tracked jobs and resolves the futures of the finished ones.
+        """
+        with self._lock:
+            job_ids = list(self._pending)
+        if not job_ids:
+            return
+
+        for job_detail in self._fetch(job_ids):
+            job_id = str(job_detail.get("id"))
+            if job_detail.get("isFinished"):
+                self._resolve(job_id, job_detail.get("status"))
+                continue
+            with self._lock:
+                deadline = self._deadlines.get(job_id)
+            if deadline is not None and deadline.check(job_id):
+                try:
+                    self._client.kill_job(job_id)
+                except QueueApiClientException as api_exc:
+                    self._resolve(job_id, exception=api_exc)
+                else:
+                    self._resolve(job_id, JOB_STATUS_TIMEOUT)
+
+    def _resolve(self, job_id: str, status: Optional[str] = None, exception: Optional[Exception] = None) -> None:
+        with self._lock:
+            future = self._pending.pop(job_id, None)
+            self._deadlines.pop(job_id, None)
+            self._notified.discard(job_id)
+        if future is None:
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(status)
+
+    def _next_interval(self, attempt: int, elapsed: float) -> float:
+        with self._lock:
+            deadlines = list(self._deadlines.values())
+            # notifications report the finish, polling is only the safety net for the lost ones
+            notified_only = self._safety_net_strategy is not None and self._notified.issuperset(self._pending)
+        strategy = self._safety_net_strategy if notified_only else self._poll_strategy
+        interval = strategy.next_interval(attempt, elapsed)
+        for deadline in deadlines:
+            interval = deadline.cap(interval)
+        return interval
+
+    def _fetch(self, job_ids: List[str]) -> List[Dict]:
+        missing = job_ids
+        details = []
+        if self.batch_supported:
+            try:
+                details = self._client.list_jobs(job_ids)
+            except QueueApiClientException as api_exc:
+                # only a rejected filter turns batching off, other errors fall back for this tick only
+                if http_status(api_exc) == 400:
+                    self.batch_supported = False
+                logging.debug(f"Listing jobs by ids failed, falling back to job detail requests: {api_exc}")
+                details = []
+            returned_ids = {str(d.get("id")) for d in details}
+            if not returned_ids.issubset(job_ids):
+                logging.debug("Job list endpoint ignores the id filter, falling back to job detail requests")
+                details, returned_ids = [], set()
+                self.batch_supported = False
+            missing = [job_id for job_id in job_ids if job_id not in returned_ids]
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(len(missing), self._client.pool_maxsize)) as executor:
+                details.extend(d for d in executor.map(self._get_job_detail, missing) if d is not None)
+        return details
+
+    def _get_job_detail(self, job_id: str) -> Optional[Dict]:
+        """
+        Returns the job detail, a job whose detail cannot be fetched is resolved with the error, so it does not
+        fail the other tracked jobs.
+        """
+        try:
+            return self._client.get_job_detail(job_id)
+        except QueueApiClientException as api_exc:
+            self._resolve(job_id, exception=api_exc)
+            return None
+
+    def _run(self) -> None:
+        attempt = 0
+        started = self._clock()
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._thread = None
+                    return
+                if self._restart_schedule:
+                    self._restart_schedule = False
+                    self._poll_strategy.reset()
+                    attempt = 0
+                    started = self._clock()
+                # cleared before the poll, so a job tracked or notified while polling cuts the next sleep short
+                self._wakeup.clear()
+
+            attempt += 1
+            try:
+                with self._client.recorder.span("poll", jobs=len(self._pending)):
+                    self.poll_once()
+            except Exception as exc:
+                self._fail_pending(exc)
+                continue
+
+            with self._lock:
+                if not self._pending or self._restart_schedule:
+                    continue
+            with self._client.recorder.span("sleep"):
+                self._sleep(self._next_interval(attempt, self._clock() - started))
+
+    def _fail_pending(self, exc: Exception) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._deadlines = {}
+            self._notified = set()
+        for future in pending.values():
+            future.set_exception(exc)
@@ -0,0 +1,194 @@
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from keboola.http_client import HttpClient
+from requests.exceptions import HTTPError
+
+# the HTTP server is imported where the listener starts, runs without completion notifications do not need it
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+# notification events of a finished job and the job status they stand for
+JOB_FINISHED_EVENTS = {"job-succeeded": "success", "job-succeeded-with-warning": "warning", "job-failed": "error"}
+MAX_REMEMBERED_NOTIFICATIONS = 1000
+
+
+class NotificationTransport(ABC):
+    """
+    Delivers job-finished notifications to the waiting component. Notifications only wake the waiter up,
+    the job status is always confirmed by the Queue API.
+    """
+
+    @abstractmethod
+    def wait(self, job_id: str, timeout: float) -> Optional[str]:
+        """
+        Waits at most timeout seconds for a notification of the finished job.
+
+        Returns:
+            The notified job status or None if no notification arrived in time.
+        """
+
+    @abstractmethod
+    def add_listener(self, listener: Callable[[str, str], None]) -> None:
+        """
+        Registers a callback called with the job ID and status of every received notification.
+        """
+
+    @abstractmethod
+    def remove_listener(self, listener: Callable[[str, str], None]) -> None:
+        """
+        Unregisters a callback registered by add_listener, unknown callbacks are ignored.
+        """
+
+    def start(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class LocalNotificationTransport(NotificationTransport):
+    """
+    In-process transport, notifications are handed over by calling notify. Remembers the last
+    MAX_REMEMBERED_NOTIFICATIONS notifications, so a notification received before the wait started is not lost.
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._received: "OrderedDict[str, str]" = OrderedDict()
+        self._listeners: List[Callable[[str, str], None]] = []
+
+    def notify(self, job_id: str, status: str) -> None:
+        with self._condition:
+            self._received[str(job_id)] = status
+            while len(self._received) > MAX_REMEMBERED_NOTIFICATIONS:
+                self._received.popitem(last=False)
+            self._condition.notify_all()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(str(job_id), status)
+
+    def add_listener(self, listener: Callable[[str, str], None]) -> None:
+        with self._condition:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, str], None]) -> None:
+        with self._condition:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def wait(self, job_id: str, timeout: float) -> Optional[str]:
+        job_id = str(job_id)
+        with self._condition:
+            self._condition.wait_for(lambda: job_id in self._received, timeout)
+            return self._received.pop(job_id, None)
+
+
+def parse_job_notification(payload: Dict) -> Optional[tuple]:
+    """
+    Returns the job ID and status of a job-finished notification, None for other payloads.
+    """
+    data = payload.get("data") if isinstance(payload.get("data"), dict) else payload
+    job = data.get("job") if isinstance(data.get("job"), dict) else {}
+    job_id = job.get("id") or data.get("jobId")
+    status = job.get("status") or JOB_FINISHED_EVENTS.get(payload.get("event"))
+    if job_id is None or status is None:
+        return None
+    return str(job_id), status
+
+
+class WebhookListener(LocalNotificationTransport):
+    """
+    Receives job-finished notifications as JSON POST requests on a local HTTP port.
+    """
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 0) -> None:
+        super().__init__()
+        self.host = host
+        self.port = port
+        self._server: Optional["ThreadingHTTPServer"] = None
+
+    def start(self) -> None:
+        from http.server import ThreadingHTTPServer
+
+        if self._server is not None:
+            return
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_port
+        threading.Thread(target=self._server.serve_forever, name="webhook-listener", daemon=True).start()
+        logging.info(f"Listening for job notifications on port {self.port}")
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _handler(self):
+        from http.server import BaseHTTPRequestHandler
+
+        listener = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    notification = parse_job_notification(json.loads(self.rfile.read(length) or b"{}"))
+                except ValueError:
+                    notification = None
+                self.send_response(202 if notification else 400)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                if notification:
+                    listener.notify(*notification)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def notification_url(queue_url: str) -> str:
+    """
+    Returns the Notification API URL of the stack the Queue API URL belongs to.
+    """
+    return queue_url.replace("://queue.", "://notification.", 1)
+
+
+class NotificationSubscriber(HttpClient):
+    """
+    Subscribes a webhook to the job-finished events of single jobs through the Keboola Notification API.
+    """
+
+    def __init__(self, sapi_token: str, queue_url: str) -> None:
+        super().__init__(notification_url(queue_url), max_retries=3, auth_header={"X-StorageApi-Token": sapi_token})
+
+    def subscribe_job(self, job_id: str, webhook_url: str) -> List[str]:
+        """
+        Returns the IDs of the created subscriptions, one per job-finished event.
+        """
+        subscription_ids = []
+        for event in JOB_FINISHED_EVENTS:
+            try:
+                subscription = self.post(endpoint_path="project-subscriptions", json={
+                    "event": event,
+                    "filters": [{"field": "job.id", "value": str(job_id)}],
+                    "recipient": {"channel": "webhook", "address": webhook_url}})
+            except HTTPError as http_err:
+                self.unsubscribe(subscription_ids)
+                raise http_err
+            subscription_ids.append(str(subscription.get("id")))
+        return subscription_ids
+
+    def unsubscribe(self, subscription_ids: List[str]) -> None:
+        for subscription_id in subscription_ids:
+            try:
+                self.delete_raw(endpoint_path=f"project-subscriptions/{subscription_id}")
+            except Exception as e:
+                logging.debug(f"Could not remove notification subscription {subscription_id}: {e}")
@@ -0,0 +1,96 @@
+import random
+from abc import ABC, abstractmethod
+from typing import Optional
+
+DEFAULT_POLL_INTERVAL = 10.0
+DEFAULT_INITIAL_INTERVAL = 1.0
+DEFAULT_MAX_INTERVAL = 60.0
+DEFAULT_MULTIPLIER = 2.0
+DEFAULT_JITTER = 0.1
+# longest single sleep of the ETA strategy before the expected finish, a safety net for a wrong estimate
+DEFAULT_ETA_MAX_SLEEP = 3600.0
+
+
+class PollStrategy(ABC):
+    """
+    Decides how long to sleep between two job detail requests.
+    """
+
+    def reset(self) -> None:
+        """
+        Called before a new wait starts, strategies holding per-wait state should clear it here.
+        """
+
+    @abstractmethod
+    def next_interval(self, attempt: int, elapsed: float) -> float:
+        """
+        Args:
+            attempt: number of polls already done for the current wait, starting at 1
+            elapsed: seconds since the wait started
+
+        Returns:
+            Number of seconds to sleep before the next poll.
+        """
+
+
+class FixedPollStrategy(PollStrategy):
+    def __init__(self, interval: float = DEFAULT_POLL_INTERVAL) -> None:
+        if interval <= 0:
+            raise ValueError("Polling interval must be positive.")
+        self.interval = interval
+
+    def next_interval(self, attempt: int, elapsed: float) -> float:
+        return self.interval
+
+
+class ExponentialBackoffPollStrategy(PollStrategy):
+    def __init__(self, initial_interval: float = DEFAULT_INITIAL_INTERVAL,
+                 max_interval: float = DEFAULT_MAX_INTERVAL,
+                 multiplier: float = DEFAULT_MULTIPLIER,
+                 jitter: float = DEFAULT_JITTER,
+                 rng: Optional[random.Random] = None) -> None:
+        if initial_interval <= 0 or max_interval < initial_interval:
+            raise ValueError("Polling intervals must be positive and the maximum must not be lower than the initial.")
+        if not 0 <= jitter < 1:
+            raise ValueError("Polling jitter must be in the interval [0, 1).")
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self._rng = rng or random.Random()
+
+    def next_interval(self, attempt: int, elapsed: float) -> float:
+        interval = min(self.max_interval, self.initial_interval * self.multiplier ** max(attempt - 1, 0))
+        if self.jitter:
+            interval *= self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+        return min(interval, self.max_interval)
+
+
+class EtaPollStrategy(PollStrategy):
+    """
+    Sleeps until close to the expected finish time of the job and falls back to exponential backoff
+    once the expected duration has passed or when there is no history to derive it from. The sleeps before
+    the expected finish are bounded only by max_sleep, not by the ceiling of the backoff, so a long job
+    is checked just a few times before it is expected to finish.
+    """
+
+    def __init__(self, expected_duration: Optional[float], fallback: ExponentialBackoffPollStrategy,
+                 lead_time: float = DEFAULT_INITIAL_INTERVAL, max_sleep: float = DEFAULT_ETA_MAX_SLEEP) -> None:
+        self.expected_duration = expected_duration
+        self.fallback = fallback
+        self.lead_time = lead_time
+        self.max_sleep = max_sleep
+        self._attempts_past_eta = 0
+
+    def reset(self) -> None:
+        self._attempts_past_eta = 0
+        self.fallback.reset()
+
+    def next_interval(self, attempt: int, elapsed: float) -> float:
+        if self.expected_duration is not None:
+            remaining = self.expected_duration - self.lead_time - elapsed
+            if remaining > self.fallback.initial_interval:
+                return min(remaining, self.max_sleep)
+
+        self._attempts_past_eta += 1
+        return self.fallback.next_interval(self._attempts_past_eta, elapsed)
@@ -1,28 +1,136 @@
 import json
 import logging
 import time
-from typing import Dict, Optional, List
+from typing import Callable, Dict, Optional, List, Sequence
 
 import requests
 from keboola.http_client import HttpClient
-from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
-from requests.packages.urllib3.util.retry import Retry
+
+from .deadline import JOB_STATUS_TIMEOUT, WaitDeadline
+from .notifications import NotificationTransport
+from .http_pool import (ConnectionPoolRegistry, TokenBucketRateLimiter, build_retry_session, connection_pools,
+                        report_response, shared_rate_limiter)
+from .polling import FixedPollStrategy, PollStrategy
+from .timing import TimingRecorder
 
 QUEUE_V2_URL = "https://queue.{STACK}keboola.com"
 CLOUD_URL = "https://queue.{STACK}.keboola.cloud"
 TOKENS_URL = "https://connection.keboola.com/v2/storage/tokens/verify"
 
+FLOW_COMPONENT_ID = "keboola.orchestrator"
+
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_MAX_RETRIES = 10
+DEFAULT_BACKOFF_FACTOR = 0.3
+DEFAULT_STATUS_FORCELIST = (429, 500, 502, 503, 504)
+# job statuses of a flow that has not finished yet
+ACTIVE_JOB_STATUSES = ("created", "waiting", "processing")
+FINISHED_JOB_STATUSES = ("success", "warning", "error", "terminated", "cancelled")
+
 
 class QueueApiClientException(Exception):
     pass
 
 
+def http_status(error: Exception) -> Optional[int]:
+    """
+    The HTTP status of a failed request, also when the HTTPError is wrapped in a QueueApiClientException.
+    """
+    while error is not None:
+        response = getattr(error, "response", None)
+        if response is not None:
+            return response.status_code
+        error = error.__cause__
+    return None
+
+
+def api_exception_from_response(response_text: str) -> QueueApiClientException:
+    response_error = json.loads(response_text)
+    #  Old Orchestration error handling
+    if response_error.get('code') == 400:
+        return QueueApiClientException(
+            f"{response_error.get('error')}. Exception code {response_error.get('code')}.\n"
+            f"Make sure the Orchestration ID set is a Orchestration V2, "
+            f"follow the documentation to find out what type of orchestration your project is using")
+    return QueueApiClientException(
+        f"{response_error.get('error')}. Exception code {response_error.get('code')}")
+
+
+def run_orchestration_payload(orch_id: str, variables: Optional[List[Dict]]) -> Dict:
+    data = {"component": FLOW_COMPONENT_ID,
+            "mode": "run",
+            "config": orch_id}
+    if variables:
+        data["variableValuesData"] = {"values": variables}
+    return data
+
+
+def list_jobs_params(job_ids: List[str]) -> Dict:
+    return {"id[]": list(job_ids), "limit": len(job_ids)}
+
+
+def recent_jobs_params(orch_id: str, limit: int, statuses: Sequence[str] = ("success",)) -> Dict:
+    return {"componentId[]": FLOW_COMPONENT_ID,
+            "configId[]": orch_id,
+            "status[]": list(statuses),
+            "limit": limit,
+            "sortBy": "id",
+            "sortOrder": "desc"}
+
+
+def active_jobs_params(orch_id: str, limit: int = 100) -> Dict:
+    return {"componentId[]": FLOW_COMPONENT_ID,
+            "configId[]": orch_id,
+            "status[]": list(ACTIVE_JOB_STATUSES),
+            "limit": limit,
+            "sortBy": "id",
+            "sortOrder": "asc"}
+
+
+def matching_active_job(jobs: List[Dict], variables: Optional[List[Dict]] = None) -> Optional[Dict]:
+    """
+    Returns the oldest of the active jobs, if variables are given only a job run with the same variable values
+    matches.
+    """
+    for job in jobs:
+        if job.get("isFinished") or job.get("status") not in ACTIVE_JOB_STATUSES:
+            continue
+        if variables is not None:
+            job_variables = (job.get("variableValuesData") or {}).get("values") or []
+            if _variable_values(job_variables) != _variable_values(variables):
+                continue
+        return job
+    return None
+
+
+def _variable_values(variables: List[Dict]) -> Dict:
+    return {variable.get("name"): variable.get("value") for variable in variables}
+
+
+def child_jobs_params(run_id: str, limit: int = 100) -> Dict:
+    return {"parentRunId": run_id, "limit": limit}
+
+
 class QueueApiClient(HttpClient):
-    def __init__(self, sapi_token: str, keboola_stack: str, custom_stack: Optional[str]) -> None:
+    def __init__(self, sapi_token: str, keboola_stack: str, custom_stack: Optional[str],
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 recorder: Optional[TimingRecorder] = None,
+                 rate_limiter: TokenBucketRateLimiter = shared_rate_limiter,
+                 pool_registry: ConnectionPoolRegistry = connection_pools) -> None:
         auth_header = {"X-StorageApi-Token": sapi_token}
         job_url = self.get_stack_url(keboola_stack, custom_stack)
-        super().__init__(job_url, auth_header=auth_header)
+        super().__init__(job_url, max_retries=DEFAULT_MAX_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR,
+                         status_forcelist=DEFAULT_STATUS_FORCELIST, auth_header=auth_header)
+        self._clock = clock
+        self._sleep = sleep
+        self.pool_maxsize = pool_maxsize
+        self.recorder = recorder or TimingRecorder()
+        self.rate_limiter = rate_limiter
+        # one keep-alive session shared by all clients (and threads) using the same stack and token
+        self._session = pool_registry.get_session(job_url, sapi_token, self._requests_retry_session)
 
     @staticmethod
     def get_stack_url(keboola_stack: str, custom_stack: Optional[str]):
@@ -37,57 +145,152 @@ class QueueApiClient(HttpClient):
         return stack_url
 
     def run_orchestration(self, orch_id: str, variables: Optional[List[Dict]]) -> Dict:
-        data = {"component": "keboola.orchestrator",
-                "mode": "run",
-                "config": orch_id}
-        if variables:
-            data["variableValuesData"] = {"values": variables}
         header = {'Content-Type': 'application/json'}
+        data = json.dumps(run_orchestration_payload(orch_id, variables))
 
-        response = self.post_raw(endpoint_path="jobs", headers=header, data=json.dumps(data))  # noqa
+        with self.recorder.span("trigger", configId=str(orch_id)):
+            response = self.post_raw(endpoint_path="jobs", headers=header, data=data)  # noqa
         self._handle_http_error(response)
         return json.loads(response.text)
 
-    def wait_until_job_finished(self, job_id: str) -> str:
-        job_detail = None
-        is_finished = False
-        while not is_finished:
-            try:
-                job_detail = self.get(endpoint_path=f"jobs/{job_id}", timeout=10)
-                logging.debug(f"Job detail: {job_detail}")
-                is_finished = job_detail.get("isFinished")
-            except HTTPError as http_err:
-                raise QueueApiClientException(http_err) from http_err
-            time.sleep(10)
+    def wait_until_job_finished(self, job_id: str, poll_strategy: Optional[PollStrategy] = None,
+                                deadline: Optional[WaitDeadline] = None,
+                                notifications: Optional[NotificationTransport] = None,
+                                on_finished: Optional[Callable[[Dict], None]] = None) -> str:
+        """
+        Returns the final status of the job. If the hard deadline passes first, the job is killed
+        and JOB_STATUS_TIMEOUT is returned. With notifications, the sleep between status checks ends as soon as
+        a notification of the finished job arrives, the poll strategy then serves only as a safety net.
+        on_finished is called with the detail of the finished job, it is not called for a killed job.
+        """
+        poll_strategy = poll_strategy or FixedPollStrategy()
+        poll_strategy.reset()
+        started = self._clock()
+        attempt = 0
+        with self.recorder.span("wait", jobId=str(job_id)) as span:
+            while True:
+                attempt += 1
+                with self.recorder.span("poll", jobId=str(job_id)):
+                    job_detail = self.get_job_detail(job_id)
+                if job_detail.get("isFinished"):
+                    span["polls"] = attempt
+                    if on_finished is not None:
+                        on_finished(job_detail)
+                    return job_detail.get("status")
+
+                if deadline is not None and deadline.check(job_id):
+                    self.kill_job(job_id)
+                    span["polls"] = attempt
+                    span["killed"] = True
+                    return JOB_STATUS_TIMEOUT
+
+                interval = poll_strategy.next_interval(attempt, self._clock() - started)
+                if deadline is not None:
+                    interval = deadline.cap(interval)
+                logging.debug(f"Job {job_id} is not finished yet, next check in {interval:.1f} s")
+                with self.recorder.span("sleep"):
+                    if notifications is None:
+                        self._sleep(interval)
+                    elif notifications.wait(job_id, interval) is not None:
+                        logging.debug(f"Notified that job {job_id} finished, confirming its status")
+
+    def kill_job(self, job_id: str) -> None:
+        logging.warning(f"Killing job {job_id}, it did not finish within the hard deadline")
+        with self.recorder.span("kill", jobId=str(job_id)):
+            response = self.post_raw(endpoint_path=f"jobs/{job_id}/kill")
+        self._handle_http_error(response)
+
+    def get_job_detail(self, job_id: str) -> Dict:
+        try:
+            job_detail = self.get(endpoint_path=f"jobs/{job_id}", timeout=10)
+        except HTTPError as http_err:
+            raise QueueApiClientException(http_err) from http_err
+        logging.debug(f"Job detail: {job_detail}")
+        return job_detail
+
+    def warm_up(self) -> None:
+        """
+        Opens a keep-alive connection of the session with a minimal request, which also verifies the token.
+        """
+        try:
+            self.get(endpoint_path="jobs", params={"limit": 1}, timeout=10)
+        except HTTPError as http_err:
+            raise QueueApiClientException(http_err) from http_err
+
+    def find_active_job(self, orch_id: str, variables: Optional[List[Dict]] = None) -> Optional[Dict]:
+        """
+        Returns a created, waiting or processing job of the flow using a single request to the job list endpoint.
+        """
+        try:
+            jobs = self.get(endpoint_path="jobs", params=active_jobs_params(orch_id), timeout=10)
+        except HTTPError as http_err:
+            raise QueueApiClientException(http_err) from http_err
+        return matching_active_job(jobs, variables)
+
+    def list_jobs(self, job_ids: List[str]) -> List[Dict]:
+        """
+        Returns details of the given jobs using a single request to the job list endpoint.
+        """
+        try:
+            return self.get(endpoint_path="jobs", params=list_jobs_params(job_ids), timeout=10)
+        except HTTPError as http_err:
+            raise QueueApiClientException(http_err) from http_err
+
+    def list_child_jobs(self, run_id: str) -> List[Dict]:
+        """
+        Returns the jobs run by the flow job with the given run ID.
+        """
+        try:
+            return self.get(endpoint_path="jobs", params=child_jobs_params(run_id), timeout=10)
+        except HTTPError as http_err:
+            raise QueueApiClientException(http_err) from http_err
 
-        return job_detail.get("status")
+    def list_recent_jobs(self, orch_id: str, limit: int = 10) -> List[Dict]:
+        """
+        Returns the last finished jobs of the given flow in any final status, newest first.
+        """
+        try:
+            return self.get(endpoint_path="jobs", params=recent_jobs_params(orch_id, limit, FINISHED_JOB_STATUSES),
+                            timeout=10)
+        except HTTPError as http_err:
+            raise QueueApiClientException(http_err) from http_err
 
     @staticmethod
     def _handle_http_error(response):
         try:
             response.raise_for_status()
         except requests.HTTPError as e:
-            response_error = json.loads(e.response.text)
-            #  Old Orchestration error handling
-            if response_error.get('code') == 400:
-                raise QueueApiClientException(
-                    f"{response_error.get('error')}. Exception code {response_error.get('code')}.\n"
-                    f"Make sure the Orchestration ID set is a Orchestration V2, "
-                    f"follow the documentation to find out what type of orchestration your project is using") from e
-            raise QueueApiClientException(
-                f"{response_error.get('error')}. Exception code {response_error.get('code')}") from e
+            raise api_exception_from_response(e.response.text) from e
+
+    # override to reuse the pooled session instead of opening a new connection for every request
+    def _request_raw(self, method: str, endpoint_path: Optional[str] = None, **kwargs) -> requests.Response:
+        is_absolute_path = kwargs.pop('is_absolute_path', False)
+        url = self._build_url(endpoint_path, is_absolute_path)
+
+        headers = {**(kwargs.pop('headers', None) or {}), **self._default_header}
+        if kwargs.pop('ignore_auth', False) is False:
+            headers.update(self._auth_header)
+            kwargs['auth'] = self._auth
+
+        params = kwargs.pop('params', None) or {}
+        if self._default_params is not None:
+            params = {**params, **self._default_params}
+
+        waited = self.rate_limiter.acquire()
+        if waited:
+            self.recorder.record("throttle", waited)
+        with self.recorder.span("http", method=method, endpoint=str(endpoint_path)) as span:
+            response = self._session.request(method, url, headers=headers, params=params, **kwargs)
+            span["status"] = response.status_code
+        self.recorder.increment("requests")
+        report_response(self.rate_limiter, response)
+        # the Retry object attached to the response holds the history of the retries urllib3 made
+        retries = getattr(response.raw, "retries", None)
+        if retries is not None and retries.history:
+            self.recorder.increment("retries", len(retries.history))
+        return response
 
     # override to continue on failure
     def _requests_retry_session(self, session=None):
-        session = session or requests.Session()
-        retry = Retry(
-            total=self.max_retries,
-            read=self.max_retries,
-            connect=self.max_retries,
-            backoff_factor=self.backoff_factor,
-            status_forcelist=self.status_forcelist
-        )
-        adapter = HTTPAdapter(max_retries=retry)
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
-        return session
+        return build_retry_session(self.max_retries, self.backoff_factor, self.status_forcelist, self.pool_maxsize,
+                                   self.rate_limiter)
@@ -0,0 +1,93 @@
+import json
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+# the only configuration fields the flow listings use, the configuration bodies are dropped while streaming
+LISTING_FIELDS = ("id", "name", "isDisabled")
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+
+def iter_json_array(chunks: Iterable[str]) -> Iterator[Any]:
+    """
+    Yields the items of a JSON array read from text chunks one by one, so at most one item and one chunk
+    are held in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer = ""
+    position = 0
+    exhausted = False
+    started = False
+
+    def read_more() -> bool:
+        nonlocal buffer, position, exhausted
+        for chunk in chunks:
+            if chunk:
+                buffer = buffer[position:] + chunk
+                position = 0
+                return True
+        exhausted = True
+        return False
+
+    while True:
+        while position < len(buffer) and buffer[position] in _WHITESPACE + ("," if started else ""):
+            position += 1
+        if position >= len(buffer):
+            if exhausted or not read_more():
+                raise ValueError("Unexpected end of the JSON array")
+            continue
+
+        if not started:
+            if buffer[position] != "[":
+                raise ValueError("The response is not a JSON array")
+            started = True
+            position += 1
+            continue
+        if buffer[position] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            if exhausted or not read_more():
+                raise
+            continue
+        # a value ending exactly at the end of the buffer may continue in the next chunk
+        if end >= len(buffer) and not exhausted and read_more():
+            continue
+        position = end
+        yield item
+
+
+def stream_configurations(client, component_id: str, search: Optional[str] = None,
+                          include_disabled: bool = True) -> Iterator[Dict]:
+    """
+    Lists the configurations of the component through a kbcstorage Configurations endpoint, parsing the response
+    incrementally and keeping only the LISTING_FIELDS of each configuration.
+
+    Args:
+        search: case-insensitive substring of the configuration name or ID
+        include_disabled: whether disabled configurations are listed
+    """
+    url = f"{client.base_url}/{component_id}/configs"
+    response = client._get_raw(url, stream=True)
+    response.encoding = response.encoding or "utf-8"
+    try:
+        items = iter_json_array(response.iter_content(chunk_size=CHUNK_SIZE, decode_unicode=True))
+        for configuration in filter_configurations(items, search, include_disabled):
+            yield {field: configuration.get(field) for field in LISTING_FIELDS}
+    finally:
+        response.close()
+
+
+def filter_configurations(configurations: Iterable[Dict], search: Optional[str] = None,
+                          include_disabled: bool = True) -> Iterator[Dict]:
+    needle = (search or "").strip().lower()
+    for configuration in configurations:
+        if not include_disabled and configuration.get("isDisabled"):
+            continue
+        if needle and needle not in str(configuration.get("name", "")).lower() \
+                and needle not in str(configuration.get("id", "")).lower():
+            continue
+        yield configuration
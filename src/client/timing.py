@@ -0,0 +1,53 @@
+import contextlib
+import threading
+import time
+from typing import Callable, Dict, Iterator
+
+MAX_RECORDED_SPANS = 500
+
+
+class TimingRecorder:
+    """
+    Collects timing spans and counters of one component run. Thread safe, the aggregated totals cover all spans,
+    while only the first MAX_RECORDED_SPANS spans are kept individually.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter) -> None:
+        self._clock = clock
+        self._started = clock()
+        self._lock = threading.Lock()
+        self._spans = []
+        self._totals: Dict[str, Dict] = {}
+        self._counters: Dict[str, int] = {}
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Dict]:
+        """
+        Measures the wrapped block, the yielded dict may be filled with more attributes of the span.
+        """
+        started = self._clock()
+        try:
+            yield attributes
+        finally:
+            self.record(name, self._clock() - started, offset=round(started - self._started, 6), **attributes)
+
+    def record(self, name: str, duration: float, **attributes) -> None:
+        with self._lock:
+            totals = self._totals.setdefault(name, {"count": 0, "totalSeconds": 0.0, "maxSeconds": 0.0})
+            totals["count"] += 1
+            totals["totalSeconds"] += duration
+            totals["maxSeconds"] = max(totals["maxSeconds"], duration)
+            if len(self._spans) < MAX_RECORDED_SPANS:
+                self._spans.append({"name": name, "seconds": round(duration, 6), **attributes})
+
+    def increment(self, counter: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {"elapsedSeconds": round(self._clock() - self._started, 6),
+                    "totals": {name: {**t, "totalSeconds": round(t["totalSeconds"], 6),
+                                      "maxSeconds": round(t["maxSeconds"], 6)} for name, t in self._totals.items()},
+                    "counters": dict(self._counters),
+                    "spans": list(self._spans)}
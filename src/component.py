@@ -1,13 +1,37 @@
+import json
 import logging
-from typing import Optional, List
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, List, Tuple
 
 import requests
-from kbcstorage.configurations import Configurations
 from keboola.component.base import ComponentBase, sync_action
 from keboola.component.exceptions import UserException
 from keboola.component.sync_actions import SelectElement, ValidationResult
 
-from client import QueueApiClient, QueueApiClientException
+from client import (QueueApiClient, QueueApiClientException, PollStrategy, FixedPollStrategy,
+                    ExponentialBackoffPollStrategy, EtaPollStrategy, JobStatusMultiplexer, TimingRecorder,
+                    JOB_STATUS_TIMEOUT, WaitDeadline, NotificationTransport, WebhookListener, NotificationSubscriber)
+from client.cache import DiskCacheBackend, TTLCache, cache_key
+from client.history import DEFAULT_HISTORY_SIZE, DurationHistory, job_run_seconds
+from client.job_events import JobEventTail
+from client.storage_listing import filter_configurations, stream_configurations
+from client.http_pool import (ConnectionPoolRegistry, RateLimitedRequests, build_retry_session, connection_pools,
+                              shared_rate_limiter)
+from client.queue_api import (DEFAULT_BACKOFF_FACTOR, DEFAULT_MAX_RETRIES, DEFAULT_POOL_MAXSIZE,
+                              DEFAULT_STATUS_FORCELIST, http_status)
+from broker import CUSTOM_STACK, StackRegistry, parse_targets, project_label
+from flow_graph import FlowGraph
+
+if TYPE_CHECKING:
+    from kbcstorage.configurations import Configurations
+
+# Storage API clients are imported where they are used, a plain run does not need kbcstorage and every scheduled
+# trigger would pay for importing it on start.
 
 CURRENT_COMPONENT_ID = 'kds-team.app-orchestration-trigger-queue-v2'
 FLOW_COMPONENT_ID = "keboola.orchestrator"
@@ -27,8 +51,71 @@ KEY_TARGET_PROJECT = "targetProject"
 KEY_CONFIGURATION_ID_ON_FAILURE = "failureConfigurationId"
 KEY_VARIABLES_ON_FAILURE = "failureVariables"
 KEY_PASS_VARIABLES = "passVariables"
+KEY_ORCHESTRATIONS = "orchestrations"
+KEY_MAX_PARALLELISM = "maxParallelism"
+KEY_FLOW_GRAPH = "flowGraph"
+KEY_STREAM_EVENTS = "streamEvents"
+KEY_WAIT_DEADLINES = "waitDeadlines"
+KEY_FLOW_LISTING = "flowListing"
+KEY_FLOW_LISTING_SEARCH = "search"
+KEY_FLOW_LISTING_INCLUDE_DISABLED = "includeDisabled"
+KEY_SOFT_DEADLINE = "soft"
+KEY_HARD_DEADLINE = "hard"
+KEY_ACTION_ON_SOFT_DEADLINE = "triggerActionOnSoftDeadline"
+KEY_POLLING_SETTINGS = "pollingSettings"
+KEY_POLLING_STRATEGY = "strategy"
+KEY_POLLING_INTERVAL = "interval"
+KEY_POLLING_INITIAL_INTERVAL = "initialInterval"
+KEY_POLLING_MAX_INTERVAL = "maxInterval"
+KEY_POLLING_JITTER = "jitter"
+KEY_DEDUPLICATION = "deduplication"
+KEY_DEDUPLICATION_MODE = "mode"
+KEY_DEDUPLICATION_MATCH_VARIABLES = "matchVariables"
+KEY_TARGETS = "targets"
+KEY_COMPLETION_NOTIFICATIONS = "completionNotifications"
+KEY_NOTIFICATIONS_ENABLED = "enabled"
+KEY_NOTIFICATIONS_LISTEN_PORT = "listenPort"
+KEY_NOTIFICATIONS_PUBLIC_URL = "publicUrl"
+KEY_NOTIFICATIONS_SAFETY_NET_INTERVAL = "safetyNetInterval"
+
+POLLING_STRATEGY_FIXED = "fixed"
+POLLING_STRATEGY_EXPONENTIAL = "exponential"
+POLLING_STRATEGY_ETA = "eta"
+
+DEDUPLICATION_OFF = "off"
+DEDUPLICATION_ATTACH = "attach"
+DEDUPLICATION_SKIP = "skip"
+
+DEFAULT_MAX_PARALLELISM = 4
+
+CONFIGURATIONS_CACHE_FOLDER = "cache"
+CONFIGURATIONS_CACHE_TTL = 300
+METADATA_LOOKUP_TIMEOUT = 20
+FAILURE_WARM_UP_TIMEOUT = 20
+# a job of an interrupted run that finished meanwhile is reattached only if it ended at most this many seconds ago
+IN_FLIGHT_RESUME_WINDOW = 3600
+REJECTED_TOKEN_STATUSES = (401, 403)
+TIMING_REPORT_FILE = "timing_report.json"
+JOB_EVENTS_FILE = "job_events.jsonl"
+BROKER_REPORT_FILE = "broker_report.json"
+DEFAULT_NOTIFICATIONS_LISTEN_PORT = 8080
+DEFAULT_SAFETY_NET_INTERVAL = 300
+
+STATE_IN_FLIGHT = "inFlight"
+STATE_STAGE = "stage"
+STATE_JOB_ID = "jobId"
+STATE_CONFIG_ID = "configId"
+STATE_STATUS = "status"
+STATE_FAILURE_JOB_ID = "failureJobId"
+STATE_STARTED_AT = "startedAt"
+STATE_DURATION_HISTORY = "durationHistory"
+STAGE_MAIN = "main"
+STAGE_FAILURE = "failure"
 
 REQUIRED_PARAMETERS = [KEY_SAPI_TOKEN, KEY_ORCHESTRATION_ID]
+FAN_OUT_REQUIRED_PARAMETERS = [KEY_SAPI_TOKEN, KEY_ORCHESTRATIONS]
+FLOW_GRAPH_REQUIRED_PARAMETERS = [KEY_SAPI_TOKEN, KEY_FLOW_GRAPH]
+BROKER_REQUIRED_PARAMETERS = [KEY_TARGETS]
 REQUIRED_IMAGE_PARS = []
 
 STACK_URL = "https://connection.{STACK}keboola.com"
@@ -49,6 +136,64 @@ def get_stack_url(keboola_stack: str, custom_stack: Optional[str]):
     return stack_url
 
 
+def resolve_concurrently(calls: Dict[str, Callable], timeout: float,
+                         max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Runs the calls in parallel, on at most max_workers threads (one per call by default), and waits at most
+    timeout seconds for all of them.
+
+    Returns:
+        Dict with the return value, or the raised exception, of every call that finished in time.
+        Calls that did not finish are missing from the result.
+    """
+    results = {}
+    lock = threading.Lock()
+    queued = iter(list(calls.items()))
+
+    def resolve() -> None:
+        while True:
+            with lock:
+                name, call = next(queued, (None, None))
+            if call is None:
+                return
+            try:
+                result = call()
+            except Exception as e:
+                result = e
+            with lock:
+                results[name] = result
+
+    workers = len(calls) if max_workers is None else min(max_workers, len(calls))
+    # daemon threads, so a hanging lookup does not block the action from returning
+    threads = [threading.Thread(target=resolve, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(deadline - time.monotonic(), 0))
+
+    with lock:
+        return dict(results)
+
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def seconds_since(started_at: str) -> float:
+    return max(0.0, (datetime.now(timezone.utc) - datetime.fromisoformat(started_at)).total_seconds())
+
+
+def job_created_at(job: Dict) -> Optional[str]:
+    """
+    The creation time of the job as a UTC ISO time, None if the job detail has none.
+    """
+    try:
+        return datetime.fromisoformat(job["createdTime"]).astimezone(timezone.utc).isoformat()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
 def check_variables(variables) -> None:
     if any(v['name'] == '' for v in variables):
         raise UserException("There is a variable with empty name in the configuration. "
@@ -64,12 +209,58 @@ class Component(ComponentBase):
         self._target_project_on_failure = None
         self._runner_client: QueueApiClient
         self._failure_action_runner_client: QueueApiClient
-        self._configurations_client: Configurations
+        self._sapi_token = None
+        self._token_on_failure = None
+        self._storage_clients: Dict[Tuple[str, str], "Configurations"] = {}
+        self._configurations_cache: Optional[TTLCache] = None
+        self._recorder = TimingRecorder()
+        self._state: Dict = {}
+        self._history = DurationHistory()
+        self._failure_warm_up: Optional[threading.Thread] = None
+        self._failure_warm_up_error: Optional[Exception] = None
+        self._soft_deadline_failure_job_id: Optional[str] = None
+        self._notifications: Optional[NotificationTransport] = None
+        self._subscriptions: List[Tuple[NotificationSubscriber, List[str]]] = []
+        self._subscriptions_lock = threading.Lock()
 
     def run(self) -> None:
-        self.validate_configuration_parameters(REQUIRED_PARAMETERS)
+        try:
+            with self._recorder.span("run"):
+                self._run()
+        finally:
+            self._close_notifications()
+            self._write_timing_report()
+
+    def _run(self) -> None:
         params = self.configuration.parameters
-        self._init_clients()
+        self._state = self.get_state_file()
+        self._history = DurationHistory(self._state.get(STATE_DURATION_HISTORY))
+        self._state[STATE_DURATION_HISTORY] = self._history.to_state()
+        if params.get(KEY_TARGETS):
+            self.validate_configuration_parameters(BROKER_REQUIRED_PARAMETERS)
+            self._clear_in_flight()
+            self._run_broker()
+            return
+
+        if params.get(KEY_FLOW_GRAPH):
+            self.validate_configuration_parameters(FLOW_GRAPH_REQUIRED_PARAMETERS)
+            with self._recorder.span("client_init"):
+                self._init_clients()
+            self._clear_in_flight()
+            self._run_flow_graph()
+            return
+
+        if params.get(KEY_ORCHESTRATIONS):
+            self.validate_configuration_parameters(FAN_OUT_REQUIRED_PARAMETERS)
+            with self._recorder.span("client_init"):
+                self._init_clients()
+            self._clear_in_flight()
+            self._run_fan_out()
+            return
+
+        self.validate_configuration_parameters(REQUIRED_PARAMETERS)
+        with self._recorder.span("client_init"):
+            self._init_clients()
 
         orch_id = params.get(KEY_ORCHESTRATION_ID)
 
@@ -79,86 +270,681 @@ class Component(ComponentBase):
         wait_until_finish = params.get(KEY_WAIT_UNTIL_FINISH, False)
         fail_on_warning = params.get(KEY_FAIL_ON_WARNING, True)
 
-        try:
-            orchestration_run = self._runner_client.run_orchestration(orch_id, variables)
-        except QueueApiClientException as api_exc:
-            raise UserException(api_exc) from api_exc
+        in_flight = self._resume_in_flight(orch_id) if wait_until_finish else None
+        started_at = utc_now()
+        if in_flight:
+            job_id = in_flight[STATE_JOB_ID]
+            started_at = in_flight.get(STATE_STARTED_AT) or started_at
+        else:
+            try:
+                orchestration_run = self._trigger_flow(orch_id, variables)
+            except QueueApiClientException as api_exc:
+                raise UserException(api_exc) from api_exc
+            if orchestration_run is None:
+                return
 
-        logging.info(f"Flow run started with job ID {orchestration_run.get('id')} and "
-                     f"configuration ID {orch_id}")
+            job_id = orchestration_run.get('id')
+            # an attached job of the deduplication may be running for a while already
+            started_at = job_created_at(orchestration_run) or started_at
+            if wait_until_finish:
+                self._save_in_flight({STATE_STAGE: STAGE_MAIN, STATE_JOB_ID: job_id, STATE_CONFIG_ID: str(orch_id),
+                                      STATE_STARTED_AT: started_at})
 
         if wait_until_finish:
+            self._start_failure_warm_up()
             try:
-                logging.info("Waiting till flow is finished")
-                status = self._runner_client.wait_until_job_finished(orchestration_run.get('id'))
+                if in_flight and in_flight[STATE_STAGE] == STAGE_FAILURE:
+                    status = in_flight[STATE_STATUS]
+                else:
+                    logging.info("Waiting till flow is finished")
+                    poll_strategy = self._get_poll_strategy(orch_id, self._runner_client, seconds_since(started_at))
+                    self._log_eta(orch_id, started_at)
+                    if in_flight and in_flight.get(STATE_FAILURE_JOB_ID):
+                        self._soft_deadline_failure_job_id = in_flight[STATE_FAILURE_JOB_ID]
+                    deadline = self._get_deadline(started_at,
+                                                  partial(self._trigger_failure_on_soft_deadline, orch_id, variables))
+                    finished_job = {}
+                    status = self._wait_for_job(self._runner_client, job_id, poll_strategy, self.stack_url,
+                                                self._sapi_token, deadline, finished_job.update)
+                    self._record_duration(orch_id, job_id, finished_job, status)
                 trigger_action_on_failure = params.get(KEY_TRIGGER_ACTION_ON_FAILURE, False)
                 if trigger_action_on_failure and status.lower() != "success":
                     logging.info("Flow is finished")
+                    resumed_failure_job_id = in_flight.get(STATE_FAILURE_JOB_ID) if in_flight else None
+                    self._run_failure_action(job_id, orch_id, variables, fail_on_warning, status,
+                                             resumed_failure_job_id or self._soft_deadline_failure_job_id)
+                else:
+                    logging.info("Flow is finished")
+                    if self._soft_deadline_failure_job_id:
+                        logging.info(f"The flow triggered on the soft deadline keeps running as job ID "
+                                     f"{self._soft_deadline_failure_job_id}")
+                    self._clear_in_flight()
+                    self.process_status(status, fail_on_warning)
 
-                    job_to_trigger = params.get(
-                        KEY_ACTION_ON_FAILURE_SETTINGS, {}
-                    ).get(KEY_CONFIGURATION_ID_ON_FAILURE)
+            except QueueApiClientException as api_exc:
+                raise UserException(f"Flow run failed on: {api_exc}") from api_exc
 
-                    pass_variables_of_main_flow = params.get(
-                        KEY_ACTION_ON_FAILURE_SETTINGS, {}
-                    ).get(KEY_PASS_VARIABLES, [])
+        else:
+            logging.info("Flow is being run. if you require the trigger to wait "
+                         "till the flow is finished, specify this in the configuration")
 
-                    variables_on_failure = params.get(
-                        KEY_ACTION_ON_FAILURE_SETTINGS, {}
-                    ).get(KEY_VARIABLES_ON_FAILURE, [])
-                    check_variables(variables_on_failure)
+    def _trigger_flow(self, orch_id: str, variables: List[Dict],
+                      client: Optional[QueueApiClient] = None) -> Optional[Dict]:
+        """
+        Triggers the flow, unless deduplication is enabled and the flow is already running. Then the running job
+        is returned to be attached to, or None if the trigger is to be skipped. The flow runs in the project of
+        the given client, the main one by default.
+        """
+        client = client or self._runner_client
+        settings = self.configuration.parameters.get(KEY_DEDUPLICATION) or {}
+        mode = settings.get(KEY_DEDUPLICATION_MODE, DEDUPLICATION_OFF)
+        if mode not in (DEDUPLICATION_OFF, DEDUPLICATION_ATTACH, DEDUPLICATION_SKIP):
+            raise UserException(f"Invalid deduplication mode '{mode}', use one of "
+                                f"{DEDUPLICATION_OFF}, {DEDUPLICATION_ATTACH}, {DEDUPLICATION_SKIP}")
+
+        if mode != DEDUPLICATION_OFF:
+            match_variables = settings.get(KEY_DEDUPLICATION_MATCH_VARIABLES, False)
+            running_job = client.find_active_job(orch_id, variables if match_variables else None)
+            if running_job and mode == DEDUPLICATION_SKIP:
+                logging.info(f"Flow with configuration ID {orch_id} is already running as job ID "
+                             f"{running_job.get('id')}, skipping the trigger")
+                return None
+            if running_job:
+                logging.info(f"Flow with configuration ID {orch_id} is already running, "
+                             f"attaching to job ID {running_job.get('id')}")
+                return running_job
+
+        orchestration_run = client.run_orchestration(orch_id, variables)
+        logging.info(f"Flow run started with job ID {orchestration_run.get('id')} and "
+                     f"configuration ID {orch_id}")
+        return orchestration_run
 
-                    if pass_variables_of_main_flow:
-                        variables_on_failure.extend(variables)
+    def _resume_in_flight(self, orch_id: str) -> Optional[Dict]:
+        """
+        Returns the job a previous, interrupted run of this configuration was waiting for, if it can be reattached:
+        it is still running, or it finished after the wait started and at most IN_FLIGHT_RESUME_WINDOW seconds ago.
+        A stale entry is dropped, so the flow is triggered again.
+        """
+        in_flight = self._state.get(STATE_IN_FLIGHT)
+        if not in_flight:
+            return None
+        if in_flight.get(STATE_CONFIG_ID) != str(orch_id):
+            logging.warning(f"Ignoring job {in_flight.get(STATE_JOB_ID)} of a previous run, "
+                            f"it belongs to flow {in_flight.get(STATE_CONFIG_ID)}")
+            self._clear_in_flight()
+            return None
+
+        if in_flight[STATE_STAGE] == STAGE_FAILURE:
+            if not self.configuration.parameters.get(KEY_TRIGGER_ACTION_ON_FAILURE, False):
+                logging.warning("Ignoring the flow triggered on failure by a previous run, "
+                                "the action on failure is no longer configured")
+                self._clear_in_flight()
+                return None
+            client, job_id = self._failure_action_runner_client, in_flight.get(STATE_FAILURE_JOB_ID)
+        else:
+            client, job_id = self._runner_client, in_flight.get(STATE_JOB_ID)
+        try:
+            job_detail = client.get_job_detail(job_id)
+        except QueueApiClientException as e:
+            logging.warning(f"Job {job_id} of a previous run cannot be resumed, triggering the flow again: {e}")
+            self._clear_in_flight()
+            return None
+
+        if job_detail.get("isFinished") and not self._finished_during_wait(job_detail, in_flight.get(STATE_STARTED_AT)):
+            logging.warning(f"Job {job_id} of a previous run finished at {job_detail.get('endTime')}, "
+                            f"too long ago to report its outcome, triggering the flow again")
+            self._clear_in_flight()
+            return None
+
+        logging.info(f"Resuming the wait for job {job_id} started at {in_flight.get(STATE_STARTED_AT)} "
+                     f"by a previous run instead of triggering the flow again")
+        return in_flight
 
-                    try:
-                        action_on_failure_run = self._failure_action_runner_client.run_orchestration(
-                            job_to_trigger,
-                            variables_on_failure
-                        )
-                        project = params.get(KEY_ACTION_ON_FAILURE_SETTINGS, {}).get(KEY_TARGET_PROJECT)
-                        if project == "current":
-                            current_project_id = self.environment_variables.project_id
-                            logging.warning("Flow failed, triggering flow with job ID "
-                                            f"{action_on_failure_run.get('id')} and "
-                                            f"configuration ID {str(job_to_trigger)} in "
-                                            f"project {current_project_id}")
-                        else:
-                            logging.warning("Flow failed, triggering flow with job ID "
-                                            f"{action_on_failure_run.get('id')} and "
-                                            f"configuration ID {str(job_to_trigger)} in "
-                                            f"project {self._get_project_id()}")
-
-                        status_on_failure = self._failure_action_runner_client.wait_until_job_finished(
-                            action_on_failure_run.get('id')
-                        )
-                        logging.info("Flow triggered on failure finished")
-                        jobs_ids = [orchestration_run.get('id'), action_on_failure_run.get('id')]
-                        configurations_ids = [orch_id, job_to_trigger]
-                        project_ids = [self.environment_variables.project_id, self._get_project_id()]
-                        is_current_project = True if project == "current" else False
-                        self.process_action_status(
-                            status_on_failure,
-                            fail_on_warning,
-                            jobs_ids,
-                            configurations_ids,
-                            project_ids,
-                            is_current_project
-                        )
+    @staticmethod
+    def _finished_during_wait(job_detail: Dict, started_at: Optional[str]) -> bool:
+        try:
+            return (datetime.fromisoformat(job_detail["endTime"]) >= datetime.fromisoformat(started_at)
+                    and seconds_since(job_detail["endTime"]) <= IN_FLIGHT_RESUME_WINDOW)
+        except (KeyError, TypeError, ValueError):
+            return False
 
-                    except QueueApiClientException as api_exc:
-                        raise UserException("Flow triggered on failure failed on: "
-                                            f"{api_exc}") from api_exc
+    def _save_in_flight(self, in_flight: Dict) -> None:
+        self._state[STATE_IN_FLIGHT] = in_flight
+        self.write_state_file(self._state)
+
+    def _clear_in_flight(self) -> None:
+        if self._state.pop(STATE_IN_FLIGHT, None) is not None:
+            self.write_state_file(self._state)
+
+    def _run_failure_action(self, failed_job_id: str, orch_id: str, variables: List[Dict],
+                            fail_on_warning: bool, status: str, resumed_failure_job_id: Optional[str] = None) -> None:
+        with self._recorder.span("failure_action"):
+            params = self.configuration.parameters
+
+            job_to_trigger = params.get(
+                KEY_ACTION_ON_FAILURE_SETTINGS, {}
+            ).get(KEY_CONFIGURATION_ID_ON_FAILURE)
+
+            self._join_failure_warm_up()
+            variables_on_failure = self._get_failure_variables(variables)
+
+            try:
+                project = params.get(KEY_ACTION_ON_FAILURE_SETTINGS, {}).get(KEY_TARGET_PROJECT)
+                if resumed_failure_job_id:
+                    action_on_failure_run = {"id": resumed_failure_job_id}
                 else:
-                    logging.info("Flow is finished")
-                    self.process_status(status, fail_on_warning)
+                    action_on_failure_run = self._failure_action_runner_client.run_orchestration(
+                        job_to_trigger,
+                        variables_on_failure
+                    )
+                    self._save_in_flight({STATE_STAGE: STAGE_FAILURE, STATE_JOB_ID: failed_job_id,
+                                          STATE_CONFIG_ID: str(orch_id), STATE_STATUS: status,
+                                          STATE_FAILURE_JOB_ID: action_on_failure_run.get('id'),
+                                          STATE_STARTED_AT: utc_now()})
+                    if project == "current":
+                        current_project_id = self.environment_variables.project_id
+                        logging.warning("Flow failed, triggering flow with job ID "
+                                        f"{action_on_failure_run.get('id')} and "
+                                        f"configuration ID {str(job_to_trigger)} in "
+                                        f"project {current_project_id}")
+                    else:
+                        logging.warning("Flow failed, triggering flow with job ID "
+                                        f"{action_on_failure_run.get('id')} and "
+                                        f"configuration ID {str(job_to_trigger)} in "
+                                        f"project {self._get_project_id()}")
+
+                status_on_failure = self._wait_for_job(
+                    self._failure_action_runner_client,
+                    action_on_failure_run.get('id'),
+                    self._get_poll_strategy(job_to_trigger, self._failure_action_runner_client),
+                    self.stack_url_on_failure,
+                    self._token_on_failure,
+                    self._get_deadline()
+                )
+                logging.info("Flow triggered on failure finished")
+                self._clear_in_flight()
+                jobs_ids = [failed_job_id, action_on_failure_run.get('id')]
+                configurations_ids = [orch_id, job_to_trigger]
+                project_ids = [self.environment_variables.project_id, self._get_project_id()]
+                is_current_project = True if project == "current" else False
+                self.process_action_status(
+                    status_on_failure,
+                    fail_on_warning,
+                    jobs_ids,
+                    configurations_ids,
+                    project_ids,
+                    is_current_project
+                )
 
             except QueueApiClientException as api_exc:
-                raise UserException(f"Flow run failed on: {api_exc}") from api_exc
+                raise UserException("Flow triggered on failure failed on: "
+                                    f"{api_exc}") from api_exc
 
+    def _wait_for_job(self, client: QueueApiClient, job_id: str, poll_strategy: PollStrategy, stack_url: str,
+                      token: str, deadline: Optional[WaitDeadline] = None,
+                      on_finished: Optional[Callable[[Dict], None]] = None) -> str:
+        """
+        Waits for the job, streaming its events to the log and to out/files/job_events.jsonl meanwhile if enabled.
+        With completion notifications enabled, the job is subscribed to before the first status check, so its
+        finish cannot be missed, and a subscribed job is polled only at the safety net interval.
+        """
+        notifications = self._get_notifications()
+        if notifications is not None and self._subscribe_job(client, token, job_id):
+            poll_strategy = self._get_safety_net_strategy()
         else:
-            logging.info("Flow is being run. if you require the trigger to wait "
-                         "till the flow is finished, specify this in the configuration")
+            notifications = None
+        if not self.configuration.parameters.get(KEY_STREAM_EVENTS, False):
+            return client.wait_until_job_finished(job_id, poll_strategy, deadline, notifications, on_finished)
+
+        output_path = self._output_file_path(JOB_EVENTS_FILE)
+        tail = JobEventTail(client, stack_url, token, output_path).start(job_id)
+        try:
+            return client.wait_until_job_finished(job_id, poll_strategy, deadline, notifications, on_finished)
+        finally:
+            tail.stop()
+
+    def _get_notifications(self) -> Optional[NotificationTransport]:
+        """
+        Returns the transport of job-finished notifications if completion notifications are enabled, starting
+        the webhook listener on first use.
+        """
+        settings = self.configuration.parameters.get(KEY_COMPLETION_NOTIFICATIONS) or {}
+        if not settings.get(KEY_NOTIFICATIONS_ENABLED, False):
+            return None
+        if self._notifications is None:
+            if not settings.get(KEY_NOTIFICATIONS_PUBLIC_URL):
+                logging.warning(f"Completion notifications need the {KEY_NOTIFICATIONS_PUBLIC_URL} the listener is "
+                                f"reachable at, jobs are not subscribed and are polled with the "
+                                f"{KEY_POLLING_SETTINGS}")
+            self._notifications = WebhookListener(
+                port=settings.get(KEY_NOTIFICATIONS_LISTEN_PORT, DEFAULT_NOTIFICATIONS_LISTEN_PORT))
+        try:
+            self._notifications.start()
+        except OSError as e:
+            raise UserException(f"Cannot listen for job notifications: {e}") from e
+        return self._notifications
+
+    def _subscribe_job(self, client: QueueApiClient, token: str, job_id: str) -> bool:
+        """
+        Subscribes the webhook listener to the finish of the job. Returns False if the job was not subscribed,
+        its finish is then detected by polling with the pollingSettings.
+        """
+        public_url = (self.configuration.parameters.get(KEY_COMPLETION_NOTIFICATIONS) or {}).get(
+            KEY_NOTIFICATIONS_PUBLIC_URL)
+        if self._get_notifications() is None or not public_url:
+            return False
+        subscriber = NotificationSubscriber(token, client.base_url)
+        try:
+            subscription_ids = subscriber.subscribe_job(job_id, public_url)
+        except requests.RequestException as e:
+            logging.warning(f"Could not subscribe to the notifications of job {job_id}, "
+                            f"its finish is detected by polling: {e}")
+            return False
+        with self._subscriptions_lock:
+            self._subscriptions.append((subscriber, subscription_ids))
+        return True
+
+    def _get_safety_net_strategy(self) -> Optional[PollStrategy]:
+        """
+        Returns the poll strategy of jobs subscribed to completion notifications, None if they are disabled.
+        Notifications report the finish, polling is only the safety net for the lost ones.
+        """
+        settings = self.configuration.parameters.get(KEY_COMPLETION_NOTIFICATIONS) or {}
+        if not settings.get(KEY_NOTIFICATIONS_ENABLED, False):
+            return None
+        try:
+            return FixedPollStrategy(settings.get(KEY_NOTIFICATIONS_SAFETY_NET_INTERVAL, DEFAULT_SAFETY_NET_INTERVAL))
+        except ValueError as e:
+            raise UserException(f"Invalid completion notifications: {e}") from e
+
+    def _close_notifications(self) -> None:
+        with self._subscriptions_lock:
+            subscriptions, self._subscriptions = self._subscriptions, []
+        for subscriber, subscription_ids in subscriptions:
+            subscriber.unsubscribe(subscription_ids)
+        if self._notifications is not None:
+            self._notifications.close()
+
+    def _get_deadline(self, started_at: Optional[str] = None,
+                      on_soft: Optional[Callable[[str], None]] = None) -> Optional[WaitDeadline]:
+        """
+        Builds the wait deadline from the configuration, counted from started_at (UTC ISO time) of a resumed wait.
+        """
+        settings = self.configuration.parameters.get(KEY_WAIT_DEADLINES) or {}
+        soft, hard = settings.get(KEY_SOFT_DEADLINE), settings.get(KEY_HARD_DEADLINE)
+        if soft is None and hard is None:
+            return None
+
+        elapsed = 0.0
+        if started_at:
+            elapsed = seconds_since(started_at)
+        if not settings.get(KEY_ACTION_ON_SOFT_DEADLINE, False):
+            on_soft = None
+        try:
+            return WaitDeadline(soft=soft, hard=hard, elapsed=elapsed, on_soft=on_soft)
+        except ValueError as e:
+            raise UserException(f"Invalid wait deadlines: {e}") from e
+
+    def _trigger_failure_on_soft_deadline(self, orch_id: str, variables: List[Dict], job_id: str) -> None:
+        params = self.configuration.parameters
+        if not params.get(KEY_TRIGGER_ACTION_ON_FAILURE, False) or self._soft_deadline_failure_job_id:
+            return
+        job_to_trigger = params.get(KEY_ACTION_ON_FAILURE_SETTINGS, {}).get(KEY_CONFIGURATION_ID_ON_FAILURE)
+        try:
+            self._join_failure_warm_up()
+            action_on_failure_run = self._failure_action_runner_client.run_orchestration(
+                job_to_trigger, self._get_failure_variables(variables))
+        except (QueueApiClientException, UserException) as e:
+            logging.warning(f"Could not trigger the action on failure on the soft deadline: {e}")
+            return
+
+        self._soft_deadline_failure_job_id = action_on_failure_run.get('id')
+        logging.warning(f"Flow with job ID {job_id} passed the soft deadline, triggered flow with job ID "
+                        f"{self._soft_deadline_failure_job_id} and configuration ID {job_to_trigger}")
+        in_flight = self._state.get(STATE_IN_FLIGHT)
+        if in_flight and in_flight.get(STATE_JOB_ID) == job_id:
+            self._save_in_flight({**in_flight, STATE_FAILURE_JOB_ID: self._soft_deadline_failure_job_id})
+
+    def _get_failure_variables(self, variables: List[Dict]) -> List[Dict]:
+        settings = self.configuration.parameters.get(KEY_ACTION_ON_FAILURE_SETTINGS, {})
+        variables_on_failure = list(settings.get(KEY_VARIABLES_ON_FAILURE, []))
+        check_variables(variables_on_failure)
+        if settings.get(KEY_PASS_VARIABLES, []):
+            variables_on_failure.extend(variables)
+        return variables_on_failure
+
+    def _start_failure_warm_up(self) -> None:
+        """
+        Validates the failure action and opens its connections in the background while the main flows run,
+        so a misconfiguration is reported early and the failure flow is triggered right after a failure.
+        """
+        if not self.configuration.parameters.get(KEY_TRIGGER_ACTION_ON_FAILURE, False) or self._failure_warm_up:
+            return
+        self._failure_warm_up = threading.Thread(target=self._warm_up_failure_action, daemon=True)
+        self._failure_warm_up.start()
+
+    def _warm_up_failure_action(self) -> None:
+        with self._recorder.span("failure_warm_up"):
+            try:
+                self._check_failure_action()
+            except UserException as e:
+                self._failure_warm_up_error = e
+                logging.warning(f"The action on failure is misconfigured and will fail if the flow fails: {e}")
+            except Exception as e:
+                logging.warning(f"The action on failure could not be checked in advance, "
+                                f"it will still be triggered if the flow fails: {e}")
+
+    def _check_failure_action(self) -> None:
+        """
+        Raises UserException only for a definite misconfiguration: a missing flow, a rejected token or invalid
+        variables. Lookups failing for any other reason, e.g. a network error, are only logged, the failure flow
+        is then still triggered.
+        """
+        from kbcstorage.tokens import Tokens
+
+        job_to_trigger = self.configuration.parameters.get(
+            KEY_ACTION_ON_FAILURE_SETTINGS, {}
+        ).get(KEY_CONFIGURATION_ID_ON_FAILURE)
+        if not job_to_trigger:
+            raise UserException(f"The {KEY_CONFIGURATION_ID_ON_FAILURE} of the action on failure is not set.")
+        self._get_failure_variables([])
+
+        failure_client = self._configurations_on_failure_client
+        resolved = resolve_concurrently({
+            "flow_on_failure": partial(self._get_component_detail, failure_client, FLOW_COMPONENT_ID,
+                                       str(job_to_trigger)),
+            "token_on_failure": self._pooled(Tokens(failure_client.root_url, failure_client.token)).verify,
+            "session": self._failure_action_runner_client.warm_up}, FAILURE_WARM_UP_TIMEOUT)
+
+        flow_on_failure = resolved.get("flow_on_failure")
+        if flow_on_failure is not None and not isinstance(flow_on_failure, Exception) and "id" not in flow_on_failure:
+            raise UserException(f"Flow {job_to_trigger} triggered on failure does not exist in project "
+                                f"{self._target_project_on_failure}.")
+        problems = {"flow_on_failure": f"Flow {job_to_trigger} triggered on failure could not be loaded",
+                    "token_on_failure": "The token of the action on failure is not valid",
+                    "session": "The token of the action on failure cannot access the Queue API"}
+        for lookup, problem in problems.items():
+            error = resolved.get(lookup)
+            if not isinstance(error, Exception):
+                continue
+            if http_status(error) in REJECTED_TOKEN_STATUSES:
+                raise UserException(f"{problem}: {error}")
+            logging.warning(f"{problem} in advance: {error}")
+        logging.debug(f"Action on failure checked, flow {job_to_trigger} in project "
+                      f"{self._target_project_on_failure}")
+
+    def _join_failure_warm_up(self) -> None:
+        if self._failure_warm_up is None:
+            return
+        self._failure_warm_up.join(FAILURE_WARM_UP_TIMEOUT)
+        if self._failure_warm_up_error is not None:
+            raise UserException(f"Flow failed and the action on failure cannot be run: "
+                                f"{self._failure_warm_up_error}") from self._failure_warm_up_error
+
+    def _run_fan_out(self) -> None:
+        params = self.configuration.parameters
+        flows = params.get(KEY_ORCHESTRATIONS)
+        for flow in flows:
+            if not flow.get(KEY_ORCHESTRATION_ID):
+                raise UserException(f"Each flow in {KEY_ORCHESTRATIONS} must have the {KEY_ORCHESTRATION_ID} set.")
+            check_variables(flow.get(KEY_VARIABLES, []))
+
+        wait_until_finish = params.get(KEY_WAIT_UNTIL_FINISH, False)
+        fail_on_warning = params.get(KEY_FAIL_ON_WARNING, True)
+        max_workers = min(self._get_max_parallelism(), len(flows))
+
+        def trigger_flow(flow: Dict) -> Dict:
+            orch_id = flow.get(KEY_ORCHESTRATION_ID)
+            result = {"orchestrationId": orch_id, "variables": flow.get(KEY_VARIABLES, [])}
+            try:
+                orchestration_run = self._trigger_flow(orch_id, result["variables"])
+                if orchestration_run is None:
+                    result["skipped"] = True
+                else:
+                    result["jobId"] = orchestration_run.get('id')
+                    if wait_until_finish:
+                        result["subscribed"] = self._subscribe_job(self._runner_client, self._sapi_token,
+                                                                   result["jobId"])
+            except QueueApiClientException as api_exc:
+                result["error"] = str(api_exc)
+            return result
+
+        logging.info(f"Triggering {len(flows)} flows with up to {max_workers} triggered in parallel")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = [r for r in executor.map(trigger_flow, flows) if not r.get("skipped")]
+        if not results:
+            return
+
+        if not wait_until_finish:
+            self.process_statuses([r for r in results if r.get("error")], fail_on_warning)
+            logging.info("Flows are being run. if you require the trigger to wait "
+                         "till the flows are finished, specify this in the configuration")
+            return
+
+        logging.info("Waiting till flows are finished")
+        self._start_failure_warm_up()
+        multiplexer = JobStatusMultiplexer(self._runner_client, self._get_poll_strategy(None, self._runner_client),
+                                           notifications=self._get_notifications(),
+                                           safety_net_strategy=self._get_safety_net_strategy())
+        try:
+            waits = {r["jobId"]: multiplexer.track(r["jobId"], self._get_deadline(), r.pop("subscribed"))
+                     for r in results if not r.get("error")}
+            for result in results:
+                if result.get("error"):
+                    continue
+                try:
+                    result["status"] = waits[result["jobId"]].result()
+                    logging.info(f"Flow with job ID {result['jobId']} finished with status {result['status']}")
+                except QueueApiClientException as api_exc:
+                    result["error"] = str(api_exc)
+        finally:
+            multiplexer.close()
+
+        self._process_flow_results(results, fail_on_warning)
+
+    def _run_flow_graph(self) -> None:
+        params = self.configuration.parameters
+        graph = FlowGraph(params.get(KEY_FLOW_GRAPH))
+        for node in graph.nodes.values():
+            check_variables(node.get(KEY_VARIABLES, []))
+
+        fail_on_warning = params.get(KEY_FAIL_ON_WARNING, True)
+        max_parallelism = self._get_max_parallelism()
+        multiplexer = JobStatusMultiplexer(self._runner_client, self._get_poll_strategy(None, self._runner_client),
+                                           notifications=self._get_notifications(),
+                                           safety_net_strategy=self._get_safety_net_strategy())
+
+        def run_node(node: Dict) -> Dict:
+            orch_id = node.get(KEY_ORCHESTRATION_ID)
+            result = {"orchestrationId": orch_id, "variables": node.get(KEY_VARIABLES, [])}
+            try:
+                orchestration_run = self._trigger_flow(orch_id, result["variables"])
+                if orchestration_run is None:
+                    result.update(skipped=True, error="flow is already running, the trigger was skipped")
+                    return result
+                result["jobId"] = orchestration_run.get('id')
+                subscribed = self._subscribe_job(self._runner_client, self._sapi_token, result["jobId"])
+                result["status"] = multiplexer.track(result["jobId"], self._get_deadline(), subscribed).result()
+            except QueueApiClientException as api_exc:
+                result["error"] = str(api_exc)
+            return result
+
+        self._start_failure_warm_up()
+        logging.info(f"Running a graph of {len(graph.nodes)} flows with up to {max_parallelism} run in parallel")
+        try:
+            results = graph.run(run_node, max_parallelism)
+        finally:
+            multiplexer.close()
+
+        self._process_flow_results(results, fail_on_warning)
+
+    def _run_broker(self) -> None:
+        """
+        Triggers flows across projects and stacks. The tokens of all projects are verified in parallel first,
+        the targets of a project whose token is not valid are not triggered. maxParallelism bounds the verification
+        and the triggering, like in the fan-out, the triggered jobs are then awaited all together. Each project gets
+        one Queue API client and one status multiplexer, the projects on a stack share the resolved URLs and
+        the connection pool.
+        """
+        params = self.configuration.parameters
+        targets = parse_targets(params.get(KEY_TARGETS), params, VALID_STACKS)
+        for target in targets:
+            check_variables(target["variables"])
+        if params.get(KEY_TRIGGER_ACTION_ON_FAILURE, False):
+            logging.warning(f"The action on failure is not run for the {KEY_TARGETS}, "
+                            f"the consolidated report lists the failed flows instead")
+
+        wait_until_finish = params.get(KEY_WAIT_UNTIL_FINISH, False)
+        fail_on_warning = params.get(KEY_FAIL_ON_WARNING, True)
+        max_workers = min(self._get_max_parallelism(), len(targets))
+        registry = StackRegistry(get_stack_url, max(DEFAULT_POOL_MAXSIZE, max_workers), self._recorder)
+        projects = {(t["stack"], t["customStack"], t["token"]) for t in targets}
+        with self._recorder.span("token_verification"):
+            verifications = self._verify_tokens(registry, projects, max_workers)
+        logging.info(f"Triggering {len(targets)} flows in {len(projects)} projects on {registry.stacks} stacks "
+                     f"with up to {max_workers} handled in parallel")
+
+        def trigger_target(target: Dict) -> Dict:
+            project = (target["stack"], target["customStack"], target["token"])
+            verification = verifications.get(project)
+            result = {"stack": target["stack"] if target["stack"] != CUSTOM_STACK else target["customStack"],
+                      "projectId": project_label(target["token"]), "orchestrationId": target["orchestrationId"],
+                      "variables": target["variables"]}
+            if isinstance(verification, Exception):
+                result["error"] = f"the token is not valid: {verification}"
+                return result
+            if verification is not None:
+                result["projectId"] = str(verification.get("owner", {}).get("id", result["projectId"]))
+            client = registry.queue_client(*project)
+            try:
+                orchestration_run = self._trigger_flow(target["orchestrationId"], target["variables"], client)
+                if orchestration_run is None:
+                    result["skipped"] = True
+                    return result
+                result["jobId"] = orchestration_run.get('id')
+                if wait_until_finish:
+                    result["subscribed"] = self._subscribe_job(client, target["token"], result["jobId"])
+            except QueueApiClientException as api_exc:
+                result["error"] = str(api_exc)
+            return result
+
+        multiplexers: Dict[Tuple[str, str, str], JobStatusMultiplexer] = {}
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(trigger_target, targets))
+            if wait_until_finish:
+                logging.info("Waiting till flows are finished")
+                waits = []
+                for target, result in zip(targets, results):
+                    if result.get("jobId") is None or result.get("error"):
+                        continue
+                    project = (target["stack"], target["customStack"], target["token"])
+                    if project not in multiplexers:
+                        client = registry.queue_client(*project)
+                        multiplexers[project] = JobStatusMultiplexer(
+                            client, self._get_poll_strategy(None, client), notifications=self._get_notifications(),
+                            safety_net_strategy=self._get_safety_net_strategy())
+                    waits.append((result, multiplexers[project].track(result["jobId"], self._get_deadline(),
+                                                                      result.pop("subscribed"))))
+                for result, future in waits:
+                    try:
+                        result["status"] = future.result()
+                    except QueueApiClientException as api_exc:
+                        result["error"] = str(api_exc)
+        finally:
+            for multiplexer in multiplexers.values():
+                multiplexer.close()
+            registry.close()
+
+        self._write_broker_report(results, wait_until_finish)
+        results = [r for r in results if not r.get("skipped")]
+        if wait_until_finish:
+            logging.info("Flows are finished")
+            self.process_statuses(results, fail_on_warning)
+        else:
+            self.process_statuses([r for r in results if r.get("error")], fail_on_warning)
+            logging.info("Flows are being run. if you require the trigger to wait "
+                         "till the flows are finished, specify this in the configuration")
+
+    def _verify_tokens(self, registry: StackRegistry, projects: set,
+                       max_workers: int) -> Dict[Tuple[str, str, str], Any]:
+        """
+        Verifies the token of each project, at most max_workers at a time. Returns the token detail, or the exception
+        if the token is not valid, by project; projects not verified within METADATA_LOOKUP_TIMEOUT are missing.
+        """
+        from kbcstorage.tokens import Tokens
+
+        lookups = {}
+        for stack, custom_stack, token in projects:
+            tokens = Tokens(registry.storage_url(stack, custom_stack), token)
+            lookups[(stack, custom_stack, token)] = self._pooled(tokens, registry.pools).verify
+        verifications = resolve_concurrently(lookups, METADATA_LOOKUP_TIMEOUT, max_workers)
+        for stack, custom_stack, token in projects:
+            verification = verifications.get((stack, custom_stack, token))
+            if verification is None:
+                logging.warning(f"The token of project {project_label(token)} could not be verified within "
+                                f"{METADATA_LOOKUP_TIMEOUT} seconds, triggering its flows anyway")
+            elif isinstance(verification, Exception):
+                logging.error(f"The token of project {project_label(token)} is not valid: {verification}")
+        return verifications
+
+    def _write_broker_report(self, results: List[Dict], wait_until_finish: bool) -> None:
+        """
+        Writes the outcome of all targets to out/files/broker_report.json and logs a summary of it.
+        """
+        flows = [{key: result.get(key) for key in ("stack", "projectId", "orchestrationId", "jobId", "status",
+                                                   "error", "skipped")} for result in results]
+        counts: Dict[str, int] = {}
+        for flow in flows:
+            outcome = ("skipped" if flow["skipped"] else "error" if flow["error"]
+                       else (flow["status"] or "triggered").lower() if wait_until_finish else "triggered")
+            counts[outcome] = counts.get(outcome, 0) + 1
+        logging.info(f"Broker report: {len(flows)} flows in {len({(f['stack'], f['projectId']) for f in flows})} "
+                     f"projects, " + ", ".join(f"{count} {outcome}" for outcome, count in sorted(counts.items())))
+
+        try:
+            with open(self._output_file_path(BROKER_REPORT_FILE), "w") as report_file:
+                json.dump({"summary": counts, "flows": flows}, report_file)
+        except OSError as e:
+            logging.warning(f"Could not write the broker report: {e}")
+
+    def _get_max_parallelism(self) -> int:
+        max_parallelism = self.configuration.parameters.get(KEY_MAX_PARALLELISM, DEFAULT_MAX_PARALLELISM)
+        if not isinstance(max_parallelism, int) or isinstance(max_parallelism, bool) or max_parallelism < 1:
+            raise UserException(f"{KEY_MAX_PARALLELISM} must be a positive integer, got {max_parallelism!r}")
+        return max_parallelism
+
+    def _process_flow_results(self, results: List[Dict], fail_on_warning: bool) -> None:
+        params = self.configuration.parameters
+        # skipped flows did not run, the outcome of the flows they depend on decides
+        for skipped in (r for r in results if r.get("skipped")):
+            logging.warning(f"Flow {skipped['orchestrationId']} was not run: {skipped['error']}")
+        results = [r for r in results if not r.get("skipped")]
+
+        failed = [r for r in results if r.get("error") or r["status"].lower() != "success"]
+        if params.get(KEY_TRIGGER_ACTION_ON_FAILURE, False) and failed:
+            logging.info("Flows are finished")
+            first_failed, other_failed = failed[0], failed[1:]
+            if other_failed:
+                logging.warning(f"The action on failure is run for flow {first_failed['orchestrationId']} only, "
+                                f"other flows did not end in success either: "
+                                + "; ".join(self.flow_failures(other_failed, fail_on_warning=True)))
+            other_failures = self.flow_failures(other_failed, fail_on_warning)
+            try:
+                self._run_failure_action(first_failed.get("jobId"), first_failed["orchestrationId"],
+                                         first_failed["variables"], fail_on_warning,
+                                         first_failed.get("status", "error"))
+            except UserException as e:
+                if not other_failures:
+                    raise
+                raise UserException(f"{e}. {len(other_failures)} other flows did not end in success: "
+                                    + "; ".join(other_failures)) from e
+            if other_failures:
+                raise UserException(f"{len(other_failures)} other flows did not end in success: "
+                                    + "; ".join(other_failures))
+        else:
+            logging.info("Flows are finished")
+            self.process_statuses(results, fail_on_warning)
 
     def _init_clients(self):
         params = self.configuration.parameters
@@ -173,8 +959,9 @@ class Component(ComponentBase):
 
         self.stack_url = get_stack_url(stack, custom_stack)
 
-        self._runner_client = self._get_client(custom_stack, sapi_token, stack)
-        self._configurations_client = Configurations(self.stack_url, sapi_token, 'default')
+        pool_maxsize = max(DEFAULT_POOL_MAXSIZE, self._get_max_parallelism())
+        self._sapi_token = sapi_token
+        self._runner_client = self._get_client(custom_stack, sapi_token, stack, pool_maxsize)
 
         if params.get(KEY_TRIGGER_ACTION_ON_FAILURE, False):
             if params.get(KEY_ACTION_ON_FAILURE_SETTINGS, {}).get(KEY_TARGET_PROJECT) == "current":
@@ -197,25 +984,142 @@ class Component(ComponentBase):
                 custom_stack_on_failure = ''
 
                 self._target_project_on_failure = self.environment_variables.project_id
-                self._configurations_on_failure_client = Configurations(self.stack_url_on_failure,
-                                                                        token_on_failure,
-                                                                        'default')
+                self._token_on_failure = token_on_failure
                 self._failure_action_runner_client = self._get_client(custom_stack_on_failure,
                                                                       token_on_failure,
                                                                       stack_on_failure)
             else:
+                self.stack_url_on_failure = self.stack_url
                 self._target_project_on_failure = self._get_project_id()
-                self._configurations_on_failure_client = self._configurations_client
+                self._token_on_failure = sapi_token
                 self._failure_action_runner_client = self._runner_client
 
+    @property
+    def _configurations_client(self) -> "Configurations":
+        return self._get_configurations_client(self.stack_url, self._sapi_token)
+
+    @property
+    def _configurations_on_failure_client(self) -> "Configurations":
+        return self._get_configurations_client(self.stack_url_on_failure, self._token_on_failure)
+
+    def _get_configurations_client(self, stack_url: str, token: str) -> "Configurations":
+        """
+        Builds the Storage API configurations client on first use, one per project.
+        """
+        if (stack_url, token) not in self._storage_clients:
+            from kbcstorage.configurations import Configurations
+            self._storage_clients[(stack_url, token)] = self._pooled(Configurations(stack_url, token, 'default'))
+        return self._storage_clients[(stack_url, token)]
+
     @staticmethod
-    def _get_client(custom_stack, sapi_token, stack):
+    def _pooled(endpoint, pool_registry: ConnectionPoolRegistry = connection_pools):
+        """
+        Sends the requests of a Storage API endpoint through the shared connection pool and rate limiter.
+        """
+        session = pool_registry.get_session(endpoint.root_url, endpoint.token, partial(
+            build_retry_session, DEFAULT_MAX_RETRIES, DEFAULT_BACKOFF_FACTOR, DEFAULT_STATUS_FORCELIST,
+            DEFAULT_POOL_MAXSIZE, shared_rate_limiter))
+        endpoint.requests = RateLimitedRequests(session, shared_rate_limiter)
+        return endpoint
+
+    def _get_poll_strategy(self, orch_id: Optional[str], client: QueueApiClient, elapsed: float = 0.0) -> PollStrategy:
+        """
+        Builds the poll strategy from the configuration. Without an orch_id (jobs of several flows are awaited
+        together) the ETA strategy falls back to the exponential one. The ETA strategy expects the job, which
+        already runs for elapsed seconds, to take the median duration from the history of the flow.
+        """
+        settings = self.configuration.parameters.get(KEY_POLLING_SETTINGS) or {}
+        strategy = settings.get(KEY_POLLING_STRATEGY, POLLING_STRATEGY_FIXED)
+
+        try:
+            if strategy == POLLING_STRATEGY_FIXED:
+                return FixedPollStrategy(settings.get(KEY_POLLING_INTERVAL, 10))
+            backoff = ExponentialBackoffPollStrategy(initial_interval=settings.get(KEY_POLLING_INITIAL_INTERVAL, 1),
+                                                     max_interval=settings.get(KEY_POLLING_MAX_INTERVAL, 60),
+                                                     jitter=settings.get(KEY_POLLING_JITTER, 0.1))
+        except ValueError as e:
+            raise UserException(f"Invalid polling settings: {e}") from e
+
+        if strategy == POLLING_STRATEGY_EXPONENTIAL or (strategy == POLLING_STRATEGY_ETA and orch_id is None):
+            return backoff
+        if strategy == POLLING_STRATEGY_ETA:
+            self._seed_history(orch_id, client)
+            expected_duration = self._history.expected_duration(orch_id)
+            if expected_duration is None:
+                logging.warning(f"No duration history of flow {orch_id}, falling back to exponential polling")
+                return EtaPollStrategy(None, backoff)
+            return EtaPollStrategy(expected_duration - elapsed, backoff)
+
+        raise UserException(f"Unknown polling strategy '{strategy}', use one of "
+                            f"{[POLLING_STRATEGY_FIXED, POLLING_STRATEGY_EXPONENTIAL, POLLING_STRATEGY_ETA]}")
+
+    def _seed_history(self, orch_id: str, client: QueueApiClient) -> None:
+        if self._history.has(orch_id):
+            return
+        try:
+            self._history.seed(orch_id, client.list_recent_jobs(str(orch_id), DEFAULT_HISTORY_SIZE))
+        except QueueApiClientException as api_exc:
+            logging.warning(f"Could not load the recent jobs of flow {orch_id}: {api_exc}")
+
+    def _log_eta(self, orch_id: str, started_at: str) -> None:
+        expected_duration = self._history.expected_duration(orch_id)
+        if expected_duration is None:
+            return
+        remaining = expected_duration - seconds_since(started_at)
+        runs = len(self._history.successful_durations(orch_id))
+        if remaining > 0:
+            logging.info(f"Flow {orch_id} usually takes {expected_duration:.0f} s (median of {runs} successful runs), "
+                         f"expected to finish in about {remaining:.0f} s")
+        else:
+            logging.info(f"Flow {orch_id} usually takes {expected_duration:.0f} s (median of {runs} successful runs), "
+                         f"it is already running for {-remaining:.0f} s longer")
+
+    def _record_duration(self, orch_id: str, job_id: str, job_detail: Dict, status: str) -> None:
+        """
+        Adds the finished run to the duration history in the state file and reports it if it is unusually long
+        or short. The duration is taken from the final job detail, the same way the seeded runs are measured;
+        a killed job has no final detail and is not recorded.
+        """
+        seconds = job_run_seconds(job_detail)
+        if seconds is None:
+            return
+        usual = self._history.outlier(orch_id, seconds)
+        if usual is not None and status.lower() == "success":
+            logging.warning(f"Flow {orch_id} took {seconds:.0f} s, {'longer' if seconds > usual else 'shorter'} "
+                            f"than the usual {usual:.0f} s")
+        self._history.record(orch_id, job_id, seconds, status)
+        self.write_state_file(self._state)
+
+    def _get_client(self, custom_stack, sapi_token, stack, pool_maxsize=DEFAULT_POOL_MAXSIZE):
         try:
             logging.debug(f"Getting client for stack {stack} and custom stack {custom_stack}")
-            return QueueApiClient(sapi_token, stack, custom_stack)
+            return QueueApiClient(sapi_token, stack, custom_stack, pool_maxsize=pool_maxsize, recorder=self._recorder)
         except QueueApiClientException as api_exc:
             raise UserException(api_exc) from api_exc
 
+    def _write_timing_report(self) -> None:
+        summary = self._recorder.summary()
+        totals = summary["totals"]
+        counters = summary["counters"]
+        logging.info(f"Run took {summary['elapsedSeconds']:.1f} s, "
+                     f"{totals.get('http', {}).get('totalSeconds', 0):.1f} s in {counters.get('requests', 0)} "
+                     f"API requests with {counters.get('retries', 0)} retries, "
+                     f"{totals.get('sleep', {}).get('totalSeconds', 0):.1f} s sleeping between status checks")
+        logging.info(f"Timing summary: {json.dumps({'totals': totals, 'counters': counters})}")
+
+        try:
+            with open(self._output_file_path(TIMING_REPORT_FILE), "w") as report_file:
+                json.dump(summary, report_file)
+        except OSError as e:
+            logging.warning(f"Could not write the timing report: {e}")
+
+    def _output_file_path(self, file_name: str) -> str:
+        """
+        Path of a run artifact in out/files, the platform keeps only the out/tables and out/files folders.
+        """
+        os.makedirs(self.files_out_path, exist_ok=True)
+        return os.path.join(self.files_out_path, file_name)
+
     @staticmethod
     def update_config(token: str, stack_url, component_id, configurationId, name, description=None, configuration=None,
                       state=None, changeDescription='', branch_id=None, is_disabled=False, **kwargs):
@@ -238,6 +1142,7 @@ class Component(ComponentBase):
         Raises:
             requests.HTTPError: If the API request fails.
         """
+
         logging.info(f"Updating configuration {configurationId} in component {component_id}")
 
         if not branch_id:
@@ -269,14 +1174,43 @@ class Component(ComponentBase):
 
     @staticmethod
     def process_status(status: str, fail_on_warning: bool) -> None:
+        if status.lower() == JOB_STATUS_TIMEOUT:
+            raise UserException("Flow did not finish within the hard deadline and was killed")
         if not fail_on_warning and status.lower() == "warning":
             logging.warning("Flow ended in a warning")
         elif status.lower() != "success":
             raise UserException(f"Flow did not end in success, ended in {status}")
 
+    @staticmethod
+    def flow_failures(results: List[Dict], fail_on_warning: bool) -> List[str]:
+        """
+        Describes the flows that did not end in success, warnings only if fail_on_warning is set.
+        """
+        failures = []
+        for result in results:
+            try:
+                if result.get("error"):
+                    raise UserException(result["error"])
+                Component.process_status(result["status"], fail_on_warning)
+            except UserException as e:
+                project = f" in project {result['projectId']}" if result.get("projectId") else ""
+                failures.append(f"flow {result['orchestrationId']}{project} (job ID {result.get('jobId')}): {e}")
+        return failures
+
+    @staticmethod
+    def process_statuses(results: List[Dict], fail_on_warning: bool) -> None:
+        failures = Component.flow_failures(results, fail_on_warning)
+        if failures:
+            raise UserException(f"{len(failures)} of {len(results)} flows did not end in success: "
+                                + "; ".join(failures))
+
     @staticmethod
     def process_action_status(status: str, fail_on_warning: bool, jobs_ids: List[str], configurations_ids: List[str],
                               project_ids: List[str], current_project: bool) -> None:
+        if status.lower() == JOB_STATUS_TIMEOUT:
+            raise UserException(f"Flow with job ID {jobs_ids[0]} failed. According to the configuration, the flow "
+                                f"with job ID {jobs_ids[1]} and configuration ID {str(configurations_ids[1])} was "
+                                f"triggered, but it did not finish within the hard deadline and was killed")
         if not fail_on_warning:
 
             if not current_project:
@@ -305,8 +1239,9 @@ class Component(ComponentBase):
 
     @sync_action('list_orchestrations')
     def list_orchestration(self):
+
         self._init_clients()
-        configurations = self._configurations_client.list(FLOW_COMPONENT_ID)
+        configurations = self._list_flow_configurations(self._configurations_client)
         return [
             SelectElement(
                 label="[%s] %s" % (c["id"], c["name"]),
@@ -316,8 +1251,9 @@ class Component(ComponentBase):
 
     @sync_action('list_failure_orchestrations')
     def list_failure_orchestrations(self):
+
         self._init_clients()
-        configurations = self._configurations_on_failure_client.list(FLOW_COMPONENT_ID)
+        configurations = self._list_flow_configurations(self._configurations_on_failure_client)
         return [
             SelectElement(
                 label="[%s] %s" % (c["id"], c["name"]),
@@ -327,31 +1263,73 @@ class Component(ComponentBase):
 
     @sync_action('sync_trigger_metadata')
     def sync_trigger_metadata(self):
+        from kbcstorage.tokens import Tokens
+
         self.validate_configuration_parameters(REQUIRED_PARAMETERS)
         params = self.configuration.parameters
         self._init_clients()
         flow_id = params.get(KEY_ORCHESTRATION_ID)
-
-        flow_url = self._compose_flow_url(flow_id, self.stack_url, self._get_project_id())
-        flow_cfg = self._get_component_detail(self._configurations_client, FLOW_COMPONENT_ID, str(flow_id))
-
-        info_message = (f"This configuration triggers flow named [{flow_cfg['name']}]({flow_url}) "
-                        f"in project `{self._get_project_id()}`.")
-
-        if params.get(KEY_TRIGGER_ACTION_ON_FAILURE, False):
-            flow_id_on_failure = params.get(KEY_ACTION_ON_FAILURE_SETTINGS, {}).get(KEY_CONFIGURATION_ID_ON_FAILURE)
-            flow_cfg_on_failure = self._get_component_detail(self._configurations_on_failure_client,
-                                                             FLOW_COMPONENT_ID,
-                                                             str(flow_id_on_failure))
-
+        project_id = self._get_project_id()
+        trigger_action_on_failure = params.get(KEY_TRIGGER_ACTION_ON_FAILURE, False)
+        flow_id_on_failure = params.get(KEY_ACTION_ON_FAILURE_SETTINGS, {}).get(KEY_CONFIGURATION_ID_ON_FAILURE)
+
+        lookups = {"flow": partial(self._get_component_detail, self._configurations_client, FLOW_COMPONENT_ID,
+                                   str(flow_id))}
+        if trigger_action_on_failure:
+            failure_client = self._configurations_on_failure_client
+            lookups["flow_on_failure"] = partial(self._get_component_detail, failure_client, FLOW_COMPONENT_ID,
+                                                 str(flow_id_on_failure))
+            lookups["token_on_failure"] = self._pooled(Tokens(failure_client.root_url, failure_client.token)).verify
+        results = resolve_concurrently(lookups, METADATA_LOOKUP_TIMEOUT)
+
+        flow_url = self._compose_flow_url(flow_id, self.stack_url, project_id)
+        info_message = (f"This configuration triggers flow named [{self._flow_name(results, 'flow')}]({flow_url}) "
+                        f"in project `{project_id}`.")
+
+        if trigger_action_on_failure:
             flow_url_on_failure = self._compose_flow_url(flow_id_on_failure, self.stack_url_on_failure,
                                                          self._target_project_on_failure)
-            info_message += (f" If the flow fails, it will trigger flow [{flow_cfg_on_failure['name']}]"
+            info_message += (f" If the flow fails, it will trigger flow [{self._flow_name(results, 'flow_on_failure')}]"
                              f"({flow_url_on_failure}) in project `{self._target_project_on_failure}`.")
+
+            token_verification = results.get("token_on_failure")
+            if token_verification is None:
+                info_message += (f" The token for the failure project could not be verified within "
+                                 f"{METADATA_LOOKUP_TIMEOUT} seconds.")
+            elif isinstance(token_verification, Exception):
+                info_message += f" The token for the failure project is not valid: {token_verification}"
         return ValidationResult(info_message)
 
     @staticmethod
-    def _get_component_detail(client: Configurations, component_id: str, configuration_id: str):
+    def _flow_name(results: Dict, lookup: str) -> str:
+        flow_cfg = results.get(lookup)
+        if flow_cfg is None:
+            return f"Flow detail not loaded within {METADATA_LOOKUP_TIMEOUT} seconds"
+        if isinstance(flow_cfg, Exception):
+            raise flow_cfg
+        return flow_cfg['name']
+
+    def _list_flow_configurations(self, client: "Configurations") -> List[Dict]:
+        """
+        Lists id, name and isDisabled of the flow configurations through a cache shared by both listing actions,
+        keyed by stack and token, so the two dropdowns of the same project are served by a single Storage API call.
+        The response is parsed incrementally, the configuration bodies are never held in memory.
+        """
+        if self._configurations_cache is None:
+            backend = DiskCacheBackend(os.path.join(self.data_folder_path, CONFIGURATIONS_CACHE_FOLDER))
+            self._configurations_cache = TTLCache(ttl=CONFIGURATIONS_CACHE_TTL, backend=backend)
+
+        key = cache_key(client.root_url, client.token, FLOW_COMPONENT_ID)
+        configurations = self._configurations_cache.get_or_load(
+            key, lambda: list(stream_configurations(client, FLOW_COMPONENT_ID)))
+
+        settings = self.configuration.parameters.get(KEY_FLOW_LISTING) or {}
+        return list(filter_configurations(configurations, settings.get(KEY_FLOW_LISTING_SEARCH),
+                                          settings.get(KEY_FLOW_LISTING_INCLUDE_DISABLED, True)))
+
+    @staticmethod
+    def _get_component_detail(client: "Configurations", component_id: str, configuration_id: str):
+
         try:
             return client.detail(component_id, configuration_id)
         except requests.HTTPError as e:
@@ -0,0 +1,148 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List
+
+from keboola.component.exceptions import UserException
+
+KEY_NODE_ID = "id"
+KEY_ORCHESTRATION_ID = "orchestrationId"
+KEY_VARIABLES = "variables"
+KEY_DEPENDS_ON = "dependsOn"
+KEY_DEPENDENCY_NODE = "node"
+KEY_DEPENDENCY_CONDITION = "condition"
+
+CONDITION_SUCCESS = "success"
+CONDITION_WARNING = "warning"
+CONDITION_ANY = "any"
+CONDITIONS = (CONDITION_SUCCESS, CONDITION_WARNING, CONDITION_ANY)
+
+
+def condition_met(condition: str, result: Dict) -> bool:
+    """
+    success needs the dependency to end in success, warning accepts also a warning and any accepts every finished
+    dependency. A dependency that was skipped or could not be run meets no condition.
+    """
+    if result.get("skipped") or not result.get("status"):
+        return False
+    status = result["status"].lower()
+    if condition == CONDITION_ANY:
+        return True
+    if condition == CONDITION_WARNING:
+        return status in ("success", "warning")
+    return status == "success"
+
+
+class FlowGraph:
+    """
+    Directed acyclic graph of flows. Each node runs one flow as soon as all its dependencies are finished
+    and meet the condition of their edge, nodes whose condition is not met are skipped together with everything
+    that depends on them.
+
+    Nodes are dicts:
+
+        {"id": "load", "orchestrationId": "123", "variables": [...],
+         "dependsOn": ["extract", {"node": "prepare", "condition": "warning"}]}
+    """
+
+    def __init__(self, nodes: List[Dict]) -> None:
+        self.nodes: Dict[str, Dict] = {}
+        self.dependencies: Dict[str, Dict[str, str]] = {}
+        for node in nodes:
+            node_id = str(node.get(KEY_NODE_ID) or "")
+            if not node_id or not node.get(KEY_ORCHESTRATION_ID):
+                raise UserException(f"Each node of the flow graph must have the {KEY_NODE_ID} "
+                                    f"and the {KEY_ORCHESTRATION_ID} set.")
+            if node_id in self.nodes:
+                raise UserException(f"Node {node_id} is defined more than once in the flow graph.")
+            self.nodes[node_id] = node
+            self.dependencies[node_id] = self._parse_dependencies(node_id, node.get(KEY_DEPENDS_ON) or [])
+
+        for node_id, dependencies in self.dependencies.items():
+            unknown = [d for d in dependencies if d not in self.nodes]
+            if unknown:
+                raise UserException(f"Node {node_id} depends on unknown nodes: {', '.join(unknown)}")
+        self.order = self._topological_order()
+
+    @staticmethod
+    def _parse_dependencies(node_id: str, depends_on: List) -> Dict[str, str]:
+        dependencies = {}
+        for dependency in depends_on:
+            if isinstance(dependency, dict):
+                name = str(dependency.get(KEY_DEPENDENCY_NODE) or "")
+                condition = dependency.get(KEY_DEPENDENCY_CONDITION, CONDITION_SUCCESS)
+            else:
+                name, condition = str(dependency), CONDITION_SUCCESS
+            if condition not in CONDITIONS:
+                raise UserException(f"Invalid condition '{condition}' of the dependency of node {node_id} on {name}, "
+                                    f"use one of {', '.join(CONDITIONS)}")
+            dependencies[name] = condition
+        return dependencies
+
+    def _topological_order(self) -> List[str]:
+        remaining = {node_id: len(dependencies) for node_id, dependencies in self.dependencies.items()}
+        order = [node_id for node_id, count in remaining.items() if count == 0]
+        for node_id in order:
+            for dependant in self.dependants(node_id):
+                remaining[dependant] -= 1
+                if remaining[dependant] == 0:
+                    order.append(dependant)
+        if len(order) != len(self.nodes):
+            cycle = sorted(node_id for node_id in self.nodes if node_id not in order)
+            raise UserException(f"The flow graph contains a cycle between nodes: {', '.join(cycle)}")
+        return order
+
+    def dependants(self, node_id: str) -> List[str]:
+        return [other for other, dependencies in self.dependencies.items() if node_id in dependencies]
+
+    def run(self, run_node: Callable[[Dict], Dict], max_parallelism: int) -> List[Dict]:
+        """
+        Runs the graph, calling run_node for at most max_parallelism nodes at the same time.
+
+        Args:
+            run_node: runs the flow of the node and returns its result with the jobId and status, or the error
+
+        Returns:
+            Results of all nodes in topological order, including the skipped ones.
+        """
+        results: Dict[str, Dict] = {}
+        running: Dict[Future, str] = {}
+
+        def schedule_ready(executor: ThreadPoolExecutor) -> None:
+            for node_id in self.order:
+                if node_id in results or node_id in running.values():
+                    continue
+                dependencies = self.dependencies[node_id]
+                if any(d not in results for d in dependencies):
+                    continue
+                unmet = [d for d, condition in dependencies.items() if not condition_met(condition, results[d])]
+                if unmet:
+                    results[node_id] = self._skipped(node_id, unmet, results)
+                    logging.warning(f"Skipping node {node_id}: {results[node_id]['error']}")
+                    continue
+                logging.info(f"Starting node {node_id} with flow {self.nodes[node_id][KEY_ORCHESTRATION_ID]}")
+                running[executor.submit(run_node, self.nodes[node_id])] = node_id
+
+        with ThreadPoolExecutor(max_workers=max(1, max_parallelism)) as executor:
+            # skipped nodes may unblock further nodes, so schedule until nothing changes
+            while True:
+                finished_count = len(results)
+                schedule_ready(executor)
+                if not running and len(results) == finished_count:
+                    break
+                if not running:
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    node_id = running.pop(future)
+                    results[node_id] = {"node": node_id, **future.result()}
+                    logging.info(f"Node {node_id} finished with status {results[node_id].get('status')}")
+
+        return [results[node_id] for node_id in self.order]
+
+    def _skipped(self, node_id: str, unmet: List[str], results: Dict[str, Dict]) -> Dict:
+        node = self.nodes[node_id]
+        reasons = [f"{d} ({'skipped' if results[d].get('skipped') else results[d].get('status') or 'failed'})"
+                   for d in unmet]
+        return {"node": node_id, "orchestrationId": node[KEY_ORCHESTRATION_ID],
+                "variables": node.get(KEY_VARIABLES, []), "skipped": True,
+                "error": f"skipped, condition of dependencies not met: {', '.join(reasons)}"}
@@ -0,0 +1,160 @@
+"""
+Offline benchmark of the trigger against the local StubApi.
+
+Runs Component.run and every sync action against the stub and reports end-to-end latency, number of requests,
+transferred bytes and peak RSS for each scenario as JSON lines. Every scenario runs in a fresh interpreter,
+so its peak RSS is not the maximum of the scenarios before it.
+
+Usage (from the repository root):
+
+    python -m tests.benchmark --job-duration 3 --error-rate 0.05 --output bench_output.txt
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from tests.stub_api import StubApi
+
+FAST_POLLING = {"strategy": "exponential", "initialInterval": 0.2, "maxInterval": 2, "jitter": 0.1}
+SRC_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src")
+# modules a plain run must not import, see the note on lazy imports in component.py
+LAZY_MODULES = ["kbcstorage", "httpx", "http.server"]
+
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import component
+import_seconds = time.perf_counter() - started
+loaded = [m for m in {lazy_modules!r} if m in sys.modules]
+import client.queue_api
+client.queue_api.QUEUE_V2_URL = {queue_url!r}
+component.Component().execute_action()
+print(json.dumps({{"importSeconds": import_seconds, "lazyModulesLoaded": loaded}}))
+"""
+
+# points both the Queue API and the Storage API URLs of the component to the stub
+SCENARIO_SCRIPT = """
+import contextlib, io, json, resource, time
+import client.queue_api
+import component
+client.queue_api.QUEUE_V2_URL = {stub_url!r}
+component.STACK_URL = {stub_url!r}
+started = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    try:
+        component.Component().execute_action()
+        outcome = "success"
+    except Exception as e:
+        outcome = f"{{type(e).__name__}}: {{e}}"
+print(json.dumps({{"outcome": outcome, "latencySeconds": time.perf_counter() - started,
+                  "peakRssKb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}}))
+"""
+
+
+def run_scenario(stub: StubApi, name: str, parameters: Dict, action: str = "run") -> Dict:
+    data_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(data_dir, "out"))
+    with open(os.path.join(data_dir, "config.json"), "w") as config_file:
+        json.dump({"parameters": {"#kbcToken": "123-stub-token", "kbcUrl": "-", **parameters}, "action": action},
+                  config_file)
+
+    stub.reset_counters()
+    process = subprocess.run([sys.executable, "-c", SCENARIO_SCRIPT.format(stub_url=stub.url + "{STACK}")],
+                             capture_output=True, text=True, cwd=SRC_PATH,
+                             env={**os.environ, "KBC_DATADIR": data_dir}, check=True)
+    measured = json.loads(process.stdout.strip().splitlines()[-1])
+
+    return {"scenario": name,
+            "action": action,
+            "outcome": measured["outcome"],
+            "latencySeconds": round(measured["latencySeconds"], 3),
+            "requests": stub.request_count(),
+            "bytesSent": stub.bytes_received,
+            "bytesReceived": stub.bytes_sent,
+            "peakRssKb": measured["peakRssKb"],
+            "dataDir": data_dir}
+
+
+def measure_startup(stub: StubApi) -> Dict:
+    """
+    Starts the component in a fresh interpreter, the way the platform does, and measures the import time
+    of the entry point and the time from process start to the first request (a trigger POST).
+    """
+    data_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(data_dir, "out"))
+    with open(os.path.join(data_dir, "config.json"), "w") as config_file:
+        json.dump({"parameters": {"#kbcToken": "123-stub-token", "kbcUrl": "-", "orchestrationId": "1"},
+                   "action": "run"}, config_file)
+
+    stub.reset_counters()
+    script = STARTUP_SCRIPT.format(lazy_modules=LAZY_MODULES, queue_url=stub.url + "{STACK}")
+    started = time.time()
+    process = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, cwd=SRC_PATH,
+                             env={**os.environ, "KBC_DATADIR": data_dir}, check=True)
+    total = time.time() - started
+    measured = json.loads(process.stdout.strip().splitlines()[-1])
+
+    return {"scenario": "startup",
+            "action": "run",
+            "importSeconds": round(measured["importSeconds"], 3),
+            "timeToFirstRequestSeconds": round(stub.first_request_at - started, 3),
+            "latencySeconds": round(total, 3),
+            "lazyModulesLoaded": measured["lazyModulesLoaded"],
+            "requests": stub.request_count()}
+
+
+def default_scenarios(fan_out_size: int = 5) -> List[Dict]:
+    failure_settings = {"triggerActionOnFailure": True,
+                        "actionOnFailureSettings": {"targetProject": "other", "failureConfigurationId": "3"}}
+    return [
+        {"name": "run-fixed-polling", "parameters": {"orchestrationId": "1", "waitUntilFinish": True}},
+        {"name": "run-exponential-polling", "parameters": {"orchestrationId": "1", "waitUntilFinish": True,
+                                                           "pollingSettings": FAST_POLLING}},
+        {"name": "run-fan-out", "parameters": {"orchestrations": [{"orchestrationId": str(i)}
+                                                                  for i in range(1, fan_out_size + 1)],
+                                               "waitUntilFinish": True, "pollingSettings": FAST_POLLING}},
+        {"name": "run-failure-action", "parameters": {"orchestrationId": "2", "waitUntilFinish": True,
+                                                      "pollingSettings": FAST_POLLING, **failure_settings}},
+        {"name": "list-orchestrations", "action": "list_orchestrations", "parameters": {}},
+        {"name": "list-failure-orchestrations", "action": "list_failure_orchestrations",
+         "parameters": failure_settings},
+        {"name": "sync-trigger-metadata", "action": "sync_trigger_metadata",
+         "parameters": {"orchestrationId": "1", **failure_settings}},
+    ]
+
+
+def run_benchmark(stub: StubApi, scenarios: List[Dict]) -> List[Dict]:
+    return [run_scenario(stub, s["name"], s["parameters"], s.get("action", "run")) for s in scenarios]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--job-duration", type=float, default=3.0, help="seconds each triggered flow runs")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of HTTP 502 on GET requests")
+    parser.add_argument("--configurations", type=int, default=100, help="number of flows listed by Storage API")
+    parser.add_argument("--fan-out", type=int, default=5, help="number of flows in the fan-out scenario")
+    parser.add_argument("--scenario", action="append", help="run only the scenarios with these names")
+    parser.add_argument("--output", help="also append the JSON lines report to this file")
+    args = parser.parse_args(argv)
+
+    scenarios = [s for s in default_scenarios(args.fan_out) if not args.scenario or s["name"] in args.scenario]
+    with StubApi(default_duration=args.job_duration, job_statuses={"2": "error"}, error_rate=args.error_rate,
+                 configurations=args.configurations) as stub:
+        results = run_benchmark(stub, scenarios)
+        if not args.scenario or "startup" in args.scenario:
+            results.insert(0, measure_startup(stub))
+
+    lines = [json.dumps(result) for result in results]
+    sys.stdout.write("\n".join(lines) + "\n")
+    if args.output:
+        with open(args.output, "a") as output:
+            output.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    main()
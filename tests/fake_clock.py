@@ -0,0 +1,24 @@
+"""
+Manual clock for the tests of the polling, caching, timing, deadline and rate limiting code.
+
+Pass the clock itself (or its monotonic method) where the code takes a clock callable and its sleep method where it
+takes a sleep callable. Sleeping only advances the clock and records the requested seconds.
+"""
+from typing import List
+
+
+class FakeClock:
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+        self.sleeps: List[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
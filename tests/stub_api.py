@@ -0,0 +1,276 @@
+"""
+Local stand-in for the Queue API, the Notification API and the Storage API endpoints used by the component.
+
+Serves all APIs on one port, posts the job-finished notifications to the subscribed webhooks, keeps the triggered jobs in memory and counts the requests and bytes it receives
+and sends. Used by the tests and by the benchmark harness in tests/benchmark.py.
+"""
+import json
+import random
+import re
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Set
+from urllib.parse import parse_qs, urlparse
+
+CONFIGS_PATH = re.compile(r"^/v2/storage/branch/[^/]+/components/(?P<component>[^/]+)/configs/?$")
+CONFIG_DETAIL_PATH = re.compile(r"^/v2/storage/branch/[^/]+/components/(?P<component>[^/]+)/configs/(?P<id>[^/]+)$")
+JOB_DETAIL_PATH = re.compile(r"^/jobs/(?P<id>[^/]+)$")
+JOB_KILL_PATH = re.compile(r"^/jobs/(?P<id>[^/]+)/kill$")
+SUBSCRIPTION_PATH = re.compile(r"^/project-subscriptions/(?P<id>[^/]+)$")
+FINISHED_EVENTS = {"success": "job-succeeded", "warning": "job-succeeded-with-warning"}
+
+
+class StubApi:
+    """
+    Args:
+        job_durations: seconds each flow configuration runs, by configuration ID
+        job_statuses: final status of each flow configuration, success by default
+        default_duration: duration of flows missing in job_durations
+        error_rate: probability of answering a GET request with HTTP 502
+        configurations: number of flow configurations listed by the Storage API
+        throttled_requests: number of first requests answered with HTTP 429 and a Retry-After of retry_after seconds
+        invalid_tokens: tokens answered with HTTP 401
+    """
+
+    def __init__(self, job_durations: Optional[Dict[str, float]] = None,
+                 job_statuses: Optional[Dict[str, str]] = None,
+                 default_duration: float = 1.0, error_rate: float = 0.0, configurations: int = 10,
+                 seed: int = 0, throttled_requests: int = 0, retry_after: int = 1,
+                 invalid_tokens: Optional[Set[str]] = None) -> None:
+        self.job_durations = job_durations or {}
+        self.job_statuses = job_statuses or {}
+        self.default_duration = default_duration
+        self.error_rate = error_rate
+        self.throttled_requests = throttled_requests
+        self.retry_after = retry_after
+        self.invalid_tokens = invalid_tokens or set()
+        self.configurations = [{"id": str(i), "name": f"Flow {i}", "isDisabled": False,
+                                "configuration": {"phases": [], "tasks": []}} for i in range(1, configurations + 1)]
+        self.jobs: Dict[str, Dict] = {}
+        self.events = []
+        self.subscriptions: Dict[str, Dict] = {}
+        self.notifications_sent = 0
+        self._subscriptions_created = 0
+        self.requests = []
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.first_request_at: Optional[float] = None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}/"
+
+    def start(self) -> "StubApi":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubApi":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def reset_counters(self) -> None:
+        with self._lock:
+            self.requests = []
+            self.bytes_received = 0
+            self.bytes_sent = 0
+            self.first_request_at = None
+
+    def request_count(self, method: Optional[str] = None, path_prefix: str = "") -> int:
+        with self._lock:
+            return sum(1 for m, p in self.requests if (method is None or m == method) and p.startswith(path_prefix))
+
+    def _add_event(self, run_id: str, message: str, event_type: str = "info") -> None:
+        # called with the lock held
+        self.events.append({"id": len(self.events) + 1, "runId": run_id, "type": event_type,
+                            "component": "keboola.orchestrator", "message": message,
+                            "created": time.strftime("%Y-%m-%dT%H:%M:%S+0000", time.gmtime())})
+
+    def _job_view(self, job: Dict) -> Dict:
+        elapsed = time.monotonic() - job["_started"]
+        if job.get("_killed"):
+            job["_duration"], job["_status"] = min(job["_duration"], elapsed), "terminated"
+        finished = elapsed >= job["_duration"]
+        if finished and not job.get("_finishEvent"):
+            job["_finishEvent"] = True
+            self._add_event(job["id"], f"Job {job['id']} finished with status {job['_status']}",
+                            "success" if job["_status"] == "success" else "error")
+        view = {k: v for k, v in job.items() if not k.startswith("_")}
+        view.update({"isFinished": finished,
+                     "status": job["_status"] if finished else "processing",
+                     "durationSeconds": round(min(elapsed, job["_duration"]), 3)})
+        return view
+
+    def _create_job(self, body: Dict) -> Dict:
+        config_id = str(body.get("config"))
+        with self._lock:
+            job_id = str(1000 + len(self.jobs))
+            self.jobs[job_id] = {"id": job_id, "component": body.get("component"), "config": config_id,
+                                 "configId": config_id, "mode": body.get("mode"),
+                                 "variableValuesData": body.get("variableValuesData", {}),
+                                 "_started": time.monotonic(),
+                                 "_duration": self.job_durations.get(config_id, self.default_duration),
+                                 "_status": self.job_statuses.get(config_id, "success")}
+            self._add_event(job_id, f"Job {job_id} created")
+            timer = threading.Timer(self.jobs[job_id]["_duration"], self._notify_finished, [job_id])
+            timer.daemon = True
+            timer.start()
+            return self._job_view(self.jobs[job_id])
+
+    def _notify_finished(self, job_id: str) -> None:
+        with self._lock:
+            status = self._job_view(self.jobs[job_id])["status"]
+            event = FINISHED_EVENTS.get(status, "job-failed")
+            addresses = [s["recipient"]["address"] for s in self.subscriptions.values() if s["event"] == event
+                         and {"field": "job.id", "value": job_id} in s.get("filters", [])]
+        for address in addresses:
+            payload = json.dumps({"event": event, "data": {"job": {"id": job_id, "status": status}}}).encode()
+            request = urllib.request.Request(address, data=payload, headers={"Content-Type": "application/json"})
+            try:
+                urllib.request.urlopen(request, timeout=5).close()
+                with self._lock:
+                    self.notifications_sent += 1
+            except OSError:
+                pass
+
+    def _list_events(self, query: Dict) -> list:
+        since_id = int(query.get("sinceId", ["0"])[0])
+        with self._lock:
+            max_id = int(query.get("maxId", [str(len(self.events))])[0])
+            events = [e for e in self.events if since_id < e["id"] <= max_id
+                      and ("runId" not in query or e["runId"] in query["runId"])]
+        events.sort(key=lambda e: e["id"], reverse=True)
+        return events[:int(query.get("limit", ["100"])[0])]
+
+    def _list_jobs(self, query: Dict) -> list:
+        with self._lock:
+            jobs = [self._job_view(job) for job in self.jobs.values()]
+        if "parentRunId" in query:
+            jobs = [job for job in jobs if job.get("parentRunId") in query["parentRunId"]]
+        if "id[]" in query:
+            jobs = [job for job in jobs if job["id"] in query["id[]"]]
+        if "configId[]" in query:
+            jobs = [job for job in jobs if job["configId"] in query["configId[]"]]
+        if "status[]" in query:
+            jobs = [job for job in jobs if job["status"] in query["status[]"]]
+        jobs.sort(key=lambda job: int(job["id"]), reverse=True)
+        return jobs[:int(query.get("limit", ["100"])[0])]
+
+    def route(self, method: str, path: str, query: Dict, body: Optional[Dict], token: Optional[str] = None):
+        if token in self.invalid_tokens:
+            return 401, {"error": "Invalid access token", "code": 401}
+        with self._lock:
+            throttled = self.throttled_requests > 0
+            self.throttled_requests -= throttled
+        if throttled:
+            return 429, {"error": "Too many requests", "code": 429}
+        if method == "GET" and self.error_rate and self._random.random() < self.error_rate:
+            return 502, {"error": "Bad gateway", "code": 502}
+
+        if method == "POST" and path == "/jobs":
+            return 201, self._create_job(body or {})
+        match = JOB_KILL_PATH.match(path)
+        if method == "POST" and match:
+            with self._lock:
+                job = self.jobs.get(match.group("id"))
+                if job is None:
+                    return 404, {"error": "Job not found", "code": 404}
+                job["_killed"] = True
+                return 202, self._job_view(job)
+        if method == "GET" and path == "/jobs":
+            return 200, self._list_jobs(query)
+        match = JOB_DETAIL_PATH.match(path)
+        if method == "GET" and match:
+            with self._lock:
+                job = self.jobs.get(match.group("id"))
+                if job is None:
+                    return 404, {"error": "Job not found", "code": 404}
+                return 200, self._job_view(job)
+
+        if method == "POST" and path == "/project-subscriptions":
+            with self._lock:
+                self._subscriptions_created += 1
+                subscription_id = str(self._subscriptions_created)
+                self.subscriptions[subscription_id] = {"id": subscription_id, **(body or {})}
+                return 201, self.subscriptions[subscription_id]
+        match = SUBSCRIPTION_PATH.match(path)
+        if method == "DELETE" and match:
+            with self._lock:
+                if self.subscriptions.pop(match.group("id"), None) is None:
+                    return 404, {"error": "Subscription not found", "code": 404}
+                return 200, {}
+
+        if method == "GET" and path == "/v2/storage/events":
+            return 200, self._list_events(query)
+        if method == "GET" and path == "/v2/storage/tokens/verify":
+            project_id = str(token).split("-")[0]
+            return 200, {"id": "1", "owner": {"id": int(project_id) if project_id.isdigit() else 123,
+                                              "name": "Stub project"}}
+        if method == "GET" and CONFIGS_PATH.match(path):
+            return 200, self.configurations
+        match = CONFIG_DETAIL_PATH.match(path)
+        if method == "GET" and match:
+            config = next((c for c in self.configurations if c["id"] == match.group("id")), None)
+            if config is None:
+                return 404, {"error": "Configuration not found", "code": 404}
+            return 200, config
+
+        return 404, {"error": f"No stub for {method} {path}", "code": 404}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _handle(self, method: str):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                raw_body = self.rfile.read(length) if length else b""
+                status, payload = stub.route(method, parsed.path, parse_qs(parsed.query),
+                                             json.loads(raw_body) if raw_body else None,
+                                             self.headers.get("X-StorageApi-Token"))
+                response = json.dumps(payload).encode("utf-8")
+                # counted before answering, so the client never sees a response that is not counted yet
+                with stub._lock:
+                    if stub.first_request_at is None:
+                        stub.first_request_at = time.time()
+                    stub.requests.append((method, parsed.path))
+                    stub.bytes_received += len(raw_body) + len(str(self.headers)) + len(self.requestline)
+                    stub.bytes_sent += len(response)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if status == 429:
+                    self.send_header("Retry-After", str(stub.retry_after))
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def do_PUT(self):
+                self._handle("PUT")
+
+            def do_DELETE(self):
+                self._handle("DELETE")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
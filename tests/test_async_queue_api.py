@@ -0,0 +1,101 @@
+import asyncio
+import json
+import unittest
+
+import httpx
+
+from client import AsyncQueueApiClient, QueueApiClientException, ExponentialBackoffPollStrategy, TokenBucketRateLimiter
+
+
+class TestAsyncQueueApiClient(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.requests = []
+        self.sleeps = []
+        self.responses = {}
+        self.now = 0.0
+        self.limiter_sleeps = []
+
+    def limiter_sleep(self, seconds):
+        self.limiter_sleeps.append(seconds)
+        self.now += seconds
+
+    async def fake_sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def build(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            return self.responses[(request.method, request.url.path)].pop(0)
+
+        self.rate_limiter = TokenBucketRateLimiter(clock=lambda: self.now, sleep=self.limiter_sleep)
+        return AsyncQueueApiClient("123-token", "-", None, sleep=self.fake_sleep,
+                                   transport=httpx.MockTransport(handler), rate_limiter=self.rate_limiter)
+
+    async def test_run_orchestration(self):
+        self.responses[("POST", "/jobs")] = [httpx.Response(201, json={"id": "1"})]
+        async with self.build() as client:
+            job = await client.run_orchestration("42", [{"name": "a", "value": "b"}])
+
+        self.assertEqual(job, {"id": "1"})
+        body = json.loads(self.requests[0].content)
+        self.assertEqual(body["config"], "42")
+        self.assertEqual(body["variableValuesData"], {"values": [{"name": "a", "value": "b"}]})
+        self.assertEqual(self.requests[0].headers["X-StorageApi-Token"], "123-token")
+
+    async def test_run_orchestration_error_semantics(self):
+        self.responses[("POST", "/jobs")] = [httpx.Response(400, json={"error": "Not V2", "code": 400})]
+        async with self.build() as client:
+            with self.assertRaisesRegex(QueueApiClientException, "Orchestration V2"):
+                await client.run_orchestration("42", None)
+
+    async def test_post_is_not_retried_on_server_error(self):
+        self.responses[("POST", "/jobs")] = [httpx.Response(500, json={"error": "Boom", "code": 500})]
+        async with self.build() as client:
+            with self.assertRaisesRegex(QueueApiClientException, "Boom"):
+                await client.run_orchestration("42", None)
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_wait_retries_server_errors_and_polls(self):
+        self.responses[("GET", "/jobs/1")] = [httpx.Response(502),
+                                              httpx.Response(504),
+                                              httpx.Response(200, json={"isFinished": False}),
+                                              httpx.Response(200, json={"isFinished": True, "status": "success"})]
+        async with self.build() as client:
+            status = await client.wait_until_job_finished("1", ExponentialBackoffPollStrategy(jitter=0))
+
+        self.assertEqual(status, "success")
+        # two retry backoffs (urllib3 schedule) and one poll interval
+        self.assertEqual(self.sleeps, [0, 0.6, 1])
+
+    async def test_throttled_post_is_retried_after_retry_after(self):
+        self.responses[("POST", "/jobs")] = [httpx.Response(429, headers={"Retry-After": "3"}),
+                                             httpx.Response(201, json={"id": "1"})]
+        async with self.build() as client:
+            job = await client.run_orchestration("42", None)
+
+        self.assertEqual(job, {"id": "1"})
+        self.assertEqual(self.sleeps, [3])
+        self.assertLess(self.rate_limiter.rate, self.rate_limiter.max_rate, "throttling must slow the shared limiter")
+        self.assertEqual(self.limiter_sleeps, [], "the Retry-After wait already covers the pause of the limiter")
+
+    async def test_get_honours_retry_after_of_unavailable_service(self):
+        self.responses[("GET", "/jobs/1")] = [httpx.Response(503, headers={"Retry-After": "2"}),
+                                              httpx.Response(200, json={"isFinished": True, "status": "success"})]
+        async with self.build() as client:
+            status = await client.wait_until_job_finished("1")
+
+        self.assertEqual(status, "success")
+        self.assertEqual(self.sleeps, [2])
+
+    async def test_concurrent_waits(self):
+        self.responses[("GET", "/jobs/1")] = [httpx.Response(200, json={"isFinished": True, "status": "success"})]
+        self.responses[("GET", "/jobs/2")] = [httpx.Response(200, json={"isFinished": True, "status": "error"})]
+        async with self.build() as client:
+            statuses = await asyncio.gather(client.wait_until_job_finished("1"), client.wait_until_job_finished("2"))
+        self.assertEqual(statuses, ["success", "error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
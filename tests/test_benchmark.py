@@ -0,0 +1,48 @@
+import json
+import os
+import unittest
+
+from tests.benchmark import run_scenario
+from tests.stub_api import StubApi
+
+FAST_POLLING = {"strategy": "fixed", "interval": 0.05}
+
+
+class TestBenchmarkHarness(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubApi(default_duration=0.1, job_statuses={"2": "error"}).start()
+
+    def tearDown(self):
+        self.stub.stop()
+
+    def test_run_against_stub(self):
+        result = run_scenario(self.stub, "run", {"orchestrationId": "1", "waitUntilFinish": True,
+                                                 "pollingSettings": FAST_POLLING})
+
+        self.assertEqual(result["outcome"], "success")
+        self.assertEqual(self.stub.request_count("POST", "/jobs"), 1)
+        self.assertGreaterEqual(self.stub.request_count("GET", "/jobs/"), 2)
+        self.assertGreater(result["bytesReceived"], 0)
+        self.assertGreater(result["peakRssKb"], 0)
+
+        with open(os.path.join(result["dataDir"], "out", "files", "timing_report.json")) as report_file:
+            report = json.load(report_file)
+        self.assertEqual(report["counters"]["requests"], result["requests"])
+        self.assertEqual(report["totals"]["trigger"]["count"], 1)
+        self.assertIn("sleep", report["totals"])
+
+    def test_failed_flow_is_reported(self):
+        result = run_scenario(self.stub, "run", {"orchestrationId": "2", "waitUntilFinish": True,
+                                                 "pollingSettings": FAST_POLLING})
+        self.assertIn("ended in error", result["outcome"])
+
+    def test_sync_action_against_stub(self):
+        result = run_scenario(self.stub, "list", {}, action="list_orchestrations")
+
+        self.assertEqual(result["outcome"], "success")
+        self.assertEqual(result["requests"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
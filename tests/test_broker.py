@@ -0,0 +1,107 @@
+import json
+import os
+import unittest
+
+import mock
+from keboola.component.exceptions import UserException
+
+from broker import StackRegistry, parse_targets
+from component import VALID_STACKS, get_stack_url
+from tests.stub_api import StubApi
+from tests.test_component import build_component
+
+
+class TestParseTargets(unittest.TestCase):
+
+    def test_fills_stack_and_token_from_defaults(self):
+        targets = parse_targets([{"orchestrationId": 1}, {"orchestrationId": "2", "kbcUrl": "eu-central-1.",
+                                                          "#kbcToken": "456-other"}],
+                                {"kbcUrl": "-", "#kbcToken": "123-main"}, VALID_STACKS)
+
+        self.assertEqual([(t["stack"], t["token"], t["orchestrationId"]) for t in targets],
+                         [("-", "123-main", "1"), ("eu-central-1.", "456-other", "2")])
+
+    def test_rejects_invalid_targets(self):
+        with self.assertRaisesRegex(UserException, "Target 1 must have"):
+            parse_targets([{"kbcUrl": "-"}], {"#kbcToken": "123-main"}, VALID_STACKS)
+        with self.assertRaisesRegex(UserException, "unknown stack"):
+            parse_targets([{"orchestrationId": "1", "kbcUrl": "nowhere."}], {"#kbcToken": "123-main"}, VALID_STACKS)
+        with self.assertRaisesRegex(UserException, "custom_stack must be set"):
+            parse_targets([{"orchestrationId": "1", "kbcUrl": "Custom Stack"}], {"#kbcToken": "123-main"},
+                          VALID_STACKS)
+
+
+class TestStackRegistry(unittest.TestCase):
+
+    def test_caches_urls_per_stack_and_clients_per_project(self):
+        resolve = mock.Mock(side_effect=get_stack_url)
+        registry = StackRegistry(resolve, pool_maxsize=10)
+
+        for _ in range(3):
+            registry.storage_url("eu-central-1.", "")
+        first = registry.queue_client("eu-central-1.", "", "123-a")
+        second = registry.queue_client("eu-central-1.", "", "456-b")
+
+        resolve.assert_called_once_with("eu-central-1.", "")
+        self.assertIs(registry.queue_client("eu-central-1.", "", "123-a"), first)
+        self.assertIsNot(first, second)
+        self.assertIs(first._session, second._session, "projects on one stack must share the connection pool")
+        self.assertIsNot(first._session, registry.queue_client("-", "", "123-a")._session)
+
+
+class TestBroker(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubApi(default_duration=0.2, job_statuses={"3": "error"}, invalid_tokens={"789-revoked"}).start()
+        self.addCleanup(self.stub.stop)
+        for patcher in (mock.patch("client.queue_api.QUEUE_V2_URL", self.stub.url + "{STACK}"),
+                        mock.patch("component.STACK_URL", self.stub.url + "{STACK}")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def run_broker(self, targets, **parameters):
+        comp = build_component({"kbcUrl": "-", "targets": targets, "waitUntilFinish": True,
+                                "pollingSettings": {"interval": 0.1}, **parameters})
+        try:
+            comp.run()
+        finally:
+            with open(os.path.join(comp.data_folder_path, "out", "files", "broker_report.json")) as report_file:
+                self.report = json.load(report_file)
+
+    def test_triggers_and_awaits_flows_across_projects(self):
+        self.run_broker([{"#kbcToken": "123-a", "orchestrationId": "1"},
+                         {"#kbcToken": "456-b", "orchestrationId": "1"},
+                         {"#kbcToken": "456-b", "orchestrationId": "2", "variables": [{"name": "x", "value": "y"}]}],
+                        maxParallelism=2)
+
+        self.assertEqual(self.report["summary"], {"success": 3})
+        self.assertEqual(sorted((f["projectId"], f["orchestrationId"]) for f in self.report["flows"]),
+                         [("123", "1"), ("456", "1"), ("456", "2")])
+        self.assertEqual(self.stub.request_count("GET", "/v2/storage/tokens/verify"), 2)
+        self.assertEqual(self.stub.request_count("POST", "/jobs"), 3)
+
+    def test_max_parallelism_bounds_triggering_not_waiting(self):
+        self.stub.default_duration = 1.0
+        self.run_broker([{"#kbcToken": "123-a", "orchestrationId": "1"},
+                         {"#kbcToken": "456-b", "orchestrationId": "1"},
+                         {"#kbcToken": "456-b", "orchestrationId": "2"}],
+                        maxParallelism=1)
+
+        self.assertEqual(self.report["summary"], {"success": 3})
+        started = [job["_started"] for job in self.stub.jobs.values()]
+        self.assertLess(max(started) - min(started), 1.0, "all flows must be triggered before the first finishes")
+
+    def test_consolidated_report_of_failures(self):
+        with self.assertRaisesRegex(UserException, "2 of 3 flows") as ctx:
+            self.run_broker([{"#kbcToken": "123-a", "orchestrationId": "1"},
+                             {"#kbcToken": "123-a", "orchestrationId": "3"},
+                             {"#kbcToken": "789-revoked", "orchestrationId": "1"}])
+
+        self.assertIn("flow 3 in project 123", str(ctx.exception))
+        self.assertIn("token is not valid", str(ctx.exception))
+        self.assertEqual(self.report["summary"], {"success": 1, "error": 2})
+        self.assertEqual(self.stub.request_count("POST", "/jobs"), 2, "flows of an invalid token must not run")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import tempfile
+import unittest
+
+from client.cache import DiskCacheBackend, TTLCache, cache_key
+from tests.fake_clock import FakeClock
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock(now=1000.0)
+
+    def test_key_does_not_contain_token(self):
+        key = cache_key("https://connection.keboola.com/", "123-secret", "keboola.orchestrator")
+        self.assertNotIn("secret", key)
+        self.assertEqual(key, cache_key("https://connection.keboola.com", "123-secret", "keboola.orchestrator"))
+
+    def test_entries_expire(self):
+        cache = TTLCache(ttl=60, clock=self.clock)
+        cache.set("a", [1])
+        self.clock.now += 59
+        self.assertEqual(cache.get("a"), [1])
+        self.clock.now += 2
+        self.assertIsNone(cache.get("a"))
+
+    def test_lru_eviction(self):
+        cache = TTLCache(max_entries=2, clock=self.clock)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+
+    def test_get_or_load_loads_once(self):
+        cache = TTLCache(clock=self.clock)
+        calls = []
+        loader = lambda: calls.append(1) or ["cfg"]  # noqa: E731
+        self.assertEqual(cache.get_or_load("a", loader), ["cfg"])
+        self.assertEqual(cache.get_or_load("a", loader), ["cfg"])
+        self.assertEqual(len(calls), 1)
+
+    def test_disk_backend_survives_new_cache_instance(self):
+        directory = tempfile.mkdtemp()
+        TTLCache(ttl=60, backend=DiskCacheBackend(directory), clock=self.clock).set("a", [{"id": "1"}])
+
+        cache = TTLCache(ttl=60, backend=DiskCacheBackend(directory), clock=self.clock)
+        self.assertEqual(cache.get("a"), [{"id": "1"}])
+        self.clock.now += 61
+        self.assertIsNone(TTLCache(ttl=60, backend=DiskCacheBackend(directory), clock=self.clock).get("a"))
+
+    def test_disk_backend_is_size_bounded(self):
+        backend = DiskCacheBackend(tempfile.mkdtemp(), max_entries=2)
+        for key in ["a", "b", "c"]:
+            backend.set(key, {"storedAt": 0, "value": key})
+        self.assertEqual(sum(backend.get(k) is not None for k in ["a", "b", "c"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,12 +3,36 @@ Created on 12. 11. 2018
 
 @author: esner
 '''
+import json
+import os
+import tempfile
+import threading
+import time
 import unittest
+
 import mock
-import os
+import requests
 from freezegun import freeze_time
+from keboola.component.exceptions import UserException
+
+from kbcstorage.configurations import Configurations
+from kbcstorage.tokens import Tokens
+
+from client import QueueApiClient, QueueApiClientException
+from component import Component, resolve_concurrently
+
 
-from component import Component
+def build_component(parameters, action="run", state=None):
+    data_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(data_dir, "out"))
+    if state is not None:
+        os.makedirs(os.path.join(data_dir, "in"))
+        with open(os.path.join(data_dir, "in", "state.json"), "w") as state_file:
+            json.dump(state, state_file)
+    with open(os.path.join(data_dir, "config.json"), "w") as config_file:
+        json.dump({"parameters": parameters, "action": action}, config_file)
+    with mock.patch.dict(os.environ, {"KBC_DATADIR": data_dir}):
+        return Component()
 
 
 class TestComponent(unittest.TestCase):
@@ -22,6 +46,493 @@ class TestComponent(unittest.TestCase):
             comp = Component()
             comp.run()
 
+    def test_process_statuses_aggregates_failures(self):
+        results = [{"orchestrationId": "1", "jobId": "11", "status": "success"},
+                   {"orchestrationId": "2", "jobId": "12", "status": "warning"},
+                   {"orchestrationId": "3", "jobId": "13", "status": "error"},
+                   {"orchestrationId": "4", "error": "Config not found"}]
+        with self.assertRaisesRegex(UserException, "2 of 4 flows") as ctx:
+            Component.process_statuses(results, fail_on_warning=False)
+        self.assertIn("flow 3 (job ID 13)", str(ctx.exception))
+        self.assertIn("Config not found", str(ctx.exception))
+
+        Component.process_statuses(results[:2], fail_on_warning=False)
+        with self.assertRaises(UserException):
+            Component.process_statuses(results[:2], fail_on_warning=True)
+
+    def test_killed_flows_fail_with_distinct_message(self):
+        with self.assertRaisesRegex(UserException, "hard deadline and was killed"):
+            Component.process_status("timeout", fail_on_warning=False)
+        with self.assertRaisesRegex(UserException, "job ID 2 .* hard deadline and was killed"):
+            Component.process_action_status("timeout", False, ["1", "2"], ["10", "20"], ["100", "100"], False)
+
+    @mock.patch.object(QueueApiClient, "list_jobs")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_fan_out_triggers_and_awaits_all_flows(self, run_orchestration, list_jobs):
+        run_orchestration.side_effect = lambda orch_id, variables: {"id": f"job-{orch_id}"}
+        list_jobs.side_effect = lambda job_ids: [{"id": i, "isFinished": True, "status": "success"} for i in job_ids]
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "waitUntilFinish": True,
+                                "orchestrations": [{"orchestrationId": "1"},
+                                                   {"orchestrationId": "2",
+                                                    "variables": [{"name": "a", "value": "b"}]}]})
+        comp.run()
+
+        run_orchestration.assert_has_calls([mock.call("1", []), mock.call("2", [{"name": "a", "value": "b"}])],
+                                           any_order=True)
+        self.assertEqual(sorted(i for c in list_jobs.call_args_list for i in c.args[0]), ["job-1", "job-2"])
+
+    @mock.patch.object(QueueApiClient, "list_jobs")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_fan_out_fails_when_any_flow_fails(self, run_orchestration, list_jobs):
+        run_orchestration.side_effect = lambda orch_id, variables: {"id": f"job-{orch_id}"}
+        list_jobs.side_effect = lambda job_ids: [{"id": i, "isFinished": True,
+                                                  "status": "error" if i == "job-2" else "success"} for i in job_ids]
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "waitUntilFinish": True,
+                                "orchestrations": [{"orchestrationId": "1"}, {"orchestrationId": "2"}]})
+        with self.assertRaisesRegex(UserException, "1 of 2 flows"):
+            comp.run()
+
+    @mock.patch("component.stream_configurations")
+    def test_listing_actions_share_cached_fetch(self, stream_configurations):
+        stream_configurations.side_effect = lambda client, component_id: iter([
+            {"id": "1", "name": "Nightly", "isDisabled": False}, {"id": "2", "name": "Hourly", "isDisabled": True}])
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "triggerActionOnFailure": True,
+                                "actionOnFailureSettings": {"targetProject": "other"},
+                                "flowListing": {"includeDisabled": False}})
+
+        main = comp.list_orchestration()
+        failure = comp.list_failure_orchestrations()
+
+        self.assertEqual([e.value for e in main], ["1"])
+        self.assertEqual(failure[0].label, "[1] Nightly")
+        stream_configurations.assert_called_once_with(mock.ANY, "keboola.orchestrator")
+
+    def test_resolve_concurrently_returns_partial_results(self):
+        release = threading.Event()
+
+        def failing():
+            raise ValueError("boom")
+
+        results = resolve_concurrently({"fast": lambda: 1, "slow": release.wait, "failing": failing}, 0.2)
+        release.set()
+
+        self.assertEqual(results["fast"], 1)
+        self.assertIsInstance(results["failing"], ValueError)
+        self.assertNotIn("slow", results)
+
+    def test_resolve_concurrently_bounds_the_threads(self):
+        running, peak = [], []
+        lock = threading.Lock()
+
+        def call():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+            return True
+
+        results = resolve_concurrently({name: call for name in "abcdef"}, 5, max_workers=2)
+
+        self.assertEqual(len(results), 6)
+        self.assertLessEqual(max(peak), 2)
+
+    @mock.patch("component.METADATA_LOOKUP_TIMEOUT", 0.2)
+    @mock.patch.object(Tokens, "verify")
+    @mock.patch.object(Configurations, "detail")
+    def test_trigger_metadata_returns_partial_result_on_timeout(self, detail, verify):
+        release = threading.Event()
+
+        def flow_detail(component_id, configuration_id):
+            if configuration_id == "2":
+                release.wait()
+            return {"name": f"Flow {configuration_id}"}
+
+        detail.side_effect = flow_detail
+        verify.return_value = {"owner": {"id": 123}}
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "triggerActionOnFailure": True,
+                                "actionOnFailureSettings": {"targetProject": "other", "failureConfigurationId": "2"}})
+
+        result = comp.sync_trigger_metadata()
+        release.set()
+
+        self.assertIn("[Flow 1]", result.message)
+        self.assertIn("Flow detail not loaded within", result.message)
+        self.assertIn("https://connection.keboola.com/admin/projects/123/flows/2", result.message)
+
+    @mock.patch.object(QueueApiClient, "wait_until_job_finished")
+    @mock.patch.object(QueueApiClient, "get_job_detail")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_rerun_reattaches_to_in_flight_job(self, run_orchestration, get_job_detail, wait_until_job_finished):
+        get_job_detail.return_value = {"id": "555", "isFinished": False}
+        wait_until_job_finished.return_value = "success"
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "waitUntilFinish": True},
+                               state={"inFlight": {"stage": "main", "jobId": "555", "configId": "1",
+                                                   "startedAt": "2010-10-10T00:00:00+00:00"}})
+        comp.run()
+
+        run_orchestration.assert_not_called()
+        self.assertEqual(wait_until_job_finished.call_args.args[0], "555")
+        with open(os.path.join(comp.data_folder_path, "out", "state.json")) as state_file:
+            self.assertNotIn("inFlight", json.load(state_file))
+
+    @freeze_time("2011-10-10T12:00:00+00:00")
+    @mock.patch.object(QueueApiClient, "wait_until_job_finished")
+    @mock.patch.object(QueueApiClient, "get_job_detail")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_in_flight_job_finished_long_ago_is_triggered_again(self, run_orchestration, get_job_detail,
+                                                                wait_until_job_finished):
+        get_job_detail.return_value = {"id": "555", "isFinished": True, "status": "error",
+                                       "endTime": "2010-10-10T01:00:00+00:00"}
+        run_orchestration.return_value = {"id": "556"}
+        wait_until_job_finished.return_value = "success"
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "waitUntilFinish": True},
+                               state={"inFlight": {"stage": "main", "jobId": "555", "configId": "1",
+                                                   "startedAt": "2010-10-10T00:00:00+00:00"}})
+        comp.run()
+
+        run_orchestration.assert_called_once_with("1", [])
+        self.assertEqual(wait_until_job_finished.call_args.args[0], "556")
+
+    @freeze_time("2010-10-10T01:10:00+00:00")
+    @mock.patch.object(QueueApiClient, "wait_until_job_finished")
+    @mock.patch.object(QueueApiClient, "get_job_detail")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_in_flight_job_finished_meanwhile_is_reported(self, run_orchestration, get_job_detail,
+                                                          wait_until_job_finished):
+        get_job_detail.return_value = {"id": "555", "isFinished": True, "status": "success",
+                                       "endTime": "2010-10-10T01:00:00+00:00"}
+        wait_until_job_finished.return_value = "success"
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "waitUntilFinish": True},
+                               state={"inFlight": {"stage": "main", "jobId": "555", "configId": "1",
+                                                   "startedAt": "2010-10-10T00:00:00+00:00"}})
+        comp.run()
+
+        run_orchestration.assert_not_called()
+        self.assertEqual(wait_until_job_finished.call_args.args[0], "555")
+
+    @mock.patch.object(QueueApiClient, "wait_until_job_finished")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_failure_stage_is_dropped_when_action_on_failure_is_off(self, run_orchestration,
+                                                                     wait_until_job_finished):
+        run_orchestration.return_value = {"id": "556"}
+        wait_until_job_finished.return_value = "success"
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "waitUntilFinish": True},
+                               state={"inFlight": {"stage": "failure", "jobId": "555", "configId": "1",
+                                                   "status": "error", "failureJobId": "600",
+                                                   "startedAt": "2010-10-10T00:00:00+00:00"}})
+        comp.run()
+
+        run_orchestration.assert_called_once_with("1", [])
+
+    @mock.patch.object(QueueApiClient, "wait_until_job_finished")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_in_flight_job_is_persisted_until_finished(self, run_orchestration, wait_until_job_finished):
+        run_orchestration.return_value = {"id": "777"}
+        persisted = {}
+
+        def wait(job_id, poll_strategy, deadline, notifications=None, on_finished=None):
+            with open(os.path.join(comp.data_folder_path, "out", "state.json")) as state_file:
+                persisted.update(json.load(state_file))
+            raise QueueApiClientException("Connection aborted")
+
+        wait_until_job_finished.side_effect = wait
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "waitUntilFinish": True}, state={"other": 1})
+        with self.assertRaises(UserException):
+            comp.run()
+
+        self.assertEqual(persisted["inFlight"]["jobId"], "777")
+        self.assertEqual(persisted["inFlight"]["stage"], "main")
+        self.assertEqual(persisted["other"], 1)
+
+    @mock.patch.object(QueueApiClient, "wait_until_job_finished")
+    @mock.patch.object(QueueApiClient, "get")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_deduplication_attaches_to_running_job(self, run_orchestration, get, wait_until_job_finished):
+        get.return_value = [{"id": "41", "status": "processing", "isFinished": False,
+                             "variableValuesData": {"values": [{"name": "a", "value": "old"}]}},
+                            {"id": "42", "status": "waiting", "isFinished": False,
+                             "variableValuesData": {"values": [{"name": "a", "value": "b"}]}}]
+        wait_until_job_finished.return_value = "success"
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "variables": [{"name": "a", "value": "b"}], "waitUntilFinish": True,
+                                "deduplication": {"mode": "attach", "matchVariables": True}})
+        comp.run()
+
+        run_orchestration.assert_not_called()
+        get.assert_called_once()
+        self.assertEqual(get.call_args.kwargs["params"]["configId[]"], "1")
+        self.assertEqual(wait_until_job_finished.call_args.args[0], "42")
+
+    @freeze_time("2010-10-10T01:00:00+00:00")
+    @mock.patch.object(QueueApiClient, "wait_until_job_finished")
+    @mock.patch.object(QueueApiClient, "get")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_attached_job_is_timed_from_its_creation(self, run_orchestration, get, wait_until_job_finished):
+        get.return_value = [{"id": "42", "status": "processing", "isFinished": False,
+                             "createdTime": "2010-10-10T00:50:00+00:00"}]
+        elapsed = []
+
+        def wait(job_id, poll_strategy, deadline, notifications=None, on_finished=None):
+            elapsed.append(deadline.elapsed())
+            on_finished({"id": "42", "status": "success", "isFinished": True,
+                         "createdTime": "2010-10-10T00:50:00+00:00", "endTime": "2010-10-10T01:05:00+00:00"})
+            return "success"
+
+        wait_until_job_finished.side_effect = wait
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "waitUntilFinish": True, "waitDeadlines": {"hard": 3600},
+                                "deduplication": {"mode": "attach"}})
+        comp.run()
+
+        self.assertAlmostEqual(elapsed[0], 600, delta=5)
+        with open(os.path.join(comp.data_folder_path, "out", "state.json")) as state_file:
+            self.assertEqual(json.load(state_file)["durationHistory"]["1"], [[900.0, "success", "42"]])
+
+    @mock.patch.object(QueueApiClient, "wait_until_job_finished")
+    @mock.patch.object(QueueApiClient, "get")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_deduplication_skips_or_triggers(self, run_orchestration, get, wait_until_job_finished):
+        run_orchestration.return_value = {"id": "43"}
+        wait_until_job_finished.return_value = "success"
+        parameters = {"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1", "waitUntilFinish": True,
+                      "deduplication": {"mode": "skip"}}
+
+        get.return_value = [{"id": "42", "status": "processing", "isFinished": False}]
+        build_component(parameters).run()
+        run_orchestration.assert_not_called()
+        wait_until_job_finished.assert_not_called()
+
+        get.return_value = []
+        build_component(parameters).run()
+        run_orchestration.assert_called_once_with("1", [])
+        self.assertEqual(wait_until_job_finished.call_args.args[0], "43")
+
+    @mock.patch.object(QueueApiClient, "list_jobs")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_flow_graph_runs_nodes_after_dependencies(self, run_orchestration, list_jobs):
+        triggered = []
+
+        def trigger(orch_id, variables):
+            triggered.append(orch_id)
+            return {"id": f"job-{orch_id}"}
+
+        run_orchestration.side_effect = trigger
+        list_jobs.side_effect = lambda job_ids: [{"id": i, "isFinished": True,
+                                                  "status": "error" if i == "job-2" else "success"} for i in job_ids]
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-",
+                                "flowGraph": [{"id": "extract", "orchestrationId": "1"},
+                                              {"id": "load", "orchestrationId": "2", "dependsOn": ["extract"]},
+                                              {"id": "report", "orchestrationId": "3", "dependsOn": ["load"]},
+                                              {"id": "notify", "orchestrationId": "4",
+                                               "dependsOn": [{"node": "load", "condition": "any"}]}]})
+        with self.assertRaisesRegex(UserException, "1 of 3 flows") as ctx:
+            comp.run()
+
+        self.assertIn("flow 2 (job ID job-2)", str(ctx.exception))
+        self.assertEqual(triggered[:2], ["1", "2"])
+        self.assertEqual(sorted(triggered), ["1", "2", "4"])
+
+    @mock.patch.object(Tokens, "verify")
+    @mock.patch.object(Configurations, "detail")
+    @mock.patch.object(QueueApiClient, "warm_up")
+    @mock.patch.object(QueueApiClient, "wait_until_job_finished")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_failure_action_is_warmed_up_while_flow_runs(self, run_orchestration, wait_until_job_finished, warm_up,
+                                                         detail, verify):
+        run_orchestration.side_effect = lambda orch_id, variables: {"id": f"job-{orch_id}"}
+        detail.return_value = {"id": "2", "name": "On failure"}
+        verify.return_value = {"owner": {"id": 123}}
+        warmed_up_before_failure = []
+
+        def wait(job_id, poll_strategy, deadline, notifications=None, on_finished=None):
+            if job_id == "job-1":
+                comp._failure_warm_up.join()
+                warmed_up_before_failure.append(warm_up.called and detail.called and verify.called)
+                return "error"
+            return "success"
+
+        wait_until_job_finished.side_effect = wait
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "waitUntilFinish": True, "failOnWarning": False, "triggerActionOnFailure": True,
+                                "actionOnFailureSettings": {"targetProject": "other", "failureConfigurationId": "2"}})
+        comp.run()
+
+        self.assertEqual(warmed_up_before_failure, [True])
+        detail.assert_called_once_with("keboola.orchestrator", "2")
+        self.assertEqual([c.args[0] for c in run_orchestration.call_args_list], ["1", "2"])
+
+    @mock.patch.object(Tokens, "verify")
+    @mock.patch.object(Configurations, "detail")
+    @mock.patch.object(QueueApiClient, "warm_up")
+    @mock.patch.object(QueueApiClient, "wait_until_job_finished")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_misconfigured_failure_action_is_reported_early(self, run_orchestration, wait_until_job_finished,
+                                                            warm_up, detail, verify):
+        run_orchestration.return_value = {"id": "job-1"}
+        wait_until_job_finished.return_value = "error"
+        detail.return_value = {"name": "Component with id (2) not found!"}
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "waitUntilFinish": True, "triggerActionOnFailure": True,
+                                "actionOnFailureSettings": {"targetProject": "other", "failureConfigurationId": "2"}})
+        with self.assertLogs(level="WARNING") as logs, \
+                self.assertRaisesRegex(UserException, "action on failure cannot be run.*does not exist"):
+            comp.run()
+
+        self.assertTrue(any("misconfigured" in line for line in logs.output))
+        run_orchestration.assert_called_once_with("1", [])
+
+    @mock.patch.object(Tokens, "verify")
+    @mock.patch.object(Configurations, "detail")
+    @mock.patch.object(QueueApiClient, "warm_up")
+    @mock.patch.object(QueueApiClient, "wait_until_job_finished")
+    @mock.patch.object(QueueApiClient, "list_jobs")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_fan_out_reports_failures_beyond_the_first(self, run_orchestration, list_jobs, wait_until_job_finished,
+                                                       warm_up, detail, verify):
+        run_orchestration.side_effect = lambda orch_id, variables: {"id": f"job-{orch_id}"}
+        list_jobs.side_effect = lambda job_ids: [{"id": i, "isFinished": True,
+                                                  "status": "success" if i == "job-3" else "error"} for i in job_ids]
+        wait_until_job_finished.return_value = "success"
+        detail.return_value = {"id": "9", "name": "On failure"}
+        verify.return_value = {"owner": {"id": 123}}
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "waitUntilFinish": True,
+                                "failOnWarning": False, "triggerActionOnFailure": True,
+                                "actionOnFailureSettings": {"targetProject": "other", "failureConfigurationId": "9"},
+                                "orchestrations": [{"orchestrationId": "1"}, {"orchestrationId": "2"},
+                                                   {"orchestrationId": "3"}]})
+
+        with self.assertRaisesRegex(UserException, "1 other flows did not end in success: flow 2 "):
+            comp.run()
+        self.assertEqual(sorted(c.args[0] for c in run_orchestration.call_args_list), ["1", "2", "3", "9"])
+
+    def test_non_positive_max_parallelism_is_rejected(self):
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "maxParallelism": 0,
+                                "orchestrations": [{"orchestrationId": "1"}]})
+        with self.assertRaisesRegex(UserException, "maxParallelism must be a positive integer"):
+            comp.run()
+
+    def test_invalid_polling_settings_are_rejected(self):
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "waitUntilFinish": True, "pollingSettings": {"interval": -1}})
+        comp._start_failure_warm_up = lambda: None
+        with mock.patch.object(QueueApiClient, "run_orchestration", return_value={"id": "1"}), \
+                self.assertRaisesRegex(UserException, "Invalid polling settings"):
+            comp.run()
+
+    def test_empty_polling_settings_use_the_defaults(self):
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "pollingSettings": None})
+        self.assertEqual(comp._get_poll_strategy("1", None).interval, 10)
+
+    def test_max_parallelism_given_as_text_is_rejected(self):
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "maxParallelism": "3",
+                                "orchestrationId": "1"})
+        with self.assertRaisesRegex(UserException, "maxParallelism must be a positive integer"):
+            comp.run()
+
+    @mock.patch.object(Tokens, "verify")
+    @mock.patch.object(Configurations, "detail")
+    @mock.patch.object(QueueApiClient, "warm_up")
+    @mock.patch.object(QueueApiClient, "wait_until_job_finished")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_failure_action_is_triggered_despite_transient_warm_up_errors(self, run_orchestration,
+                                                                          wait_until_job_finished, warm_up, detail,
+                                                                          verify):
+        run_orchestration.side_effect = lambda orch_id, variables: {"id": f"job-{orch_id}"}
+        wait_until_job_finished.side_effect = lambda job_id, *args, **kwargs: "error" if job_id == "job-1" \
+            else "success"
+        detail.side_effect = requests.HTTPError("502 Bad Gateway", response=mock.Mock(status_code=502))
+        verify.side_effect = requests.ConnectionError("Connection reset")
+        warm_up.side_effect = QueueApiClientException("Connection aborted")
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "waitUntilFinish": True, "failOnWarning": False, "triggerActionOnFailure": True,
+                                "actionOnFailureSettings": {"targetProject": "other", "failureConfigurationId": "2"}})
+        comp.run()
+
+        self.assertEqual([c.args[0] for c in run_orchestration.call_args_list], ["1", "2"])
+
+    @mock.patch.object(Tokens, "verify")
+    @mock.patch.object(Configurations, "detail")
+    @mock.patch.object(QueueApiClient, "warm_up")
+    @mock.patch.object(QueueApiClient, "wait_until_job_finished")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_rejected_failure_token_blocks_the_failure_action(self, run_orchestration, wait_until_job_finished,
+                                                              warm_up, detail, verify):
+        run_orchestration.return_value = {"id": "job-1"}
+        wait_until_job_finished.return_value = "error"
+        detail.return_value = {"id": "2", "name": "On failure"}
+        verify.side_effect = requests.HTTPError("401 Unauthorized", response=mock.Mock(status_code=401))
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "waitUntilFinish": True, "triggerActionOnFailure": True,
+                                "actionOnFailureSettings": {"targetProject": "other", "failureConfigurationId": "2"}})
+        with self.assertRaisesRegex(UserException, "token of the action on failure is not valid"):
+            comp.run()
+
+        run_orchestration.assert_called_once_with("1", [])
+
+    @mock.patch.object(QueueApiClient, "get_job_detail")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_soft_deadline_triggers_failure_action_early(self, run_orchestration, get_job_detail):
+        run_orchestration.side_effect = lambda orch_id, variables: {"id": f"job-{orch_id}"}
+        polls = []
+
+        def job_detail(job_id):
+            if job_id == "job-1":
+                polls.append(job_id)
+                return {"id": job_id, "isFinished": len(polls) > 3, "status": "error"}
+            return {"id": job_id, "isFinished": True, "status": "success"}
+
+        get_job_detail.side_effect = job_detail
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "waitUntilFinish": True, "failOnWarning": False, "triggerActionOnFailure": True,
+                                "actionOnFailureSettings": {"targetProject": "other", "failureConfigurationId": "2"},
+                                "pollingSettings": {"interval": 0.05},
+                                "waitDeadlines": {"soft": 0.01, "hard": 60, "triggerActionOnSoftDeadline": True}})
+        comp._start_failure_warm_up = lambda: None
+        comp.run()
+
+        self.assertEqual([c.args[0] for c in run_orchestration.call_args_list], ["1", "2"])
+        self.assertEqual(polls, ["job-1"] * 4)
+
+    @mock.patch.object(QueueApiClient, "list_recent_jobs")
+    @mock.patch.object(QueueApiClient, "wait_until_job_finished")
+    @mock.patch.object(QueueApiClient, "run_orchestration")
+    def test_duration_history_drives_eta_polling(self, run_orchestration, wait_until_job_finished,
+                                                 list_recent_jobs):
+        run_orchestration.return_value = {"id": "job-9"}
+
+        def wait(job_id, poll_strategy, deadline, notifications=None, on_finished=None):
+            on_finished({"id": job_id, "isFinished": True, "status": "success", "durationSeconds": 500})
+            return "success"
+
+        wait_until_job_finished.side_effect = wait
+        parameters = {"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1", "waitUntilFinish": True,
+                      "pollingSettings": {"strategy": "eta"}}
+
+        list_recent_jobs.return_value = [{"id": "job-1", "isFinished": True, "status": "success",
+                                          "durationSeconds": 600}]
+        comp = build_component(parameters)
+        comp.run()
+
+        self.assertAlmostEqual(wait_until_job_finished.call_args.args[1].expected_duration, 600, delta=5)
+        with open(os.path.join(comp.data_folder_path, "out", "state.json")) as state_file:
+            history = json.load(state_file)["durationHistory"]["1"]
+        self.assertEqual(history, [[600, "success", "job-1"], [500, "success", "job-9"]])
+
+        list_recent_jobs.reset_mock()
+        comp = build_component(parameters, state={"durationHistory": {"1": [[300, "success", "job-1"]]}})
+        comp.run()
+        list_recent_jobs.assert_not_called()
+        self.assertAlmostEqual(wait_until_job_finished.call_args.args[1].expected_duration, 300, delta=5)
+
 
 if __name__ == "__main__":
     # import sys;sys.argv = ['', 'Test.testName']
@@ -0,0 +1,54 @@
+import time
+import unittest
+
+import mock
+
+from client import ConnectionPoolRegistry, FixedPollStrategy, QueueApiClient, WaitDeadline, JOB_STATUS_TIMEOUT
+from tests.fake_clock import FakeClock
+from tests.stub_api import StubApi
+
+
+class TestWaitDeadline(unittest.TestCase):
+
+    def test_soft_deadline_fires_once_and_hard_deadline_is_reported(self):
+        clock = FakeClock()
+        late_jobs = []
+        deadline = WaitDeadline(soft=10, hard=30, elapsed=5, on_soft=late_jobs.append, clock=clock)
+
+        self.assertFalse(deadline.check("1"))
+        self.assertEqual(deadline.cap(60), 5)
+        clock.now = 6
+        with self.assertLogs(level="WARNING"):
+            self.assertFalse(deadline.check("1"))
+        self.assertFalse(deadline.check("1"))
+        self.assertEqual(late_jobs, ["1"])
+        self.assertEqual(deadline.cap(60), 19)
+        clock.now = 25
+        self.assertTrue(deadline.check("1"))
+
+    def test_invalid_deadlines(self):
+        with self.assertRaises(ValueError):
+            WaitDeadline(soft=30, hard=10)
+        with self.assertRaises(ValueError):
+            WaitDeadline(hard=0)
+
+
+class TestQueueApiClientDeadline(unittest.TestCase):
+
+    def test_job_is_killed_after_hard_deadline(self):
+        with StubApi(default_duration=30) as stub, \
+                mock.patch("client.queue_api.QUEUE_V2_URL", stub.url + "{STACK}"):
+            client = QueueApiClient("123-token", "-", None, pool_registry=ConnectionPoolRegistry())
+            job_id = client.run_orchestration("1", [])["id"]
+
+            started = time.monotonic()
+            status = client.wait_until_job_finished(job_id, FixedPollStrategy(10), WaitDeadline(hard=0.3))
+
+            self.assertEqual(status, JOB_STATUS_TIMEOUT)
+            self.assertLess(time.monotonic() - started, 5)
+            self.assertEqual(stub.request_count("POST", f"/jobs/{job_id}/kill"), 1)
+            self.assertEqual(client.get_job_detail(job_id)["status"], "terminated")
+
+
+if __name__ == "__main__":
+    unittest.main()
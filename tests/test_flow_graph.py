@@ -0,0 +1,66 @@
+import threading
+import time
+import unittest
+
+from keboola.component.exceptions import UserException
+
+from flow_graph import FlowGraph
+
+
+def node(node_id, *depends_on):
+    return {"id": node_id, "orchestrationId": f"flow-{node_id}", "dependsOn": list(depends_on)}
+
+
+class TestFlowGraph(unittest.TestCase):
+
+    def test_invalid_graphs_are_rejected(self):
+        with self.assertRaisesRegex(UserException, "cycle between nodes: a, b"):
+            FlowGraph([node("a", "b"), node("b", "a"), node("c")])
+        with self.assertRaisesRegex(UserException, "unknown nodes: x"):
+            FlowGraph([node("a", "x")])
+        with self.assertRaisesRegex(UserException, "Invalid condition"):
+            FlowGraph([node("a"), node("b", {"node": "a", "condition": "sometimes"})])
+        with self.assertRaisesRegex(UserException, "more than once"):
+            FlowGraph([node("a"), node("a")])
+
+    def test_independent_branches_run_in_parallel_within_cap(self):
+        lock = threading.Lock()
+        running, peak, started = [0], [0], []
+
+        def run_node(n):
+            with lock:
+                started.append(n["id"])
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return {"orchestrationId": n["orchestrationId"], "status": "success"}
+
+        graph = FlowGraph([node("a"), node("b"), node("c"), node("d", "a", "b", "c")])
+        results = graph.run(run_node, max_parallelism=2)
+
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(started[-1], "d")
+        self.assertEqual([r["node"] for r in results], ["a", "b", "c", "d"])
+
+    def test_unmet_conditions_skip_dependants(self):
+        statuses = {"a": "warning", "b": "error"}
+        graph = FlowGraph([node("a"), node("b"),
+                           node("on_success", "a"),
+                           node("on_warning", {"node": "a", "condition": "warning"}),
+                           node("cleanup", {"node": "b", "condition": "any"}),
+                           node("after_skipped", {"node": "on_success", "condition": "any"})])
+
+        results = {r["node"]: r for r in graph.run(
+            lambda n: {"orchestrationId": n["orchestrationId"], "status": statuses.get(n["id"], "success")}, 4)}
+
+        self.assertTrue(results["on_success"]["skipped"])
+        self.assertIn("a (warning)", results["on_success"]["error"])
+        self.assertEqual(results["on_warning"]["status"], "success")
+        self.assertEqual(results["cleanup"]["status"], "success")
+        self.assertTrue(results["after_skipped"]["skipped"])
+
+
+if __name__ == "__main__":
+    unittest.main()
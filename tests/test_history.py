@@ -0,0 +1,44 @@
+import unittest
+
+from client.history import DurationHistory, job_run_seconds
+
+
+class TestDurationHistory(unittest.TestCase):
+
+    def test_ring_buffer_keeps_newest_entries(self):
+        history = DurationHistory(size=3)
+        for i in range(5):
+            history.record("1", f"job-{i}", 10 + i, "success")
+        history.record("1", "job-4", 99, "success")
+
+        self.assertEqual(history.successful_durations("1"), [12, 13, 14])
+        self.assertEqual(DurationHistory(history.to_state(), size=2).to_state(),
+                         {"1": [[13, "success", "job-3"], [14, "success", "job-4"]]})
+
+    def test_seed_from_job_list(self):
+        history = DurationHistory()
+        history.seed("1", [{"id": "3", "isFinished": False, "status": "processing"},
+                           {"id": "2", "isFinished": True, "status": "error", "durationSeconds": 5},
+                           {"id": "1", "isFinished": True, "status": "success",
+                            "createdTime": "2024-01-01T10:00:00+00:00", "endTime": "2024-01-01T10:02:00+00:00"}])
+
+        self.assertTrue(history.has("1"))
+        self.assertFalse(history.has("2"))
+        self.assertEqual(history.to_state()["1"], [[120.0, "success", "1"], [5.0, "error", "2"]])
+        self.assertEqual(history.expected_duration("1"), 120)
+
+    def test_outliers(self):
+        history = DurationHistory({"1": [[d, "success", str(i)] for i, d in enumerate([100, 104, 98, 101, 97])]})
+
+        self.assertEqual(history.outlier("1", 300), 100)
+        self.assertEqual(history.outlier("1", 20), 100)
+        self.assertIsNone(history.outlier("1", 110))
+        self.assertIsNone(DurationHistory({"1": [[100, "success", "1"]]}).outlier("1", 300))
+
+    def test_job_run_seconds(self):
+        self.assertEqual(job_run_seconds({"durationSeconds": 7}), 7.0)
+        self.assertIsNone(job_run_seconds({}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import time
+import unittest
+
+from client import QueueApiClient
+from client.http_pool import ConnectionPoolRegistry, TokenBucketRateLimiter
+from tests.fake_clock import FakeClock
+from tests.stub_api import StubApi
+
+import mock
+
+
+class TestTokenBucketRateLimiter(unittest.TestCase):
+
+    def test_burst_then_steady_rate(self):
+        clock = FakeClock()
+        limiter = TokenBucketRateLimiter(rate=2, burst=3, clock=clock, sleep=clock.sleep)
+
+        waits = [limiter.acquire() for _ in range(5)]
+
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertEqual(waits[3:], [0.5, 0.5])
+
+    def test_backoff_pauses_and_slows_down(self):
+        clock = FakeClock()
+        limiter = TokenBucketRateLimiter(rate=4, burst=4, clock=clock, sleep=clock.sleep)
+
+        limiter.backoff(retry_after=3)
+        self.assertEqual(limiter.rate, 2)
+        self.assertGreaterEqual(limiter.acquire(), 3)
+
+        for _ in range(10):
+            limiter.on_success()
+        self.assertEqual(limiter.rate, 4)
+
+    def test_registry_shares_session_per_host_and_token(self):
+        registry = ConnectionPoolRegistry()
+        first = registry.get_session("https://queue.keboola.com/jobs", "token", mock.Mock)
+        second = registry.get_session("https://queue.keboola.com", "token", mock.Mock)
+        other = registry.get_session("https://queue.keboola.com", "other-token", mock.Mock)
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+
+
+class TestQueueApiClientThrottling(unittest.TestCase):
+
+    def test_throttled_requests_honour_retry_after(self):
+        limiter = TokenBucketRateLimiter(rate=10)
+        with StubApi(throttled_requests=1, retry_after=1) as stub, \
+                mock.patch("client.queue_api.QUEUE_V2_URL", stub.url + "{STACK}"):
+            client = QueueApiClient("123-token", "-", None, rate_limiter=limiter,
+                                    pool_registry=ConnectionPoolRegistry())
+            started = time.monotonic()
+            job = client.run_orchestration("1", [])
+
+            self.assertGreaterEqual(time.monotonic() - started, 1)
+            self.assertEqual(job["config"], "1")
+            self.assertEqual(stub.request_count("POST"), 2)
+            self.assertLess(limiter.rate, 10)
+            self.assertEqual(client.recorder.summary()["counters"]["retries"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+import unittest
+
+import mock
+
+from client import ConnectionPoolRegistry, ExponentialBackoffPollStrategy, QueueApiClient, TokenBucketRateLimiter
+from client.job_events import JobEventTail
+from tests.stub_api import StubApi
+
+
+class TestJobEventTail(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubApi(default_duration=0.5).start()
+        patcher = mock.patch("client.queue_api.QUEUE_V2_URL", self.stub.url + "{STACK}")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.stub.stop)
+        self.limiter = TokenBucketRateLimiter(rate=100, burst=100)
+        self.client = QueueApiClient("123-token", "-", None, rate_limiter=self.limiter,
+                                     pool_registry=ConnectionPoolRegistry())
+        self.output_path = os.path.join(tempfile.mkdtemp(), "job_events.jsonl")
+
+    def build_tail(self, **kwargs):
+        return JobEventTail(self.client, self.stub.url, "123-token", self.output_path, rate_limiter=self.limiter,
+                            pool_registry=ConnectionPoolRegistry(), **kwargs)
+
+    def read_lines(self):
+        with open(self.output_path) as output:
+            return [json.loads(line) for line in output]
+
+    def test_streams_events_and_child_jobs_while_waiting(self):
+        job_id = self.client.run_orchestration("1", [])["id"]
+        child = self.client.run_orchestration("5", [])
+        self.stub.jobs[child["id"]]["parentRunId"] = job_id
+
+        tail = self.build_tail(interval=0.05).start(job_id)
+        status = self.client.wait_until_job_finished(job_id, ExponentialBackoffPollStrategy(0.05, 0.1, jitter=0))
+        tail.stop()
+
+        self.assertEqual(status, "success")
+        lines = self.read_lines()
+        events = [line for line in lines if "eventId" in line]
+        self.assertEqual([e["message"] for e in events], [f"Job {job_id} created",
+                                                          f"Job {job_id} finished with status success"])
+        children = [line["status"] for line in lines if line.get("childJobId") == child["id"]]
+        self.assertEqual(children, ["processing", "success"])
+
+    def test_pages_backwards_to_the_cursor(self):
+        job_id = self.client.run_orchestration("1", [])["id"]
+        tail = self.build_tail(page_limit=2)
+        tail.poll_once()
+        with self.stub._lock:
+            for i in range(5):
+                self.stub._add_event(job_id, f"step {i}")
+        requests_before = self.stub.request_count("GET", "/v2/storage/events")
+        tail.poll_once()
+
+        messages = [line["message"] for line in self.read_lines() if "eventId" in line]
+        self.assertEqual(messages, [f"Job {job_id} created"] + [f"step {i}" for i in range(5)])
+        self.assertEqual(self.stub.request_count("GET", "/v2/storage/events") - requests_before, 3)
+
+    def test_first_fetch_pages_back_to_the_oldest_event(self):
+        job_id = self.client.run_orchestration("1", [])["id"]
+        with self.stub._lock:
+            for i in range(4):
+                self.stub._add_event(job_id, f"step {i}")
+
+        self.build_tail(page_limit=2).poll_once()
+
+        messages = [line["message"] for line in self.read_lines() if "eventId" in line]
+        self.assertEqual(messages, [f"Job {job_id} created"] + [f"step {i}" for i in range(4)])
+
+    def test_truncated_first_fetch_is_reported(self):
+        job_id = self.client.run_orchestration("1", [])["id"]
+        with self.stub._lock:
+            for i in range(4):
+                self.stub._add_event(job_id, f"step {i}")
+
+        with self.assertLogs(level="WARNING") as logs:
+            self.build_tail(page_limit=2, max_pages=1).poll_once()
+
+        self.assertIn("older ones are not streamed", logs.output[0])
+        messages = [line["message"] for line in self.read_lines() if "eventId" in line]
+        self.assertEqual(messages, ["step 2", "step 3"])
+
+
+if __name__ == "__main__":
+    unittest.main()
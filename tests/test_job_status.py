@@ -0,0 +1,129 @@
+import unittest
+
+import mock
+from requests import HTTPError
+
+from client import JobStatusMultiplexer, QueueApiClientException, FixedPollStrategy, TimingRecorder
+
+
+class FakeQueueClient:
+    pool_maxsize = 4
+
+    def __init__(self, finish_after, honour_id_filter=True):
+        self.recorder = TimingRecorder()
+        self.finish_after = finish_after
+        self.honour_id_filter = honour_id_filter
+        self.polls = {}
+        self.list_calls = 0
+        self.detail_calls = 0
+
+    def _detail(self, job_id):
+        self.polls[job_id] = self.polls.get(job_id, 0) + 1
+        finished = self.polls[job_id] >= self.finish_after[job_id]
+        return {"id": job_id, "isFinished": finished, "status": "success" if finished else "processing"}
+
+    def list_jobs(self, job_ids):
+        self.list_calls += 1
+        if not self.honour_id_filter:
+            return [{"id": "unrelated", "isFinished": True, "status": "success"}]
+        return [self._detail(job_id) for job_id in job_ids]
+
+    def get_job_detail(self, job_id):
+        self.detail_calls += 1
+        return self._detail(job_id)
+
+
+class TestJobStatusMultiplexer(unittest.TestCase):
+
+    def setUp(self):
+        self.sleeps = []
+
+    def build(self, client):
+        return JobStatusMultiplexer(client, FixedPollStrategy(5), sleep=self.sleeps.append)
+
+    def test_one_request_per_tick(self):
+        client = FakeQueueClient({"1": 1, "2": 3, "3": 2})
+        multiplexer = self.build(client)
+        futures = {job_id: multiplexer.track(job_id) for job_id in ["1", "2", "3"]}
+
+        self.assertEqual({k: f.result(timeout=5) for k, f in futures.items()},
+                         {"1": "success", "2": "success", "3": "success"})
+        multiplexer.close()
+        self.assertLessEqual(client.list_calls, 3 + 2)
+        self.assertEqual(client.detail_calls, 0)
+
+    def test_falls_back_to_job_details(self):
+        client = FakeQueueClient({"1": 2, "2": 1}, honour_id_filter=False)
+        multiplexer = self.build(client)
+        futures = [multiplexer.track(job_id) for job_id in ["1", "2"]]
+
+        self.assertEqual([f.result(timeout=5) for f in futures], ["success", "success"])
+        multiplexer.close()
+        self.assertFalse(multiplexer.batch_supported)
+        self.assertEqual(client.list_calls, 1)
+        self.assertGreaterEqual(client.detail_calls, 3)
+
+    def test_api_error_is_propagated_to_waiters(self):
+        class FailingClient(FakeQueueClient):
+            def get_job_detail(self, job_id):
+                raise QueueApiClientException("Job not found")
+
+            def list_jobs(self, job_ids):
+                raise QueueApiClientException("Bad request")
+
+        multiplexer = self.build(FailingClient({}))
+        future = multiplexer.track("1")
+        with self.assertRaisesRegex(QueueApiClientException, "Job not found"):
+            future.result(timeout=5)
+        multiplexer.close()
+
+    def test_transient_list_error_keeps_batching(self):
+        class FlakyClient(FakeQueueClient):
+            def list_jobs(self, job_ids):
+                if self.list_calls == 0:
+                    self.list_calls += 1
+                    raise QueueApiClientException("Service unavailable")
+                return super().list_jobs(job_ids)
+
+        client = FlakyClient({"1": 3, "2": 3})
+        multiplexer = self.build(client)
+        futures = [multiplexer.track(job_id) for job_id in ["1", "2"]]
+
+        self.assertEqual([f.result(timeout=5) for f in futures], ["success", "success"])
+        multiplexer.close()
+        self.assertTrue(multiplexer.batch_supported)
+        self.assertEqual(client.detail_calls, 2, "only the failed tick falls back to job detail requests")
+
+    def test_rejected_filter_turns_batching_off(self):
+        class RejectingClient(FakeQueueClient):
+            def list_jobs(self, job_ids):
+                self.list_calls += 1
+                raise QueueApiClientException("Bad request") from HTTPError(response=mock.Mock(status_code=400))
+
+        client = RejectingClient({"1": 2})
+        multiplexer = self.build(client)
+
+        self.assertEqual(multiplexer.track("1").result(timeout=5), "success")
+        multiplexer.close()
+        self.assertFalse(multiplexer.batch_supported)
+        self.assertEqual(client.list_calls, 1)
+
+    def test_failing_job_detail_fails_only_its_job(self):
+        class DeletedJobClient(FakeQueueClient):
+            def get_job_detail(self, job_id):
+                if job_id == "2":
+                    raise QueueApiClientException("Job not found")
+                return super().get_job_detail(job_id)
+
+        multiplexer = self.build(DeletedJobClient({"1": 2, "3": 1}, honour_id_filter=False))
+        futures = {job_id: multiplexer.track(job_id) for job_id in ["1", "2", "3"]}
+
+        self.assertEqual(futures["1"].result(timeout=5), "success")
+        self.assertEqual(futures["3"].result(timeout=5), "success")
+        with self.assertRaisesRegex(QueueApiClientException, "Job not found"):
+            futures["2"].result(timeout=5)
+        multiplexer.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
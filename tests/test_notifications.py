@@ -0,0 +1,151 @@
+import json
+import socket
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+import mock
+
+from client import (JobStatusMultiplexer, LocalNotificationTransport, NotificationTransport, QueueApiClient,
+                    WebhookListener)
+from client.notifications import NotificationSubscriber, parse_job_notification
+from client.polling import FixedPollStrategy
+from tests.stub_api import StubApi
+from tests.test_component import build_component
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def post_json(url: str, payload) -> int:
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+class TestLocalNotificationTransport(unittest.TestCase):
+
+    def test_notification_before_the_wait_is_not_lost(self):
+        transport = LocalNotificationTransport()
+        transport.notify("1", "success")
+
+        self.assertEqual(transport.wait("1", 0), "success")
+        self.assertIsNone(transport.wait("1", 0.05))
+
+    def test_wait_ends_on_notification(self):
+        transport = LocalNotificationTransport()
+        received = []
+        transport.add_listener(lambda job_id, status: received.append((job_id, status)))
+        threading.Timer(0.1, transport.notify, ["7", "error"]).start()
+
+        started = time.monotonic()
+        self.assertEqual(transport.wait("7", 10), "error")
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(received, [("7", "error")])
+
+    def test_parse_job_notification(self):
+        self.assertEqual(parse_job_notification({"event": "job-failed", "data": {"job": {"id": 5}}}), ("5", "error"))
+        self.assertEqual(parse_job_notification({"jobId": "6", "job": {"status": "warning"}}), ("6", "warning"))
+        self.assertIsNone(parse_job_notification({"event": "job-processing", "data": {"job": {"id": 5}}}))
+
+
+class TestWebhookListener(unittest.TestCase):
+
+    def setUp(self):
+        self.listener = WebhookListener(host="127.0.0.1")
+        self.listener.start()
+        self.addCleanup(self.listener.close)
+        self.url = f"http://127.0.0.1:{self.listener.port}/"
+
+    def test_receives_job_notifications(self):
+        self.assertEqual(post_json(self.url, {"event": "job-succeeded", "data": {"job": {"id": "42"}}}), 202)
+        self.assertEqual(self.listener.wait("42", 1), "success")
+
+    def test_rejects_other_payloads(self):
+        self.assertEqual(post_json(self.url, {"event": "something-else"}), 400)
+
+
+class TestCompletionNotifications(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubApi(default_duration=0.3).start()
+        self.addCleanup(self.stub.stop)
+        patcher = mock.patch("client.queue_api.QUEUE_V2_URL", self.stub.url + "{STACK}")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_wait_finishes_on_notification_not_on_safety_net_poll(self):
+        client = QueueApiClient("token", "-", None)
+        listener = WebhookListener(host="127.0.0.1")
+        listener.start()
+        self.addCleanup(listener.close)
+        job = client.run_orchestration("1", [])
+        NotificationSubscriber("token", client.base_url).subscribe_job(job["id"], f"http://127.0.0.1:{listener.port}/")
+
+        started = time.monotonic()
+        status = client.wait_until_job_finished(job["id"], FixedPollStrategy(60), notifications=listener)
+
+        self.assertEqual(status, "success")
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(self.stub.request_count("GET", "/jobs/"), 2)
+
+    def test_multiplexer_wakes_up_on_notification(self):
+        client = QueueApiClient("token", "-", None)
+        transport = LocalNotificationTransport()
+        multiplexer = JobStatusMultiplexer(client, FixedPollStrategy(60), notifications=transport)
+        self.addCleanup(multiplexer.close)
+        job = client.run_orchestration("1", [])
+
+        future = multiplexer.track(job["id"])
+        threading.Timer(0.5, transport.notify, [job["id"], "success"]).start()
+
+        self.assertEqual(future.result(timeout=10), "success")
+
+    def test_multiplexer_removes_its_listener_on_close(self):
+        transport = mock.Mock(spec=NotificationTransport)
+        multiplexer = JobStatusMultiplexer(QueueApiClient("token", "-", None), notifications=transport)
+
+        multiplexer.close()
+
+        listener = transport.add_listener.call_args[0][0]
+        transport.remove_listener.assert_called_once_with(listener)
+
+    def test_component_run_detects_finish_through_webhook(self):
+        port = free_port()
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "waitUntilFinish": True,
+                                "completionNotifications": {"enabled": True, "listenPort": port,
+                                                            "publicUrl": f"http://127.0.0.1:{port}/",
+                                                            "safetyNetInterval": 60}})
+
+        started = time.monotonic()
+        comp.run()
+
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual(self.stub.notifications_sent, 1)
+        self.assertEqual(self.stub.subscriptions, {}, "subscriptions must be removed after the run")
+
+    def test_jobs_not_subscribed_are_polled_with_polling_settings(self):
+        comp = build_component({"#kbcToken": "123-token", "kbcUrl": "-", "orchestrationId": "1",
+                                "waitUntilFinish": True, "pollingSettings": {"interval": 0.1},
+                                "completionNotifications": {"enabled": True, "listenPort": free_port(),
+                                                            "safetyNetInterval": 60}})
+
+        started = time.monotonic()
+        comp.run()
+
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual(self.stub.request_count("POST", "/project-subscriptions"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import random
+import unittest
+
+import mock
+
+from client import QueueApiClient, FixedPollStrategy, ExponentialBackoffPollStrategy, EtaPollStrategy
+from tests.fake_clock import FakeClock
+
+
+class TestPollStrategies(unittest.TestCase):
+
+    def test_fixed_interval(self):
+        strategy = FixedPollStrategy(5)
+        self.assertEqual([strategy.next_interval(a, 0) for a in range(1, 4)], [5, 5, 5])
+
+    def test_fixed_interval_must_be_positive(self):
+        for interval in (0, -1):
+            with self.assertRaises(ValueError):
+                FixedPollStrategy(interval)
+
+    def test_exponential_grows_to_ceiling(self):
+        strategy = ExponentialBackoffPollStrategy(initial_interval=1, max_interval=10, jitter=0)
+        self.assertEqual([strategy.next_interval(a, 0) for a in range(1, 7)], [1, 2, 4, 8, 10, 10])
+
+    def test_exponential_jitter_stays_within_bounds(self):
+        strategy = ExponentialBackoffPollStrategy(initial_interval=4, max_interval=8, jitter=0.5,
+                                                  rng=random.Random(42))
+        intervals = [strategy.next_interval(1, 0) for _ in range(100)]
+        self.assertTrue(all(2 <= i <= 6 for i in intervals))
+        self.assertGreater(len(set(intervals)), 1)
+        self.assertTrue(all(strategy.next_interval(5, 0) <= 8 for _ in range(100)))
+
+    def test_exponential_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            ExponentialBackoffPollStrategy(initial_interval=10, max_interval=5)
+        with self.assertRaises(ValueError):
+            ExponentialBackoffPollStrategy(jitter=1)
+
+    def test_eta_sleeps_until_expected_finish_then_backs_off(self):
+        backoff = ExponentialBackoffPollStrategy(initial_interval=1, max_interval=60, jitter=0)
+        strategy = EtaPollStrategy(120, backoff, lead_time=5)
+        # expected duration is 120 s, the first sleep is not capped by the backoff ceiling
+        self.assertEqual(strategy.next_interval(1, 0), 115)
+        self.assertEqual([strategy.next_interval(a, 115) for a in range(2, 5)], [1, 2, 4])
+
+    def test_eta_sleep_is_bounded_by_max_sleep(self):
+        backoff = ExponentialBackoffPollStrategy(initial_interval=1, max_interval=60, jitter=0)
+        strategy = EtaPollStrategy(7200, backoff, lead_time=5, max_sleep=3600)
+        self.assertEqual(strategy.next_interval(1, 0), 3600)
+        self.assertEqual(strategy.next_interval(2, 3600), 3595)
+
+    def test_eta_without_history_uses_backoff(self):
+        backoff = ExponentialBackoffPollStrategy(initial_interval=1, max_interval=60, jitter=0)
+        strategy = EtaPollStrategy(None, backoff)
+        self.assertEqual([strategy.next_interval(a, 0) for a in range(1, 4)], [1, 2, 4])
+        strategy.reset()
+        self.assertEqual(strategy.next_interval(1, 0), 1)
+
+
+class TestWaitUntilJobFinished(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.client = QueueApiClient("123-token", "-", None, clock=self.clock.monotonic, sleep=self.clock.sleep)
+
+    def test_polls_until_finished_without_trailing_sleep(self):
+        details = [{"isFinished": False}, {"isFinished": False}, {"isFinished": True, "status": "success"}]
+        finished = []
+        with mock.patch.object(self.client, "get", side_effect=details) as get:
+            status = self.client.wait_until_job_finished("1", ExponentialBackoffPollStrategy(jitter=0),
+                                                         on_finished=finished.append)
+
+        self.assertEqual(status, "success")
+        self.assertEqual(finished, [details[-1]])
+        self.assertEqual(get.call_count, 3)
+        self.assertEqual(self.clock.sleeps, [1, 2])
+
+    def test_default_strategy_keeps_fixed_interval(self):
+        details = [{"isFinished": False}, {"isFinished": True, "status": "error"}]
+        with mock.patch.object(self.client, "get", side_effect=details):
+            status = self.client.wait_until_job_finished("1")
+
+        self.assertEqual(status, "error")
+        self.assertEqual(self.clock.sleeps, [10])
+
+    def test_eta_polls_a_long_flow_far_less_than_backoff(self):
+        def job_detail(*args, **kwargs):
+            return {"isFinished": self.clock.now >= 7200, "status": "success"}
+
+        def count_polls(strategy):
+            self.clock.now, self.clock.sleeps = 0.0, []
+            with mock.patch.object(self.client, "get", side_effect=job_detail) as get:
+                self.client.wait_until_job_finished("1", strategy)
+            return get.call_count
+
+        backoff_polls = count_polls(ExponentialBackoffPollStrategy(jitter=0))
+        eta_polls = count_polls(EtaPollStrategy(7200, ExponentialBackoffPollStrategy(jitter=0), lead_time=5))
+
+        self.assertGreater(backoff_polls, 100)
+        self.assertLessEqual(eta_polls, 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
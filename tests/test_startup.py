@@ -0,0 +1,24 @@
+import unittest
+
+from tests.benchmark import LAZY_MODULES, measure_startup
+from tests.stub_api import StubApi
+
+# generous limits, they catch heavy imports sneaking into the entry point rather than measure precisely
+IMPORT_TIME_THRESHOLD = 1.5
+TIME_TO_FIRST_REQUEST_THRESHOLD = 3.0
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_cold_start_within_threshold(self):
+        with StubApi() as stub:
+            result = measure_startup(stub)
+
+        self.assertEqual(result["requests"], 1)
+        self.assertEqual(result["lazyModulesLoaded"], [], f"{LAZY_MODULES} must be imported lazily")
+        self.assertLess(result["importSeconds"], IMPORT_TIME_THRESHOLD)
+        self.assertLess(result["timeToFirstRequestSeconds"], TIME_TO_FIRST_REQUEST_THRESHOLD)
+
+
+if __name__ == "__main__":
+    unittest.main()
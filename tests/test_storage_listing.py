@@ -0,0 +1,49 @@
+import json
+import unittest
+
+from kbcstorage.configurations import Configurations
+
+from client.storage_listing import iter_json_array, stream_configurations
+from tests.stub_api import StubApi
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class TestStorageListing(unittest.TestCase):
+
+    def test_iter_json_array_across_chunk_borders(self):
+        items = [{"id": "1", "name": "a ] tricky, \"name\" [", "configuration": {"tasks": list(range(50))}},
+                 12345, "text", [1, [2]], {}]
+        text = " [\n" + ",\n ".join(json.dumps(item) for item in items) + " ]\n"
+
+        for size in (1, 3, 7, 1000):
+            self.assertEqual(list(iter_json_array(chunked(text, size))), items)
+        self.assertEqual(list(iter_json_array(["[", "]"])), [])
+
+    def test_iter_json_array_rejects_invalid_input(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array(['{"id": 1}']))
+        with self.assertRaises(ValueError):
+            list(iter_json_array(['[{"id": 1}, {"id"']))
+
+    def test_stream_configurations_keeps_listing_fields(self):
+        with StubApi(configurations=300) as stub:
+            for configuration in stub.configurations:
+                configuration["configuration"] = {"phases": ["x" * 1000]}
+            stub.configurations[1]["isDisabled"] = True
+            client = Configurations(stub.url, "123-token", "default")
+
+            listed = list(stream_configurations(client, "keboola.orchestrator"))
+            searched = list(stream_configurations(client, "keboola.orchestrator", search="flow 2",
+                                                  include_disabled=False))
+
+        self.assertEqual(len(listed), 300)
+        self.assertEqual(listed[0], {"id": "1", "name": "Flow 1", "isDisabled": False})
+        self.assertEqual(len(searched), 110)
+        self.assertNotIn("2", [c["id"] for c in searched])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+
+from client import TimingRecorder
+from tests.fake_clock import FakeClock
+
+
+class TestTimingRecorder(unittest.TestCase):
+
+    def test_spans_and_counters_are_aggregated(self):
+        clock = FakeClock()
+        recorder = TimingRecorder(clock=clock)
+        for duration in [1.0, 3.0]:
+            with recorder.span("http", method="GET") as span:
+                clock.now += duration
+                span["status"] = 200
+        recorder.increment("retries", 2)
+
+        summary = recorder.summary()
+        self.assertEqual(summary["elapsedSeconds"], 4.0)
+        self.assertEqual(summary["totals"]["http"], {"count": 2, "totalSeconds": 4.0, "maxSeconds": 3.0})
+        self.assertEqual(summary["counters"], {"retries": 2})
+        self.assertEqual(summary["spans"][1], {"name": "http", "seconds": 3.0, "method": "GET", "status": 200,
+                                               "offset": 1.0})
+
+    def test_span_is_recorded_on_error(self):
+        recorder = TimingRecorder()
+        with self.assertRaises(ValueError):
+            with recorder.span("trigger"):
+                raise ValueError()
+        self.assertEqual(recorder.summary()["totals"]["trigger"]["count"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()